@@ -1,5 +1,9 @@
-from flask import Flask
+import os
+import sys
 
-app = Flask(__name__)
+# The backend modules import each other by flat names (routes, storage,
+# config), so make them importable when the backend is loaded as the `app`
+# package, e.g. `python -m app.main` or `gunicorn 'app:create_app()'`
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app.routes import cars
\ No newline at end of file
+from main import create_app
@@ -0,0 +1,10 @@
+from config import ASGI_THREADS
+from main import create_app, load_stores
+from utils.asgi import WsgiToAsgi
+
+# Optional ASGI entry point, e.g. `uvicorn asgi:app` or, for several
+# preloaded workers, `gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app`.
+# Large responses are written out by the event loop, so slow clients do not
+# tie up the threads that run the handlers
+app = WsgiToAsgi(create_app(), threads=ASGI_THREADS)
+load_stores()
@@ -1,36 +1,138 @@
+from collections import OrderedDict
+from flask import jsonify
 from flask_httpauth import HTTPBasicAuth
-from werkzeug.security import generate_password_hash, check_password_hash
-import json
+import hashlib
+import hmac
 import os
+import threading
+import time
+from storage.backends import open_store
+from services.password_hashing import HashingBusy, PasswordHasher
+from utils.instrumentation import phase
+from config import (DATABASE_DIR, AUTH_CACHE_TTL, AUTH_CACHE_SIZE, PASSWORD_HASH_METHOD, PASSWORD_HASH_PROCESSES,
+                    PASSWORD_HASH_HOST_PROCESSES, PASSWORD_HASH_QUEUE, PASSWORD_HASH_TIMEOUT)
 
 # Setup authentication
 auth = HTTPBasicAuth()
 
 # User database file path
-USERS_DB_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), 'database/users.json'))
+USERS_DB_FILE = os.path.join(DATABASE_DIR, 'users.json')
 
-# Ensure users database exists
-def ensure_users_db_exists():
-    if not os.path.exists(USERS_DB_FILE):
-        os.makedirs(os.path.dirname(USERS_DB_FILE), exist_ok=True)
-        with open(USERS_DB_FILE, 'w') as f:
-            json.dump({}, f, indent=4)
+# Users are cached in memory and reloaded when the underlying storage changes
+users_store = open_store('users', USERS_DB_FILE, default=dict, indent=4)
+
+
+class CredentialCache:
+    """Bounded, expiring set of credentials that already passed check_password_hash.
+
+    Entries are keyed by an HMAC of username and password under a per-process
+    secret, so plaintext passwords are never kept in memory. Each entry also
+    remembers the password hash it was verified against and is ignored once
+    that user's hash changes.
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, username, password):
+        message = username.encode('utf-8') + b'\0' + password.encode('utf-8')
+        return hmac.new(self._secret, message, hashlib.sha256).digest()
+
+    def check(self, username, password, password_hash):
+        if self.ttl <= 0:
+            return False
+        key = self._key(username, password)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            cached_username, cached_hash, expires = entry
+            if cached_username != username or cached_hash != password_hash or expires < time.monotonic():
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def add(self, username, password, password_hash):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        key = self._key(username, password)
+        with self._lock:
+            self._entries[key] = (username, password_hash, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    # Drop entries whose user was removed or whose password hash changed
+    def invalidate(self, users):
+        with self._lock:
+            stale = [key for key, (username, password_hash, _) in self._entries.items()
+                     if users.get(username) != password_hash]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+credential_cache = CredentialCache(AUTH_CACHE_TTL, AUTH_CACHE_SIZE)
+
+password_hasher = PasswordHasher(PASSWORD_HASH_METHOD, PASSWORD_HASH_PROCESSES, PASSWORD_HASH_QUEUE,
+                                 PASSWORD_HASH_TIMEOUT, PASSWORD_HASH_HOST_PROCESSES)
+
+# Registered by create_app: tell clients to back off while hashing is saturated
+def hashing_busy(error):
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status
 
 # Read users from database
 def read_users_db():
-    ensure_users_db_exists()
-    with open(USERS_DB_FILE, 'r') as f:
-        return json.load(f)
+    return users_store.read()
 
 # Write users to database
 def write_users_db(users):
-    ensure_users_db_exists()
-    with open(USERS_DB_FILE, 'w') as f:
-        json.dump(users, f, indent=4)
+    with phase('write'):
+        users_store.write(users)
+    credential_cache.invalidate(users)
+
+# Add or update a single user
+def write_user(username, password_hash):
+    with phase('write'):
+        users_store.put(username, password_hash)
+    credential_cache.invalidate(users_store.read())
 
 @auth.verify_password
 def verify_password(username, password):
+    with phase('auth'):
+        return check_credentials(username, password)
+
+def check_credentials(username, password):
     users = read_users_db()
-    if username in users and check_password_hash(users[username], password):
+    if username not in users:
+        return None
+    password_hash = users[username]
+    if credential_cache.check(username, password, password_hash):
         return username
-    return None
\ No newline at end of file
+    if not password_hasher.check(password_hash, password):
+        return None
+
+    # Hash the password again if the configured parameters changed since
+    if password_hasher.needs_rehash(password_hash):
+        try:
+            new_hash = password_hasher.hash(password)
+        except HashingBusy:
+            new_hash = None
+        if new_hash is not None:
+            with users_store.locked():
+                # Unless the password was changed in the meantime
+                if read_users_db().get(username) == password_hash:
+                    write_user(username, new_hash)
+                    password_hash = new_hash
+    credential_cache.add(username, password, password_hash)
+    return username
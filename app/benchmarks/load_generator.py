@@ -0,0 +1,90 @@
+import argparse
+import base64
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stats import summarize
+
+
+def run_load(url, method, path, concurrency, duration, headers=None):
+    """Send method/path to the server at url from `concurrency` keep-alive
+    connections for `duration` seconds and summarize the latencies.
+
+    Responses with a status of 400 or above and failed connections count as
+    errors; a failed connection is reopened.
+    """
+    target = urlsplit(url)
+    deadline = time.perf_counter() + duration
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def client():
+        connection = None
+        own_latencies, own_errors = [], 0
+        while time.perf_counter() < deadline:
+            if connection is None:
+                connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, headers=headers or {})
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = None
+                own_errors += 1
+                continue
+            own_latencies.append(time.perf_counter() - start)
+            if response.status >= 400:
+                own_errors += 1
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+                connection = None
+        if connection is not None:
+            connection.close()
+        with lock:
+            latencies.extend(own_latencies)
+            errors[0] += own_errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - started, errors[0])
+
+
+def basic_auth(username, password):
+    return {'Authorization': 'Basic ' + base64.b64encode(f'{username}:{password}'.encode()).decode()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a running API server and report latency percentiles.")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="server to load")
+    parser.add_argument('--request', action='append', required=True, metavar='"METHOD PATH"',
+                        help="request to send, e.g. 'GET /cars?page=1'; may be repeated")
+    parser.add_argument('--concurrency', type=int, default=8, help="simultaneous connections (default 8)")
+    parser.add_argument('--duration', type=float, default=5, help="seconds to load each request (default 5)")
+    parser.add_argument('--user', help="username for HTTP basic auth")
+    parser.add_argument('--password', help="password for HTTP basic auth")
+    args = parser.parse_args()
+
+    headers = basic_auth(args.user, args.password) if args.user else {}
+    results = {}
+    for request in args.request:
+        method, path = request.split(' ', 1) if ' ' in request else ('GET', request)
+        results[request] = run_load(args.url, method, path, args.concurrency, args.duration, headers)
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
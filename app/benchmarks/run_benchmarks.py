@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+
+# Make the app modules and the other benchmark modules importable when run as a script
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from scenarios import BENCH_PASSWORD, BENCH_USER, EXPORT_SCENARIOS, build_scenarios, request_for
+from stats import compare, peak_rss_mb, summarize
+
+GENERATE_SCRIPT = os.path.join(APP_DIR, 'scripts', 'generate_dummy_data.py')
+LOAD_GENERATOR = os.path.join(BENCH_DIR, 'load_generator.py')
+
+# Dataset sizes as (cars, sales)
+DATASETS = {
+    'small': (2000, 10000),
+    'medium': (100000, 1000000),
+    'large': (1000000, 10000000),
+}
+# Datasets are generated from a fixed seed, so runs on different machines compare like with like
+DATASET_SEED = 2024
+
+
+def ensure_dataset(name, data_dir):
+    """Directory holding the named dataset, generated on first use."""
+    directory = os.path.join(data_dir, name)
+    if not all(os.path.exists(os.path.join(directory, file)) for file in ('db.json', 'sales.json')):
+        cars, sales = DATASETS[name]
+        print(f"Generating the {name} dataset ({cars} cars, {sales} sales) in {directory}...", file=sys.stderr)
+        subprocess.run([sys.executable, GENERATE_SCRIPT, '--cars', str(cars), '--sales', str(sales),
+                        '--seed', str(DATASET_SEED), '--db-dir', directory], check=True, stdout=sys.stderr)
+    return directory
+
+
+def time_calls(function, iterations):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, sum(latencies))
+
+
+def benchmark_data_layer(cars_store, sales_store, sample, iterations):
+    """Time the searches, filters and index builds behind the endpoints, without HTTP."""
+    from services.car_search import CarSearchIndex, search_cars
+    from services.sales_aggregates import aggregate_sales, build_sales_cube
+    from services.sales_index import SalesIndex, indexed_sales, select_row_ids
+    from storage.record_index import RecordIndex
+
+    car, sale = sample['car'], sample['sale']
+    cars, sales = cars_store.read(), sales_store.read()
+    cube = sales_store.derived('sales_cube', build_sales_cube)
+    builds = max(1, iterations // 50)
+    results = {
+        'search_cars.model': time_calls(lambda: search_cars(cars_store, model=car['model'].lower()), iterations),
+        'search_cars.query': time_calls(lambda: search_cars(cars_store, query=car['model'].split()[0]), iterations),
+        'search_cars.features': time_calls(lambda: search_cars(cars_store, features=['Bluetooth', 'Sunroof']),
+                                           iterations),
+        'select_row_ids.country': time_calls(
+            lambda: select_row_ids(*indexed_sales(sales_store), [('country', 'eq', sale['country'])]), iterations),
+        'select_row_ids.model_range': time_calls(
+            lambda: select_row_ids(*indexed_sales(sales_store), [('model', 'eq', sale['model']),
+                                                                 ('sale_year', 'range', (2010, 2020))]),
+            iterations),
+        'aggregate_sales.make_year': time_calls(lambda: aggregate_sales(cube, ('make', 'sale_year'), {}), iterations),
+        'build.car_search': time_calls(lambda: CarSearchIndex(cars), builds),
+        'build.cars_index': time_calls(lambda: RecordIndex(cars, cars_store.unique_key), builds),
+        'build.sales_cube': time_calls(lambda: build_sales_cube(sales), builds),
+    }
+    # Columnar sales filter their mapped columns directly
+    if not hasattr(sales, 'match'):
+        results['build.sales_index'] = time_calls(lambda: SalesIndex(sales), builds)
+    return results
+
+
+def benchmark_client(app, scenarios, iterations, headers):
+    """Run every scenario through the Flask test client, one request at a time."""
+    client = app.test_client()
+    results = {}
+    for scenario in scenarios:
+        count = scenario.iterations or iterations
+        # One untimed request first builds whatever the endpoint derives lazily
+        if scenario.method == 'GET':
+            client.open(request_for(scenario, 0)[1], headers=headers).get_data()
+        latencies, errors = [], 0
+        for i in range(count):
+            if scenario.prepare:
+                scenario.prepare()
+            method, path, body = request_for(scenario, i)
+            start = time.perf_counter()
+            response = client.open(path, method=method, json=body, headers=headers if scenario.auth else None)
+            response.get_data()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+            elif scenario.collect:
+                scenario.collect(response.get_json())
+        results[scenario.name] = summarize(latencies, sum(latencies), errors)
+        print(f"  client {scenario.name}: p50 {results[scenario.name]['p50_ms']} ms", file=sys.stderr)
+    return results
+
+
+def benchmark_http(app, scenarios, args):
+    """Load the GET endpoints and cached logins over real HTTP connections.
+
+    The load generator runs in its own process so it does not compete with
+    the server for the GIL. Without --url the app is served by werkzeug's
+    threaded server inside this process, so its memory counts towards the
+    reported peak RSS.
+    """
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = None
+    url = args.url
+    if url is None:
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}'
+
+    command = [sys.executable, LOAD_GENERATOR, '--url', url, '--user', BENCH_USER, '--password', BENCH_PASSWORD,
+               '--concurrency', str(args.concurrency), '--duration', str(args.duration)]
+    names = {}
+    for scenario in scenarios:
+        if scenario.http:
+            method, path, _ = request_for(scenario, 0)
+            command += ['--request', f'{method} {path}']
+            names[f'{method} {path}'] = scenario.name
+    try:
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout
+    finally:
+        if server is not None:
+            server.shutdown()
+    return {names[request]: summary for request, summary in json.loads(output).items()}
+
+
+def run_worker(args):
+    """Benchmark the dataset in DATABASE_DIR and print the results as JSON."""
+    start = time.perf_counter()
+    import auth
+    from main import create_app, load_stores
+    from routes.cars import cars_store
+    from routes.favorites import write_user_favorites
+    from routes.sales import sales_store
+    from utils.http_cache import response_cache
+    from load_generator import basic_auth
+
+    app = create_app()
+    load_stores()
+    results = {'startup': {'load_stores': {'seconds': round(time.perf_counter() - start, 3),
+                                           'peak_rss_mb': peak_rss_mb()}}}
+
+    cars, sales = cars_store.read(), sales_store.read()
+    sample = {'cars': len(cars), 'sales': len(sales), 'car': cars[len(cars) // 2].to_dict(),
+              'sale': sales[len(sales) // 2].to_dict()}
+
+    # The benchmark user, with a few favorites to list
+    if BENCH_USER not in auth.read_users_db():
+        with auth.users_store.locked():
+            auth.write_user(BENCH_USER, auth.password_hasher.hash(BENCH_PASSWORD))
+    write_user_favorites(BENCH_USER, [car.id for car in cars[:20]])
+    headers = basic_auth(BENCH_USER, BENCH_PASSWORD)
+
+    state = {'run': str(int(time.time()))}
+    scenarios = build_scenarios(sample, state, auth.credential_cache.clear)
+
+    print("Timing the data layer...", file=sys.stderr)
+    results['data'] = benchmark_data_layer(cars_store, sales_store, sample, args.iterations)
+
+    # Requests repeat the same few URLs, which the response cache would
+    # answer from memory after the first one. The client and http sections
+    # time the endpoints with it off; the *_cached sections time cache hits
+    # of the GET endpoints separately
+    cache_bytes = response_cache.max_bytes
+    response_cache.resize(0)
+    print("Timing requests through the test client...", file=sys.stderr)
+    results['client'] = benchmark_client(app, scenarios + EXPORT_SCENARIOS, args.iterations, headers)
+    get_scenarios = [scenario for scenario in scenarios + EXPORT_SCENARIOS if scenario.method == 'GET']
+    if cache_bytes and not args.skip_cached:
+        response_cache.resize(cache_bytes)
+        print("Timing requests answered by the response cache...", file=sys.stderr)
+        results['client_cached'] = benchmark_client(app, get_scenarios, args.iterations, headers)
+        response_cache.resize(0)
+
+    # Drop the users registered by 'auth.register'
+    with auth.users_store.locked():
+        users = auth.read_users_db()
+        auth.write_users_db({username: password_hash for username, password_hash in users.items()
+                             if not username.startswith(f"bench-{state['run']}-")})
+
+    if not args.skip_http:
+        print("Loading the server over HTTP...", file=sys.stderr)
+        results['http'] = benchmark_http(app, scenarios, args)
+        # An external server (--url) runs with its own cache settings
+        if cache_bytes and not args.skip_cached and args.url is None:
+            response_cache.resize(cache_bytes)
+            print("Loading the server over HTTP with the response cache...", file=sys.stderr)
+            results['http_cached'] = benchmark_http(app, get_scenarios, args)
+
+    results['process'] = {'worker': {'peak_rss_mb': peak_rss_mb()}}
+    json.dump(results, sys.stdout)
+
+
+def print_report(results):
+    for dataset, sections in results.items():
+        print(f"\n== {dataset} ==")
+        for section, entries in sections.items():
+            print(f"\n[{section}]")
+            print(f"{'name':32} {'requests':>8} {'errors':>6} {'p50 ms':>10} {'p99 ms':>10} {'req/s':>10}")
+            for name, metrics in entries.items():
+                if 'p50_ms' in metrics:
+                    print(f"{name:32} {metrics['requests']:>8} {metrics['errors']:>6} {metrics['p50_ms']:>10} "
+                          f"{metrics['p99_ms']:>10} {metrics['throughput']:>10}")
+                else:
+                    print(f"{name:32} " + ', '.join(f'{metric} {value}' for metric, value in metrics.items()))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the API and data layer on generated datasets.")
+    parser.add_argument('--datasets', default='small',
+                        help=f"comma-separated datasets to run: {', '.join(DATASETS)} (default small)")
+    parser.add_argument('--data-dir', default=os.path.join(BENCH_DIR, 'data'),
+                        help="where generated datasets are kept between runs")
+    parser.add_argument('--iterations', type=int, default=200,
+                        help="requests per test client scenario and calls per data layer benchmark (default 200)")
+    parser.add_argument('--concurrency', type=int, default=8, help="HTTP connections (default 8)")
+    parser.add_argument('--duration', type=float, default=5, help="seconds of HTTP load per endpoint (default 5)")
+    parser.add_argument('--skip-http', action='store_true', help="only run the data layer and test client benchmarks")
+    parser.add_argument('--url', help="load this already running server instead of starting one; it must serve "
+                                      "the same dataset")
+    parser.add_argument('--skip-cached', action='store_true',
+                        help="skip timing GETs answered by the response cache, which every other request bypasses")
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    parser.add_argument('--baseline', default=os.path.join(BENCH_DIR, 'baseline.json'),
+                        help="results to compare against (default benchmarks/baseline.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="fraction a metric may be worse than the baseline before it is reported (default 0.2)")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = {}
+    for name in args.datasets.split(','):
+        if name not in DATASETS:
+            sys.exit(f"Unknown dataset {name!r}, expected one of: {', '.join(DATASETS)}")
+        # Each dataset is benchmarked in a fresh process, so the stores load
+        # from its directory and the peak RSS is its own
+        env = dict(os.environ, DATABASE_DIR=ensure_dataset(name, args.data_dir))
+        print(f"Benchmarking the {name} dataset...", file=sys.stderr)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker'] + sys.argv[1:],
+                                env=env, check=True, stdout=subprocess.PIPE).stdout
+        results[name] = json.loads(output)
+
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved the baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+from collections import namedtuple
+from urllib.parse import quote
+
+BENCH_USER = 'bench'
+BENCH_PASSWORD = 'bench-password'
+
+# path and body are either fixed or called with the iteration number, so
+# successive requests can ask for different pages instead of replaying one
+# cached response. prepare, if given, is called before every request and
+# collect with every successful response's JSON, neither of them timed.
+# Scenarios with http=True are also run by the HTTP load generator, which
+# needs a fixed path. iterations overrides the number of timed requests
+Scenario = namedtuple('Scenario', 'name method path body auth prepare collect http iterations',
+                      defaults=(None, True, None, None, False, None))
+
+
+def _value(value, i):
+    return value(i) if callable(value) else value
+
+
+def request_for(scenario, i):
+    """(method, path, json body) of the i-th request of scenario."""
+    return scenario.method, _value(scenario.path, i), _value(scenario.body, i)
+
+
+def build_scenarios(sample, state, clear_credential_cache):
+    """Every endpoint of the cars, sales, favorites and users blueprints.
+
+    sample describes the dataset: 'cars' and 'sales' counts, a 'car' and a
+    'sale' taken from the middle. state holds a 'run' tag that keeps names
+    unique across runs, and collects the cars made by 'cars.create', which
+    the later scenarios update, favorite and delete again.
+    """
+    car, sale = sample['car'], sample['sale']
+    car_pages = max(1, sample['cars'] // 50)
+    sale_pages = max(1, sample['sales'] // 100)
+    word = quote(car['model'].split()[0])
+    model, country, make = quote(car['model']), quote(sale['country']), quote(sale['make'])
+    sale_model = quote(sale['model'])
+    created = state.setdefault('created', [])
+
+    def created_car(i):
+        return created[i % len(created)]
+
+    def bench_car(i, year=2001):
+        return {'make': 'Benchmark', 'model': f"Bench {state['run']} {i}", 'year': year, 'features': ['Bluetooth']}
+
+    return [
+        Scenario('cars.list', 'GET', lambda i: f'/cars?page={i % car_pages + 1}&limit=50'),
+        Scenario('cars.first_page', 'GET', '/cars?page=1&limit=6', http=True),
+        Scenario('cars.model', 'GET', f'/cars?model={model}&limit=50', http=True),
+        Scenario('cars.search', 'GET', f'/cars?q={word}&limit=50', http=True),
+        Scenario('cars.features', 'GET', '/cars?features=Bluetooth,Sunroof&limit=50', http=True),
+        Scenario('cars.cursor', 'GET', lambda i: f"/cars?after={i * 50 % max(1, sample['cars'])}&limit=50"),
+        Scenario('cars.get', 'GET', f"/cars/{car['id']}", http=True),
+        Scenario('cars.create', 'POST', '/cars', bench_car, collect=lambda car: created.append(car['id'])),
+        Scenario('cars.update', 'PUT', lambda i: f'/cars/{created_car(i)}',
+                 lambda i: bench_car(i % len(created), year=2002)),
+        Scenario('cars.bulk_update', 'POST', '/cars/_bulk',
+                 lambda i: [{'op': 'update', 'id': car_id, 'car': bench_car(n, year=2003 + i % 2)}
+                            for n, car_id in enumerate(created[:100])]),
+        Scenario('favorites.add', 'POST', '/favorites', lambda i: {'id': created_car(i)}),
+        Scenario('favorites.list', 'GET', '/favorites', http=True),
+        Scenario('favorites.ids', 'GET', '/favorites?ids_only=1', http=True),
+        Scenario('favorites.remove', 'DELETE', lambda i: f'/favorites/{created_car(i)}'),
+        Scenario('cars.delete', 'DELETE', lambda i: f'/cars/{created_car(i)}'),
+        Scenario('sales.page', 'GET', lambda i: f'/sales?page={i % sale_pages + 1}&limit=100'),
+        Scenario('sales.country', 'GET', f'/sales?country={country}&limit=100', http=True),
+        Scenario('sales.model_range', 'GET',
+                 f'/sales?model={sale_model}&sale_year_from=2010&sale_year_to=2020&limit=100', http=True),
+        Scenario('sales.cursor', 'GET', lambda i: f"/sales?after={i * 100 % max(1, sample['sales'])}&limit=100"),
+        Scenario('sales.aggregate', 'GET', '/sales/aggregate?group_by=make,sale_year', http=True),
+        Scenario('sales.aggregate_top', 'GET',
+                 f'/sales/aggregate?group_by=country&top=10&make={make}', http=True),
+        Scenario('auth.login', 'POST', '/login', http=True),
+        # Clearing the credential cache makes every login check the password
+        # hash; hashing is slow on purpose, so these run fewer times
+        Scenario('auth.login_uncached', 'POST', '/login', prepare=clear_credential_cache, iterations=20),
+        Scenario('auth.register', 'POST', '/register',
+                 lambda i: {'username': f"bench-{state['run']}-{i}", 'password': BENCH_PASSWORD}, auth=False,
+                 iterations=20),
+    ]
+
+
+# Full exports send every sale, so they are only timed a few times
+EXPORT_SCENARIOS = [
+    Scenario('sales.export_json', 'GET', '/sales', iterations=3),
+    Scenario('sales.export_ndjson', 'GET', '/sales?format=ndjson', iterations=3),
+    Scenario('cars.export_ndjson', 'GET', '/cars?format=ndjson', iterations=3),
+]
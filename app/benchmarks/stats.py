@@ -0,0 +1,58 @@
+import resource
+import sys
+
+# Metrics compared against the baseline, and whether a higher value is worse
+COMPARED_METRICS = {'p50_ms': True, 'p99_ms': True, 'throughput': False, 'seconds': True, 'peak_rss_mb': True}
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(0, min(len(sorted_samples) - 1, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[rank]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """p50/p99/mean latency in milliseconds and requests per second from per-request seconds."""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        'throughput': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against baseline, as readable lines.
+
+    Both are {dataset: {section: {name: {metric: value}}}}. A metric regresses
+    when it is more than `tolerance` (a fraction) worse than the baseline;
+    entries missing from either side are skipped.
+    """
+    regressions = []
+    for dataset, sections in results.items():
+        for section, entries in sections.items():
+            for name, metrics in entries.items():
+                before = baseline.get(dataset, {}).get(section, {}).get(name)
+                if not isinstance(before, dict):
+                    continue
+                for metric, higher_is_worse in COMPARED_METRICS.items():
+                    old, new = before.get(metric), metrics.get(metric)
+                    if not old or new is None:
+                        continue
+                    change = (new - old) / old
+                    if (change if higher_is_worse else -change) > tolerance:
+                        regressions.append(f"{dataset} {section} {name} {metric}: "
+                                           f"{old} -> {new} ({change:+.0%})")
+    return regressions
@@ -0,0 +1,78 @@
+import os
+
+# Settings are read from the environment so deployments can change them
+# without touching code
+
+# Directory holding the JSON files (and by default the SQLite and columnar files)
+DATABASE_DIR = os.path.abspath(os.environ.get('DATABASE_DIR', os.path.join(os.path.dirname(__file__), 'database')))
+
+# How long (seconds) and how many verified credentials are remembered
+AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 300))
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 1024))
+
+# Server worker processes on this host. gunicorn.conf.py sets this to its
+# worker count, and the host-wide limits below are split among the workers
+WEB_WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+
+
+def per_worker(total):
+    """Each worker's share of a host-wide limit, at least 1 unless total is 0."""
+    return max(1, total // WEB_WORKERS) if total > 0 else 0
+
+
+# Password hashing method in werkzeug's format, e.g. 'scrypt:32768:8:1' or
+# 'pbkdf2:sha256:600000'. Stored hashes made with other parameters are
+# replaced on the user's next successful login
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+# Hashing runs on PASSWORD_HASH_PROCESSES processes (0 hashes on the request
+# thread). Once PASSWORD_HASH_QUEUE hashes are running or waiting, requests
+# needing another one get 429; one waiting longer than PASSWORD_HASH_TIMEOUT
+# seconds gets 503. Both counts are for the whole host: every worker gets its
+# share of them, and workers forked from one preloaded master never run more
+# than PASSWORD_HASH_HOST_PROCESSES hashes at once between them
+PASSWORD_HASH_HOST_PROCESSES = int(os.environ.get('PASSWORD_HASH_PROCESSES', os.cpu_count() or 2))
+PASSWORD_HASH_PROCESSES = per_worker(PASSWORD_HASH_HOST_PROCESSES)
+PASSWORD_HASH_QUEUE = per_worker(int(os.environ.get('PASSWORD_HASH_QUEUE', 8 * (os.cpu_count() or 2))))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+# 'json' keeps sales.json parsed in memory, 'columnar' memory-maps a typed
+# column file (imported from sales.json on first start if missing)
+SALES_STORAGE = os.environ.get('SALES_STORAGE', 'json')
+SALES_COLUMNAR_FILE = os.environ.get('SALES_COLUMNAR_FILE', os.path.join(DATABASE_DIR, 'sales.col'))
+
+# 'json' keeps each store in its JSON file; 'sqlite' keeps every store in one
+# SQLite database, migrated from the JSON files the first time it is created
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')
+SQLITE_DATABASE = os.environ.get('SQLITE_DATABASE', os.path.join(DATABASE_DIR, 'app.db'))
+
+# With the JSON backend, append car changes to db.json.log instead of
+# rewriting db.json, folding the log into db.json every CARS_JOURNAL_COMPACT_AFTER
+# entries. The log is fsynced every CARS_JOURNAL_FSYNC_BATCH entries or
+# CARS_JOURNAL_FSYNC_INTERVAL seconds, whichever comes first
+CARS_JOURNAL = os.environ.get('CARS_JOURNAL', '0') == '1'
+CARS_JOURNAL_COMPACT_AFTER = int(os.environ.get('CARS_JOURNAL_COMPACT_AFTER', 1000))
+CARS_JOURNAL_FSYNC_BATCH = int(os.environ.get('CARS_JOURNAL_FSYNC_BATCH', 32))
+CARS_JOURNAL_FSYNC_INTERVAL = float(os.environ.get('CARS_JOURNAL_FSYNC_INTERVAL', 1.0))
+
+# Response bodies of at least HTTP_COMPRESS_MIN_BYTES are gzip (or brotli, if
+# installed) compressed for clients that accept it
+HTTP_COMPRESS_MIN_BYTES = int(os.environ.get('HTTP_COMPRESS_MIN_BYTES', 1024))
+
+# Serialized GET responses, plain and compressed, are kept up to
+# RESPONSE_CACHE_BYTES in total; bodies over a quarter of that are not kept
+RESPONSE_CACHE_BYTES = int(os.environ.get('RESPONSE_CACHE_BYTES', 64 * 1024 * 1024))
+
+# Threads the ASGI adapter (asgi.py) runs request handlers on
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+
+# Request profiling. PROFILE_ADMINS (comma-separated usernames) may add
+# ?__profile=1 to any request to profile it; PROFILE_SAMPLE_PERCENT of all
+# requests are profiled too and kept if slower than PROFILE_SLOW_MS. Profiles
+# go to PROFILE_DIR as cProfile stats (PROFILE_FORMAT=pstats) or as collapsed
+# stacks sampled every PROFILE_INTERVAL_MS (PROFILE_FORMAT=stacks)
+PROFILE_ADMINS = {name for name in os.environ.get('PROFILE_ADMINS', '').split(',') if name}
+PROFILE_SAMPLE_PERCENT = float(os.environ.get('PROFILE_SAMPLE_PERCENT', 0))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 500))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), 'profiles')))
+PROFILE_FORMAT = os.environ.get('PROFILE_FORMAT', 'pstats')
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
@@ -0,0 +1,27 @@
+import multiprocessing
+import os
+
+# Settings for `gunicorn -c gunicorn.conf.py wsgi:app`, run from this directory.
+# Each can be overridden with the environment variable next to it.
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# The preloaded app reads the worker count from here to split host-wide
+# limits, such as the password hashing processes, among the workers
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+# Each worker serves requests on a few threads; handlers release the GIL
+# while waiting on files, SQLite and clients
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Import the app, and with it load the data, once in the master before
+# forking, instead of once per worker
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+
+# Replace workers now and then so memory they allocate over time is returned
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
@@ -1,44 +1,51 @@
-from flask import Flask, jsonify, request
+from flask import Flask
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash
-from routes.cars import cars_bp
-from routes.sales import sales_bp
-from routes.favorites import favorites_bp
-from auth import auth, read_users_db, write_users_db
+from routes.cars import cars_bp, cars_store
+from routes.sales import sales_bp, sales_store
+from routes.favorites import favorites_bp, favorites_store
+from routes.users import users_bp
+from routes.stats import stats_bp
+from auth import auth, hashing_busy, users_store
+from services.password_hashing import HashingBusy
+from services.car_search import CarSearchIndex
+from services.sales_aggregates import build_sales_cube
+from services.sales_index import indexed_sales
+from utils.instrumentation import instrument_app
+from utils.profiling import RequestProfiler
+from config import (PROFILE_ADMINS, PROFILE_DIR, PROFILE_FORMAT, PROFILE_INTERVAL_MS, PROFILE_SAMPLE_PERCENT,
+                    PROFILE_SLOW_MS)
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+def create_app():
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for all routes
 
-# Register blueprints
-app.register_blueprint(cars_bp)
-app.register_blueprint(sales_bp)
-app.register_blueprint(favorites_bp)
+    # Register blueprints
+    app.register_blueprint(cars_bp)
+    app.register_blueprint(sales_bp)
+    app.register_blueprint(favorites_bp)
+    app.register_blueprint(users_bp)
+    app.register_blueprint(stats_bp)
 
-# User registration endpoint
-@app.route('/register', methods=['POST'])
-def register():
-    data = request.json
-    username = data.get('username')
-    password = data.get('password')
-    
-    if not username or not password:
-        return jsonify({'error': 'Username and password are required'}), 400
-    
-    users = read_users_db()
-    
-    if username in users:
-        return jsonify({'error': 'Username already exists'}), 400
-    
-    users[username] = generate_password_hash(password)
-    write_users_db(users)
-    
-    return jsonify({'message': 'User registered successfully'}), 201
+    # Password hashing is saturated: 429 or 503 with Retry-After
+    app.register_error_handler(HashingBusy, hashing_busy)
 
-# User login endpoint (for validation)
-@app.route('/login', methods=['POST'])
-@auth.login_required
-def login():
-    return jsonify({'message': 'Login successful', 'username': auth.current_user()}), 200
+    # Per-endpoint timings for /metrics, and profiles of selected requests
+    profiler = RequestProfiler(PROFILE_ADMINS, PROFILE_SAMPLE_PERCENT, PROFILE_SLOW_MS, PROFILE_DIR,
+                               PROFILE_FORMAT, PROFILE_INTERVAL_MS, current_user=auth.current_user)
+    instrument_app(app, {'cars': cars_store, 'sales': sales_store, 'favorites': favorites_store,
+                         'users': users_store}, profiler if profiler.enabled() else None)
+
+    return app
+
+# Load every store and build the indexes requests use, so a server that
+# preloads the app before forking workers shares them copy-on-write
+def load_stores():
+    for store in (cars_store, sales_store, favorites_store, users_store):
+        store.read()
+    cars_store.index()
+    cars_store.derived('car_search', CarSearchIndex)
+    sales_store.derived('sales_cube', build_sales_cube)
+    indexed_sales(sales_store)
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
@@ -1,10 +1,65 @@
+import re
+import sys
+
+MAKE_PATTERN = re.compile(r'^[A-Z][a-zA-Z\s-]*$')
+MODEL_PATTERN = re.compile(r'^[A-Z][A-Za-z0-9\s-]*$')
+MIN_YEAR, MAX_YEAR = 1886, 2026
+
+
 class Car:
-    def __init__(self, id, make, model, year, features):
+    """A car as kept in the cars store.
+
+    Slots instead of a per-instance dict, and make, model and features
+    interned, since the same few hundred strings repeat across every car.
+    Cars are only turned into dicts for JSON, with to_dict().
+    """
+
+    __slots__ = ('id', 'make', 'model', 'year', 'features')
+
+    def __init__(self, id, make, model, year, features=()):
         self.id = id
-        self.make = make
-        self.model = model
+        self.make = sys.intern(make)
+        self.model = sys.intern(model)
         self.year = year
-        self.features = features
+        self.features = tuple(sys.intern(feature) for feature in features)
+
+    @classmethod
+    def from_dict(cls, data):
+        """A car as stored, trusted to be valid."""
+        return cls(data['id'], data['make'], data['model'], data['year'], data.get('features', ()))
+
+    @classmethod
+    def from_input(cls, data, car_id=None):
+        """A car sent by a client, checked field by field.
+
+        Raises ValueError with a message for the client. Whether another car
+        has the same model and year is up to the caller, which has the index.
+        """
+        if not isinstance(data, dict) or not all(field in data for field in ('make', 'model', 'year')):
+            raise ValueError("Make, model and year are required.")
+
+        # 'model' starts with an uppercase letter and contains only letters, numbers, spaces, or hyphens
+        if not isinstance(data['model'], str) or not MODEL_PATTERN.match(data['model']):
+            raise ValueError("Model must start with an uppercase letter and contain only letters, numbers, "
+                             "spaces, or hyphens.")
+
+        # 'make' contains only letters and starts with an uppercase letter
+        if not isinstance(data['make'], str) or not MAKE_PATTERN.match(data['make']):
+            raise ValueError("Make must start with an uppercase letter and contain only letters.")
+
+        # 'year' is numeric (a numeric string is converted) and within MIN_YEAR to MAX_YEAR
+        try:
+            year = int(data['year'])
+        except (ValueError, TypeError):
+            year = None
+        if year is None or not (MIN_YEAR <= year <= MAX_YEAR):
+            raise ValueError(f"Year must be a numeric value between {MIN_YEAR} and {MAX_YEAR}.")
+
+        features = data.get('features', [])
+        if not isinstance(features, list) or not all(isinstance(feature, str) for feature in features):
+            raise ValueError("Features must be a list of strings.")
+
+        return cls(car_id, data['make'], data['model'], year, features)
 
     def to_dict(self):
         return {
@@ -12,5 +67,5 @@ class Car:
             "make": self.make,
             "model": self.model,
             "year": self.year,
-            "features": self.features
-        }
\ No newline at end of file
+            "features": list(self.features)
+        }
@@ -1,18 +1,42 @@
+import sys
+
+# Key order of a sale in sales.json and in responses
+FIELDS = ('id', 'car_id', 'make', 'model', 'release_year', 'sale_year', 'units_sold', 'country')
+
+
 class Sale:
-    def __init__(self, sale_year, make, model, release_year, country, units_sold):
-        self.sale_year = sale_year
-        self.make = make
-        self.model = model
+    """A sale as kept in the sales store.
+
+    Slots instead of a per-instance dict, and make, model and country
+    interned, since they repeat across millions of sales. Sales are only
+    turned into dicts for JSON, with to_dict().
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, id, car_id, make, model, release_year, sale_year, units_sold, country):
+        self.id = id
+        self.car_id = car_id
+        self.make = sys.intern(make)
+        self.model = sys.intern(model)
         self.release_year = release_year
-        self.country = country
+        self.sale_year = sale_year
         self.units_sold = units_sold
+        self.country = sys.intern(country)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['car_id'], data['make'], data['model'], data['release_year'], data['sale_year'],
+                   data['units_sold'], data['country'])
 
     def to_dict(self):
         return {
-            "sale_year": self.sale_year,
+            "id": self.id,
+            "car_id": self.car_id,
             "make": self.make,
             "model": self.model,
             "release_year": self.release_year,
-            "country": self.country,
-            "units_sold": self.units_sold
+            "sale_year": self.sale_year,
+            "units_sold": self.units_sold,
+            "country": self.country
         }
@@ -1,136 +1,280 @@
 from flask import Blueprint, jsonify, request
+import hashlib
+from itertools import count
 import json
 import os
-import re
 from auth import auth  # Import auth from the auth module
+from models.car import Car
+from storage.backends import open_store
+from storage.record_index import StagedChanges
+from config import CARS_JOURNAL, DATABASE_DIR
+from services.car_search import search_cars
+from utils.instrumentation import phase
+from utils.http_cache import accepted_encoding, cacheable, conditional_get, etag_variants, not_modified
+from utils.pagination import encode_cursor, ndjson_response, position_after, read_cursor
 
 cars_bp = Blueprint('cars', __name__)
 
-DB_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '../database/db.json'))
+DB_FILE = os.path.join(DATABASE_DIR, 'db.json')
 
-def ensure_db_exists():
-    if not os.path.exists(DB_FILE):
-        os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
-        with open(DB_FILE, 'w') as f:
-            json.dump([], f, indent=4)
+# Cars are loaded once and only reloaded when the underlying storage changes
+cars_store = open_store('cars', DB_FILE, default=list, indent=4, journal=CARS_JOURNAL, record_type=Car)
+
+# Two cars may not share a model and year
+def car_unique_key(car):
+    return (car.model, car.year)
+
+# Keeps an id map, a (model, year) index and the max id next to the cars
+cars_store.add_unique_index(car_unique_key)
 
 def read_db():
-    ensure_db_exists()
-    with open(DB_FILE, 'r') as f:
-        return json.load(f)
+    return cars_store.read()
 
 def write_db(data):
-    ensure_db_exists()
-    with open(DB_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+    with phase('write'):
+        cars_store.write(data)
 
-def validate_car_data(car_data, cars):
-    # Validate that the car does not already exist (by model and year)
-    for car in cars:
-        if car['model'] == car_data['model'] and car['year'] == car_data['year'] and car['id'] != car_data['id']:
-            return "Car with the same model and year already exists."
+def insert_car(car):
+    with phase('write'):
+        cars_store.insert(car)
+
+def replace_car(car):
+    with phase('write'):
+        cars_store.replace(car)
+
+def remove_car(car_id):
+    with phase('write'):
+        return cars_store.delete(car_id)
 
-    # Validate that 'model' starts with an uppercase letter and contains only letters, numbers, spaces, or hyphens
-    if not re.match(r'^[A-Z][A-Za-z0-9\s-]*$', car_data['model']):
-        return "Model must start with an uppercase letter and contain only letters, numbers, spaces, or hyphens."
+# Called with the id of every deleted car, e.g. to drop it from favorites
+car_deleted_callbacks = []
 
-    # Validate that 'make' contains only letters and starts with an uppercase letter
-    if not re.match(r'^[A-Z][a-zA-Z\s-]*$', car_data['make']):
-        return "Make must start with an uppercase letter and contain only letters."
+# Strong ETag over a car's content, used for optimistic concurrency on PUT
+def car_etag(car):
+    return hashlib.sha1(json.dumps(car.to_dict(), sort_keys=True).encode('utf-8')).hexdigest()
 
-    # Validate that 'year' is numeric and within the range 1886 to 2026
+# Build a Car from a request body, returning (car, None) or (None, error).
+# Car checks the fields itself; only the duplicate check needs the index
+def car_from_request(car_data, car_id, cars_index):
     try:
-        year = int(car_data['year'])
-        if not (1886 <= year <= 2026):
-            return "Year must be a numeric value between 1886 and 2026."
-        # Update the year to ensure it's an integer in the data
-        car_data['year'] = year
-    except (ValueError, TypeError):
-        return "Year must be a numeric value between 1886 and 2026."
+        car = Car.from_input(car_data, car_id)
+    except ValueError as e:
+        return None, str(e)
 
-    return None
+    # Validate that the car does not already exist (by model and year)
+    if cars_index.find_unique(car_unique_key(car), exclude_id=car_id) is not None:
+        return None, "Car with the same model and year already exists."
+    return car, None
 
 @cars_bp.route('/cars', methods=['GET'])
 @auth.login_required
+@conditional_get(cars_store)
 def get_cars():
     page = int(request.args.get('page', 1))
     limit = int(request.args.get('limit', 6))
     model = request.args.get('model', '').lower()
+    query = request.args.get('q', '')
+    features = [feature.strip() for feature in request.args.get('features', '').split(',') if feature.strip()]
+    try:
+        after = read_cursor(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor.'}), 400
 
-    cars = read_db()
-
-    # Filter by model if provided
-    if model:
-        cars = [car for car in cars if model in car['model'].lower()]
+    # Filter by model substring, q= words across make, model and features
+    # (ranked best match first) and required features, using the search index
+    with phase('filter'):
+        if model or query.strip() or features:
+            cars = search_cars(cars_store, model=model, query=query, features=features)
+        else:
+            cars = read_db()
 
     # Calculate total count before pagination
     total_count = len(cars)
 
+    # With a cursor, continue after the car it points to; cars are kept in id
+    # order, so this is a binary search unless results are ranked by q=
+    with phase('paginate'):
+        if after is not None:
+            ordered = cars_store.index().ordered and not query.strip()
+            start = position_after(cars, after, lambda car: car.id, ordered=ordered)
+        else:
+            start = (page - 1) * limit
+
+    # format=ndjson streams the cars one per line, all of them unless a limit is given
+    if request.args.get('format') == 'ndjson':
+        end = start + limit if 'limit' in request.args else len(cars)
+        return ndjson_response(car.to_dict() for car in cars[start:end])
+
     # Apply pagination
-    start = (page - 1) * limit
     end = start + limit
-    paginated_cars = cars[start:end]
+    with phase('paginate'):
+        paginated_cars = cars[start:end]
 
-    return jsonify({'cars': paginated_cars, 'total_count': total_count}), 200
+    response = {'cars': [car.to_dict() for car in paginated_cars], 'total_count': total_count}
+    if paginated_cars and end < total_count:
+        response['next_cursor'] = encode_cursor(paginated_cars[-1].id)
+    return jsonify(response), 200
 
 @cars_bp.route('/cars', methods=['POST'])
 @auth.login_required
 def create_car():
-    new_car = request.json
-    cars = read_db()
-
-    # Validate the car data
-    error = validate_car_data(new_car, cars)
-    if error:
-        return jsonify({'error': error}), 400
+    # Hold the store lock so the duplicate check and the insert see the same data
+    with cars_store.locked():
+        # Validate the car data
+        new_car, error = car_from_request(request.json, None, cars_store.index())
+        if error:
+            return jsonify({'error': error}), 400
 
-    # Assign a unique ID to the new car
-    new_car['id'] = max(car['id'] for car in cars) + 1 if cars else 0
+        # Assign a unique ID to the new car; ids are never handed out twice
+        new_car.id = cars_store.next_id()
 
-    cars.append(new_car)
-    write_db(cars)
-    return jsonify(new_car), 201
+        insert_car(new_car)
+    return jsonify(new_car.to_dict()), 201
 
 @cars_bp.route('/cars/<int:car_id>', methods=['GET'])
 @auth.login_required
 def get_car_by_id(car_id):
-    cars = read_db()
-    car = next((car for car in cars if car['id'] == car_id), None)
+    car = cars_store.index().get(car_id)
     if car:
-        return jsonify(car), 200
+        etag = car_etag(car)
+        return not_modified(etag) or cacheable(jsonify(car.to_dict()), etag, accepted_encoding())
     return jsonify({'error': 'Car not found'}), 404
 
 @cars_bp.route('/cars/<int:car_id>', methods=['PUT'])
 @auth.login_required
 def update_car(car_id):
-    updated_car = request.json
-    cars = read_db()
+    with cars_store.locked():
+        cars_index = cars_store.index()
 
-    # Validate that the car exists
-    car_to_update = next((car for car in cars if car['id'] == car_id), None)
-    if not car_to_update:
-        return jsonify({'error': 'Car not found'}), 404
+        # Validate that the car exists
+        car_to_update = cars_index.get(car_id)
+        if not car_to_update:
+            return jsonify({'error': 'Car not found'}), 404
 
-    # Preserve the car ID
-    updated_car['id'] = car_id
+        # With If-Match, only update the version of the car the client last saw,
+        # as tagged on a plain or compressed GET
+        current_etags = etag_variants(car_etag(car_to_update))
+        if request.if_match and not any(etag in request.if_match for etag in current_etags):
+            return jsonify({'error': 'Car was modified by another request'}), 412
 
-    # Validate the car data
-    error = validate_car_data(updated_car, cars)
-    if error:
-        return jsonify({'error': error}), 400
+        # Validate the car data, preserving the car ID
+        updated_car, error = car_from_request(request.json, car_id, cars_index)
+        if error:
+            return jsonify({'error': error}), 400
 
-    # Update the car data, including features
-    cars = [updated_car if car['id'] == car_id else car for car in cars]
-    write_db(cars)
-    return jsonify(updated_car), 200
+        # Update the car data, including features
+        replace_car(updated_car)
+
+    response = jsonify(updated_car.to_dict())
+    response.set_etag(car_etag(updated_car))
+    return response, 200
 
 @cars_bp.route('/cars/<int:car_id>', methods=['DELETE'])
 @auth.login_required
 def delete_car(car_id):
-    cars = read_db()
-    car_to_delete = next((car for car in cars if car['id'] == car_id), None)
+    car_to_delete = remove_car(car_id)
     if car_to_delete:
-        cars.remove(car_to_delete)
-        write_db(cars)
-        return jsonify(car_to_delete), 200
-    return jsonify({'error': 'Car not found'}), 404
\ No newline at end of file
+        for callback in car_deleted_callbacks:
+            callback(car_id)
+        return jsonify(car_to_delete.to_dict()), 200
+    return jsonify({'error': 'Car not found'}), 404
+
+# Read the operations of a bulk request, sent as a JSON array or as NDJSON
+def read_bulk_operations():
+    with phase('parse'):
+        return _parse_bulk_operations(request.get_data(as_text=True))
+
+def _parse_bulk_operations(body):
+    if request.mimetype == 'application/x-ndjson' or not body.lstrip().startswith('['):
+        operations = []
+        for line_number, line in enumerate(body.splitlines(), 1):
+            if line.strip():
+                try:
+                    operations.append(json.loads(line))
+                except ValueError:
+                    raise ValueError(f"Invalid JSON on line {line_number}.")
+        return operations
+    try:
+        return json.loads(body)
+    except ValueError:
+        raise ValueError("Invalid JSON array.")
+
+# Validate one bulk operation against the cars as they will be after the
+# operations before it, and stage it. Returns (status, error or car id).
+def stage_bulk_operation(operation, staged, new_ids):
+    if not isinstance(operation, dict) or operation.get('op') not in ('create', 'update', 'delete'):
+        return 400, "Each operation needs an 'op' of create, update or delete."
+
+    if operation['op'] == 'create':
+        if not isinstance(operation.get('car'), dict):
+            return 400, "A create operation needs a 'car' object."
+        car, error = car_from_request(operation['car'], None, staged)
+        if error:
+            return 400, error
+        car.id = next(new_ids)
+        staged.insert(car)
+        return 201, car.id
+
+    car_id = operation.get('id')
+    if not isinstance(car_id, int) or isinstance(car_id, bool):
+        return 400, f"A {operation['op']} operation needs a numeric 'id'."
+    if staged.get(car_id) is None:
+        return 404, "Car not found"
+
+    if operation['op'] == 'delete':
+        staged.delete(car_id)
+        return 200, car_id
+
+    if not isinstance(operation.get('car'), dict):
+        return 400, "An update operation needs a 'car' object."
+    car, error = car_from_request(operation['car'], car_id, staged)
+    if error:
+        return 400, error
+    staged.replace(car)
+    return 200, car_id
+
+# Create, update and delete many cars in one request. The body is a JSON
+# array or NDJSON of {"op": "create", "car": {...}}, {"op": "update", "id": ...,
+# "car": {...}} and {"op": "delete", "id": ...}. By default nothing is applied
+# if any operation fails; with mode=partial the valid ones are applied and the
+# others reported. All changes are persisted together, once.
+@cars_bp.route('/cars/_bulk', methods=['POST'])
+@auth.login_required
+def bulk_cars():
+    try:
+        operations = read_bulk_operations()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not isinstance(operations, list):
+        return jsonify({'error': "Expected a JSON array or NDJSON of operations."}), 400
+    partial = request.args.get('mode') == 'partial'
+
+    with cars_store.locked():
+        staged = StagedChanges(cars_store.index())
+
+        # Reserve ids for every create up front instead of one at a time
+        creates = sum(1 for operation in operations if isinstance(operation, dict) and operation.get('op') == 'create')
+        new_ids = count(cars_store.next_id(creates)) if creates else iter(())
+
+        results = []
+        with phase('validate'):
+            for position, operation in enumerate(operations):
+                status, detail = stage_bulk_operation(operation, staged, new_ids)
+                if status >= 400:
+                    results.append({'index': position, 'status': status, 'error': detail})
+                else:
+                    results.append({'index': position, 'status': status, 'id': detail})
+        failed = sum(1 for result in results if result['status'] >= 400)
+
+        if failed and not partial:
+            return jsonify({'applied': 0, 'failed': failed, 'results': results}), 400
+        if staged.changes:
+            with phase('write'):
+                cars_store.apply_changes(staged.changes)
+
+    for op, value in staged.changes:
+        if op == 'delete':
+            for callback in car_deleted_callbacks:
+                callback(value)
+
+    return jsonify({'applied': len(operations) - failed, 'failed': failed, 'results': results}), 200
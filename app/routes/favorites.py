@@ -1,75 +1,105 @@
 from flask import Blueprint, jsonify, request
-import json
 import os
 from auth import auth
+from config import DATABASE_DIR
+from storage.backends import open_store
+from routes.cars import cars_store, car_deleted_callbacks
+from utils.http_cache import conditional_get, request_args
+from utils.instrumentation import phase
 
 favorites_bp = Blueprint('favorites', __name__)
 
-FAVORITES_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '../database/favorites.json'))
+FAVORITES_FILE = os.path.join(DATABASE_DIR, 'favorites.json')
+
+# Favorites are kept per user as the ids of the cars, in the order they were added
+favorites_store = open_store('favorites', FAVORITES_FILE, default=dict, indent=2)
 
 def read_favorites_db():
-    if not os.path.exists(FAVORITES_FILE):
-        with open(FAVORITES_FILE, 'w') as f:
-            json.dump({}, f)
-        return {}
-    
-    with open(FAVORITES_FILE, 'r') as f:
-        return json.load(f)
+    return favorites_store.read()
 
 def write_favorites_db(favorites):
-    with open(FAVORITES_FILE, 'w') as f:
-        json.dump(favorites, f, indent=2)
+    with phase('write'):
+        favorites_store.write(favorites)
+
+# Replace one user's favorites without rewriting everyone else's
+def write_user_favorites(username, car_ids):
+    with phase('write'):
+        favorites_store.put(username, car_ids)
+
+# Older files stored a copy of each car instead of its id
+def _car_ids(cars):
+    return [car['id'] if isinstance(car, dict) else car for car in cars]
+
+# A user's ids, and the same ids as a set for O(1) membership checks, built
+# once per version of the favorites
+def user_favorite_ids(username):
+    return favorites_store.derived(('ids', username), lambda favorites: _car_ids(favorites.get(username, [])))
+
+def user_favorite_set(username):
+    return favorites_store.derived(('set', username), lambda favorites: set(user_favorite_ids(username)))
+
+# Drop a deleted car from every favorites list that holds it
+def remove_car_from_favorites(car_id):
+    with favorites_store.locked():
+        for username, cars in list(read_favorites_db().items()):
+            car_ids = _car_ids(cars)
+            if car_id in car_ids:
+                write_user_favorites(username, [favorite for favorite in car_ids if favorite != car_id])
+
+car_deleted_callbacks.append(remove_car_from_favorites)
 
 @favorites_bp.route('/favorites', methods=['GET'])
 @auth.login_required
+@conditional_get(favorites_store, cars_store, vary=lambda: (auth.current_user(), request_args()))
 def get_favorites():
     username = auth.current_user()
-    favorites_db = read_favorites_db()
-    
-    # Return empty list if user has no favorites
-    user_favorites = favorites_db.get(username, [])
-    return jsonify(user_favorites)
+    car_ids = user_favorite_ids(username)
+
+    # ids_only=1 returns just the ids, e.g. to mark favorites in the car list
+    if request.args.get('ids_only') == '1':
+        return jsonify(car_ids)
+
+    # Cars are looked up at read time so favorites always show their current data
+    with phase('filter'):
+        cars_index = cars_store.index()
+        cars = [cars_index.get(car_id) for car_id in car_ids]
+    return jsonify([car.to_dict() for car in cars if car is not None])
 
 @favorites_bp.route('/favorites', methods=['POST'])
 @auth.login_required
 def add_favorite():
     username = auth.current_user()
-    car = request.json
-    
-    favorites_db = read_favorites_db()
-    
-    # Initialize user's favorites if not exists
-    if username not in favorites_db:
-        favorites_db[username] = []
-    
-    # Check if car already in favorites
-    for fav in favorites_db[username]:
-        if fav['id'] == car['id']:
+    # The client may send the whole car or just {"id": ...}
+    data = request.get_json(silent=True)
+    car_id = data.get('id') if isinstance(data, dict) else None
+    if not isinstance(car_id, int) or isinstance(car_id, bool):
+        return jsonify({"message": "A numeric car id is required"}), 400
+
+    if cars_store.index().get(car_id) is None:
+        return jsonify({"message": "Car not found"}), 404
+
+    with favorites_store.locked():
+        # Check if car already in favorites
+        if car_id in user_favorite_set(username):
             return jsonify({"message": "Car already in favorites"}), 400
-    
-    # Add to favorites
-    favorites_db[username].append(car)
-    write_favorites_db(favorites_db)
-    
+
+        # Add to favorites
+        write_user_favorites(username, user_favorite_ids(username) + [car_id])
+
     return jsonify({"message": "Car added to favorites"}), 201
 
 @favorites_bp.route('/favorites/<int:car_id>', methods=['DELETE'])
 @auth.login_required
 def remove_favorite(car_id):
     username = auth.current_user()
-    favorites_db = read_favorites_db()
-    
-    # Check if user has favorites
-    if username not in favorites_db:
-        return jsonify({"message": "No favorites found"}), 404
-    
-    # Find and remove car from favorites
-    initial_length = len(favorites_db[username])
-    favorites_db[username] = [car for car in favorites_db[username] if car['id'] != car_id]
-    
-    # If no car was removed
-    if len(favorites_db[username]) == initial_length:
-        return jsonify({"message": "Car not found in favorites"}), 404
-    
-    write_favorites_db(favorites_db)
-    return jsonify({"message": "Car removed from favorites"})
\ No newline at end of file
+    with favorites_store.locked():
+        # Check if user has favorites
+        if username not in read_favorites_db():
+            return jsonify({"message": "No favorites found"}), 404
+
+        # If the car is not in the user's favorites
+        if car_id not in user_favorite_set(username):
+            return jsonify({"message": "Car not found in favorites"}), 404
+
+        write_user_favorites(username, [favorite for favorite in user_favorite_ids(username) if favorite != car_id])
+    return jsonify({"message": "Car removed from favorites"})
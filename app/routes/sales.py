@@ -1,20 +1,35 @@
 from flask import Blueprint, jsonify, request
-import json
 import os
 from auth import auth  # Import auth from the auth module
+from models.sale import Sale
+from storage.backends import open_store
+from storage.columnar import ColumnarSalesStore, import_json_sales
+from config import DATABASE_DIR, SALES_STORAGE, SALES_COLUMNAR_FILE
+from services.sales_aggregates import GROUP_BY_FIELDS, aggregate_cache
+from services.sales_index import indexed_sales, select_row_ids
+from utils.http_cache import conditional_get
+from utils.instrumentation import phase
+from utils.pagination import encode_cursor, json_array_response, ndjson_response, position_after, read_cursor
 
 sales_bp = Blueprint('sales', __name__)
 
-SALES_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '../database/sales.json'))
+SALES_FILE = os.path.join(DATABASE_DIR, 'sales.json')
+
+# sales.json is large, so keep it parsed in memory between requests, or
+# memory-map the columnar copy when SALES_STORAGE=columnar
+if SALES_STORAGE == 'columnar':
+    if not os.path.exists(SALES_COLUMNAR_FILE) and os.path.exists(SALES_FILE):
+        import_json_sales(SALES_FILE, SALES_COLUMNAR_FILE)
+    sales_store = ColumnarSalesStore(SALES_COLUMNAR_FILE)
+else:
+    sales_store = open_store('sales', SALES_FILE, default=list, indent=2, create=False, record_type=Sale)
 
 def read_sales_db():
-    if not os.path.exists(SALES_FILE):
-        return []
-    with open(SALES_FILE, 'r') as f:
-        return json.load(f)
+    return sales_store.read()
 
 @sales_bp.route('/sales', methods=['GET'])
 @auth.login_required  # Add authentication requirement
+@conditional_get(sales_store)
 def get_sales():
     country = request.args.get('country')
     model = request.args.get('model')
@@ -25,32 +40,124 @@ def get_sales():
     # if no specific page/limit is requested
     page = int(request.args.get('page', 1))
     limit = int(request.args.get('limit', 1000))  # Default to a high number
-    
-    sales = read_sales_db()
+    try:
+        after = read_cursor(request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor."}), 400
 
-    # Filter by parameters if provided
+    # Each filter becomes a (field, op, value) criterion answered by the store's indexes
+    criteria = []
     if country:
-        sales = [sale for sale in sales if sale['country'].lower() == country.lower()]
+        criteria.append(('country', 'eq', country))
     if model:
-        sales = [sale for sale in sales if sale['model'].lower() == model.lower()]
-    if sale_year:
-        try:
-            sale_year = int(sale_year)
-            sales = [sale for sale in sales if sale['sale_year'] == sale_year]
-        except ValueError:
-            return jsonify({"error": "Invalid sale_year format. Please provide a valid integer."}), 400
-    
-    if release_year:
+        criteria.append(('model', 'eq', model))
+    for field, value in (('sale_year', sale_year), ('release_year', release_year)):
+        if value:
+            try:
+                criteria.append((field, 'eq', int(value)))
+            except ValueError:
+                return jsonify({"error": f"Invalid {field} format. Please provide a valid integer."}), 400
+
+        # Inclusive ranges such as sale_year_from=2015&sale_year_to=2020
+        low = request.args.get(f'{field}_from')
+        high = request.args.get(f'{field}_to')
+        if low or high:
+            try:
+                low = int(low) if low else None
+                high = int(high) if high else None
+            except ValueError:
+                return jsonify({"error": f"Invalid {field} range. Please provide valid integers."}), 400
+            criteria.append((field, 'range', (low, high)))
+
+    # The sales are read once; the row ids, cursor and rows all come from
+    # that one version even if a write lands meanwhile
+    with phase('filter'):
+        if criteria:
+            sales, index = indexed_sales(sales_store)
+            row_ids = select_row_ids(sales, index, criteria)
+        else:
+            sales = read_sales_db()
+            row_ids = range(len(sales))
+
+    # With a cursor, continue after the sale it points to (rows are in id
+    # order) and return at most limit sales
+    matched = len(row_ids)
+    with phase('paginate'):
+        if after is not None:
+            start = position_after(row_ids, after, lambda row_id: sales[row_id].id)
+            end = start + limit
+            row_ids = row_ids[start:end]
+        # Apply pagination only if a reasonable limit is set
+        elif limit < 1000:
+            start = (page - 1) * limit
+            end = start + limit
+            row_ids = row_ids[start:end]
+        else:
+            end = matched
+
+    # The cursor for the next page goes in a header so the body stays a list
+    next_cursor = None
+    if row_ids and end < matched:
+        next_cursor = encode_cursor(sales[row_ids[-1]].id)
+
+    # Only the rows being returned are materialized, one at a time while the
+    # response is streamed
+    rows = (sales[row_id].to_dict() for row_id in row_ids)
+    if request.args.get('format') == 'ndjson':
+        response = ndjson_response(rows)
+    elif after is None and limit >= 1000:
+        # Full exports are sent as a streamed JSON array
+        response = json_array_response(rows)
+    else:
+        response = jsonify(list(rows))
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
+@sales_bp.route('/sales/aggregate', methods=['GET'])
+@auth.login_required
+@conditional_get(sales_store)
+def get_sales_aggregate():
+    group_by = tuple(field.strip() for field in request.args.get('group_by', 'sale_year').split(',') if field.strip())
+    if not group_by or any(field not in GROUP_BY_FIELDS for field in group_by):
+        return jsonify({"error": f"group_by must be a comma-separated list of: {', '.join(GROUP_BY_FIELDS)}"}), 400
+
+    top = request.args.get('top')
+    if top is not None:
         try:
-            release_year = int(release_year)
-            sales = [sale for sale in sales if sale['release_year'] == release_year]
+            top = int(top)
+            if top < 1:
+                raise ValueError
         except ValueError:
-            return jsonify({"error": "Invalid release_year format. Please provide a valid integer."}), 400
+            return jsonify({"error": "Invalid top format. Please provide a positive integer."}), 400
+
+    # Same filters as /sales, plus make and continent for the dashboard
+    filters = {}
+    for field in ('country', 'model', 'make', 'continent'):
+        value = request.args.get(field)
+        if value:
+            filters[field] = value.lower()
+    for field in ('sale_year', 'release_year'):
+        value = request.args.get(field)
+        if value:
+            try:
+                filters[field] = int(value)
+            except ValueError:
+                return jsonify({"error": f"Invalid {field} format. Please provide a valid integer."}), 400
+
+    # Both the cube and the memoized results are rebuilt only when sales.json changes
+    with phase('filter'):
+        totals = aggregate_cache(sales_store).aggregate(group_by, filters)
 
-    # Apply pagination only if a reasonable limit is set
-    if limit < 1000:
-        start = (page - 1) * limit
-        end = start + limit
-        sales = sales[start:end]
+        if top is not None:
+            # Ties are broken by the group, so every backend ranks them alike
+            ordered = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:top]
+        else:
+            ordered = sorted(totals.items())
 
-    return jsonify(sales), 200
+    groups = [dict(zip(group_by, key), units_sold=units) for key, units in ordered]
+    return jsonify({
+        'group_by': list(group_by),
+        'total_units': sum(totals.values()),
+        'groups': groups
+    }), 200
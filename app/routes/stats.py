@@ -0,0 +1,31 @@
+from flask import Blueprint, Response, jsonify
+from auth import auth
+from utils.http_cache import response_cache
+from utils.instrumentation import metrics
+
+stats_bp = Blueprint('stats', __name__)
+
+# Hit, miss and eviction counters of the GET response cache
+@stats_bp.route('/cache/stats', methods=['GET'])
+@auth.login_required
+def cache_stats():
+    return jsonify(response_cache.stats()), 200
+
+# Request timings, phases, payload sizes and store reloads in the Prometheus
+# text format. Each worker process reports its own
+@stats_bp.route('/metrics', methods=['GET'])
+@auth.login_required
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# The /cache/stats numbers, as counters and gauges
+def response_cache_metrics():
+    rows = []
+    for name, value in response_cache.stats().items():
+        if name in ('hits', 'misses', 'evictions', 'invalidations'):
+            rows.append((f'response_cache_{name}_total', f'Response cache {name}.', 'counter', value))
+        else:
+            rows.append((f'response_cache_{name}', f"Response cache {name.replace('_', ' ')}.", 'gauge', value))
+    return rows
+
+metrics.add_collector(response_cache_metrics)
@@ -0,0 +1,35 @@
+from flask import Blueprint, jsonify, request
+from auth import auth, password_hasher, read_users_db, write_user, users_store
+from utils.instrumentation import phase
+
+users_bp = Blueprint('users', __name__)
+
+# User registration endpoint
+@users_bp.route('/register', methods=['POST'])
+def register():
+    data = request.json
+    username = data.get('username')
+    password = data.get('password')
+    
+    if not username or not password:
+        return jsonify({'error': 'Username and password are required'}), 400
+    
+    if username in read_users_db():
+        return jsonify({'error': 'Username already exists'}), 400
+    
+    # Hash outside the lock, then check again in case of a concurrent registration
+    with phase('auth'):
+        password_hash = password_hasher.hash(password)
+    with users_store.locked():
+        if username in read_users_db():
+            return jsonify({'error': 'Username already exists'}), 400
+        
+        write_user(username, password_hash)
+    
+    return jsonify({'message': 'User registered successfully'}), 201
+
+# User login endpoint (for validation)
+@users_bp.route('/login', methods=['POST'])
+@auth.login_required
+def login():
+    return jsonify({'message': 'Login successful', 'username': auth.current_user()}), 200
@@ -1,15 +1,33 @@
+import argparse
+from array import array
+from collections import deque
+from datetime import datetime
+from itertools import accumulate
 import json
+import math
+import multiprocessing
 import os
 import random
-from datetime import datetime
+import sys
+import time
+
+# Make the app modules (storage, ...) importable when run as a script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-# Define the path to the database files
-DB_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../database'))
-CARS_DB_FILE = os.path.join(DB_DIR, 'db.json')
-SALES_DB_FILE = os.path.join(DB_DIR, 'sales.json')
+from config import DATABASE_DIR
+from models.car import Car
+from models.sale import Sale
+from storage.columnar import ColumnarSalesWriter, import_json_sales
+from storage.sqlite_store import SqliteDatabase
 
-# Ensure the database directory exists
-os.makedirs(DB_DIR, exist_ok=True)
+# numpy is optional; with it each chunk is drawn as whole arrays, without it
+# row by row with the random module. Either way a seed and chunk size produce the
+# same data, whatever the number of processes, but the two produce different
+# data from the same seed
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # Car makes and models
 car_makes_models = {
@@ -82,86 +100,376 @@ countries = [
     "Romania", "Ukraine", "Egypt", "Morocco", "Nigeria", "Kenya", "Israel", "Qatar"
 ]
 
-def generate_cars(num_cars=2000):
-    """Generate a specified number of car records."""
-    cars = []
-    for i in range(num_cars):
-        make = random.choice(list(car_makes_models.keys()))
-        model = random.choice(car_makes_models[make])
-        
-        # Generate a realistic year between 1990 and 2023
-        year = random.randint(1990, 2023)
-        
-        # Generate 1-5 random features
-        num_features = random.randint(1, 5)
-        features = random.sample(car_features, num_features)
-        
-        cars.append({
-            "id": i,
-            "make": make,
-            "model": model,
-            "year": year,
-            "features": features
-        })
-    
-    return cars
-
-def generate_sales(cars, num_sales=10000):
-    """Generate sales data based on the cars."""
-    sales = []
-    sale_id = 0
-    
-    for _ in range(num_sales):
-        # Pick a random car
-        car = random.choice(cars)
-        
-        # Generate sale year (between car year and current year)
-        current_year = datetime.now().year
-        sale_year = random.randint(car["year"], current_year)
-        
-        # Generate random units sold (1-100)
-        units_sold = random.randint(1, 100)
-        
-        # Pick a random country
-        country = random.choice(countries)
-        
-        sales.append({
-            "id": sale_id,
-            "car_id": car["id"],
-            "make": car["make"],
-            "model": car["model"],
-            "release_year": car["year"],
-            "sale_year": sale_year,
-            "units_sold": units_sold,
-            "country": country
-        })
-        
-        sale_id += 1
-    
-    return sales
-
-def save_to_json(data, file_path):
-    """Save data to a JSON file."""
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=4)
+# Every model by index, with the index range of each make's models
+MAKES = list(car_makes_models)
+MODELS = [model for make in MAKES for model in car_makes_models[make]]
+MODEL_COUNTS = [len(car_makes_models[make]) for make in MAKES]
+MODEL_OFFSETS = [0] + list(accumulate(MODEL_COUNTS))[:-1]
+
+# Names already encoded as JSON strings, to format rows without json.dumps
+MODEL_JSON = [json.dumps(model) for model in MODELS]
+MAKE_JSON = [json.dumps(make) for make in MAKES]
+FEATURE_JSON = [json.dumps(feature) for feature in car_features]
+
+MAX_FEATURES = 5
+
+# Each chunk of rows is drawn from its own random generator, seeded with the
+# run's seed and the chunk number, so chunks can be made in any process
+def chunk_random(seed, table, chunk):
+    if np is not None:
+        return np.random.default_rng([seed, table, chunk])
+    return random.Random(f'{seed}-{table}-{chunk}')
+
+def draw_years(rng, count, params):
+    low, high = params['year_range']
+    if np is not None:
+        if params['year_distribution'] == 'recent':
+            return np.minimum(np.floor(rng.triangular(low, high + 1, high + 1, count)), high).astype(np.int64)
+        return rng.integers(low, high + 1, size=count)
+    if params['year_distribution'] == 'recent':
+        return [min(int(rng.triangular(low, high + 1, high + 1)), high) for _ in range(count)]
+    return [rng.randint(low, high) for _ in range(count)]
+
+def draw_units(rng, count, params):
+    low, high = params['units_range']
+    if params['units_distribution'] == 'lognormal':
+        # Most sales are small, a few large; the median is the geometric middle of the range
+        mu, sigma = math.log(math.sqrt(low * high)), params['units_sigma']
+        if np is not None:
+            return np.clip(np.rint(rng.lognormal(mu, sigma, count)), low, high).astype(np.int64)
+        return [min(max(round(rng.lognormvariate(mu, sigma)), low), high) for _ in range(count)]
+    if np is not None:
+        return rng.integers(low, high + 1, size=count)
+    return [rng.randint(low, high) for _ in range(count)]
+
+def generate_car_chunk(task):
+    """Cars start..start+count-1 as a JSON line per car and as columns of
+    make, model and year indexes."""
+    chunk, start, count, params = task
+    rng = chunk_random(params['seed'], 0, chunk)
+    if np is not None:
+        makes = rng.integers(len(MAKES), size=count)
+        models = np.asarray(MODEL_OFFSETS)[makes] + (rng.random(count) * np.asarray(MODEL_COUNTS)[makes]).astype(np.int64)
+        years = draw_years(rng, count, params)
+        feature_counts = rng.integers(1, MAX_FEATURES + 1, size=count).tolist()
+        # The first n of a random permutation are a sample without replacement
+        orders = np.argsort(rng.random((count, len(car_features))), axis=1)[:, :MAX_FEATURES].tolist()
+        makes, models, years = makes.tolist(), models.tolist(), years.tolist()
+    else:
+        makes = [rng.randrange(len(MAKES)) for _ in range(count)]
+        models = [MODEL_OFFSETS[make] + rng.randrange(MODEL_COUNTS[make]) for make in makes]
+        years = draw_years(rng, count, params)
+        feature_counts = [rng.randint(1, MAX_FEATURES) for _ in range(count)]
+        orders = [rng.sample(range(len(car_features)), MAX_FEATURES) for _ in range(count)]
+    features = [order[:feature_count] for order, feature_count in zip(orders, feature_counts)]
+
+    text = None
+    if params['text']:
+        text = '\n'.join(
+            f'{{"id": {start + i}, "make": {MAKE_JSON[make]}, "model": {MODEL_JSON[model]}, "year": {year}, '
+            f'"features": [{", ".join(FEATURE_JSON[feature] for feature in feature_ids)}]}}'
+            for i, (make, model, year, feature_ids) in enumerate(zip(makes, models, years, features)))
+    return {'text': text, 'makes': array('i', makes), 'models': array('i', models), 'years': array('i', years),
+            'features': features if params['rows'] else None}
+
+# The cars' make, model and year indexes, which every sale copies from its car
+_cars = None
+
+def set_cars(makes, models, years):
+    global _cars
+    if np is not None:
+        _cars = tuple(np.frombuffer(column, dtype=np.int32) for column in (makes, models, years))
+    else:
+        _cars = (makes, models, years)
+
+def generate_sale_chunk(task):
+    """Sales start..start+count-1 as a JSON line per sale and as columns, with
+    make, model and country as indexes into MAKES, MODELS and the countries."""
+    chunk, start, count, params = task
+    rng = chunk_random(params['seed'], 1, chunk)
+    car_makes, car_models, car_years = _cars
+    countries, weights = params['countries']
+    sale_year_max = params['sale_year_max']
+    if np is not None:
+        car_ids = rng.integers(len(car_years), size=count)
+        makes, models, release_years = car_makes[car_ids], car_models[car_ids], car_years[car_ids]
+        # Sold between the car's year and sale_year_max
+        spans = np.maximum(sale_year_max - release_years, 0) + 1
+        sale_years = release_years + (rng.random(count) * spans).astype(np.int64)
+        units = draw_units(rng, count, params)
+        country_ids = rng.choice(len(countries), size=count, p=[weight / sum(weights) for weight in weights])
+        columns = {'id': np.arange(start, start + count), 'car_id': car_ids, 'make': makes, 'model': models,
+                   'release_year': release_years, 'sale_year': sale_years, 'units_sold': units,
+                   'country': country_ids}
+        values = {name: column.tolist() for name, column in columns.items()} if params['text'] else None
+    else:
+        car_ids = [rng.randrange(len(car_years)) for _ in range(count)]
+        release_years = [car_years[car_id] for car_id in car_ids]
+        columns = {
+            'id': range(start, start + count),
+            'car_id': car_ids,
+            'make': [car_makes[car_id] for car_id in car_ids],
+            'model': [car_models[car_id] for car_id in car_ids],
+            'release_year': release_years,
+            'sale_year': [rng.randint(year, max(year, sale_year_max)) for year in release_years],
+            'units_sold': draw_units(rng, count, params),
+            'country': rng.choices(range(len(countries)), weights, k=count),
+        }
+        values = columns
+
+    text = None
+    if params['text']:
+        country_json = [json.dumps(country) for country in countries]
+        text = '\n'.join(
+            f'{{"id": {sale_id}, "car_id": {car_id}, "make": {MAKE_JSON[make]}, "model": {MODEL_JSON[model]}, '
+            f'"release_year": {release_year}, "sale_year": {sale_year}, "units_sold": {units_sold}, '
+            f'"country": {country_json[country]}}}'
+            for sale_id, car_id, make, model, release_year, sale_year, units_sold, country in zip(
+                values['id'], values['car_id'], values['make'], values['model'], values['release_year'],
+                values['sale_year'], values['units_sold'], values['country']))
+    return {'text': text, 'columns': columns if params['columns'] else None}
+
+def ordered_map(function, tasks, processes, initializer=None, initargs=()):
+    """function(task) for each task, in order, from `processes` worker processes.
+
+    At most twice as many chunks as there are processes are in flight, so
+    memory stays bounded when writing is slower than generating.
+    """
+    if processes <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(function, tasks)
+        return
+    with multiprocessing.Pool(processes, initializer, initargs) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(function, (task,)))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+def chunk_tasks(rows, chunk_size, params):
+    for chunk, start in enumerate(range(0, rows, chunk_size)):
+        yield chunk, start, min(chunk_size, rows - start), params
+
+class JsonArrayWriter:
+    """Streams rows given as JSON lines into a JSON array, one row per line.
+
+    The array is written next to path and renamed into place once complete,
+    so the app never loads a half-written file. Files kept next to path for
+    the data it replaces, named path plus one of stale_suffixes, are removed
+    once it is in place.
+    """
+
+    def __init__(self, path, stale_suffixes=()):
+        self.path = path
+        self.stale_suffixes = stale_suffixes
+        self._file = open(path + '.tmp', 'w')
+        self._file.write('[')
+        self._first = True
+
+    def write(self, text):
+        if text:
+            self._file.write('\n' if self._first else ',\n')
+            self._file.write(text.replace('\n', ',\n'))
+            self._first = False
+
+    def close(self):
+        self._file.write('\n]\n')
+        self._file.close()
+        os.replace(self.path + '.tmp', self.path)
+        for suffix in self.stale_suffixes:
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+
+class NdjsonWriter(JsonArrayWriter):
+    """Streams JSON lines into a file, one row per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path + '.tmp', 'w')
+
+    def write(self, text):
+        if text:
+            self._file.write(text)
+            self._file.write('\n')
+
+    def close(self):
+        self._file.close()
+        os.replace(self.path + '.tmp', self.path)
+
+def car_rows(result, start):
+    return [Car(start + i, MAKES[make], MODELS[model], year, [car_features[feature] for feature in features])
+            for i, (make, model, year, features) in enumerate(
+                zip(result['makes'], result['models'], result['years'], result['features']))]
+
+def sale_rows(columns, countries):
+    columns = {name: column.tolist() if hasattr(column, 'tolist') else column for name, column in columns.items()}
+    return [Sale(sale_id, car_id, MAKES[make], MODELS[model], release_year, sale_year, units_sold,
+                 countries[country])
+            for sale_id, car_id, make, model, release_year, sale_year, units_sold, country in zip(
+                columns['id'], columns['car_id'], columns['make'], columns['model'], columns['release_year'],
+                columns['sale_year'], columns['units_sold'], columns['country'])]
+
+def parse_countries(text):
+    """'United States:5,China:3,Japan' -> (names, weights); a missing weight is 1."""
+    names, weights = [], []
+    for entry in text.split(','):
+        name, _, weight = entry.strip().partition(':')
+        if name:
+            names.append(name.strip())
+            weights.append(float(weight) if weight else 1.0)
+    if not names or min(weights) < 0 or sum(weights) <= 0:
+        raise argparse.ArgumentTypeError("expected NAME[:WEIGHT],... with non-negative weights")
+    return names, weights
+
+FORMATS = ('json', 'ndjson', 'columnar', 'sqlite')
+
+def parse_formats(text):
+    formats = [name.strip() for name in text.split(',') if name.strip()]
+    unknown = [name for name in formats if name not in FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"expected a comma-separated list of: {', '.join(FORMATS)}")
+    return formats
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate dummy car and sales data.")
+    parser.add_argument('--cars', type=int, default=2000, help="number of cars (default 2000)")
+    parser.add_argument('--sales', type=int, default=10000, help="number of sales (default 10000)")
+    parser.add_argument('--seed', type=int, help="seed for reproducible data; the same seed and chunk size give the same "
+                             "data with any number of processes (default: random, and printed)")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help="worker processes generating chunks (default: one per CPU)")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="rows per chunk (default 50000)")
+    parser.add_argument('--format', type=parse_formats, default=['json'],
+                        help="comma-separated outputs: json (db.json and sales.json, as the app reads them), "
+                             "ndjson (cars.ndjson and sales.ndjson), columnar (sales.col) and sqlite "
+                             "(default json)")
+    parser.add_argument('--db-dir', default=DATABASE_DIR, help="directory to write the files to")
+    parser.add_argument('--sqlite', help="SQLite database to fill (default app.db in --db-dir)")
+    parser.add_argument('--year-range', type=int, nargs=2, default=[1990, 2023], metavar=('FIRST', 'LAST'),
+                        help="range of the cars' years (default 1990 2023)")
+    parser.add_argument('--year-distribution', choices=('uniform', 'recent'), default='uniform',
+                        help="uniform, or recent to make newer years increasingly common")
+    parser.add_argument('--sale-year-max', type=int, default=datetime.now().year,
+                        help="last sale year; sales fall between their car's year and this (default this year)")
+    parser.add_argument('--units-range', type=int, nargs=2, default=[1, 100], metavar=('MIN', 'MAX'),
+                        help="range of units sold per sale (default 1 100)")
+    parser.add_argument('--units-distribution', choices=('uniform', 'lognormal'), default='uniform',
+                        help="uniform, or lognormal for mostly small sales and a few large ones")
+    parser.add_argument('--units-sigma', type=float, default=1.0, help="spread of the lognormal units (default 1)")
+    parser.add_argument('--countries', type=parse_countries, default=(countries, [1.0] * len(countries)),
+                        help="weighted countries as NAME[:WEIGHT],... (default every country, equally)")
+    parser.add_argument('--columnar', action='store_true', help="same as adding columnar to --format")
+    parser.add_argument('--convert-only', action='store_true',
+                        help="only convert the existing sales.json to the columnar format")
+    args = parser.parse_args()
+    if args.columnar and 'columnar' not in args.format:
+        args.format.append('columnar')
+    if args.cars < 1 and args.sales > 0:
+        parser.error("sales need at least one car")
+    if args.year_range[0] > args.year_range[1] or args.units_range[0] > args.units_range[1]:
+        parser.error("ranges must be given as low high")
+    if args.units_range[0] < 1 and args.units_distribution == 'lognormal':
+        parser.error("lognormal units need a range starting at 1 or more")
+    return args
 
 def main():
-    # Generate cars - increased to 2000
-    print("Generating car data...")
-    cars = generate_cars(2000)  # Generate 2000 cars
-    
-    # Generate sales - increased to 10000
-    print("Generating sales data...")
-    sales = generate_sales(cars, 10000)  # Generate 10000 sales records
-    
-    # Save to JSON files
-    print(f"Saving car data to {CARS_DB_FILE}...")
-    save_to_json(cars, CARS_DB_FILE)
-    
-    print(f"Saving sales data to {SALES_DB_FILE}...")
-    save_to_json(sales, SALES_DB_FILE)
-    
-    print(f"Generated {len(cars)} cars and {len(sales)} sales records.")
+    args = parse_args()
+
+    # Define the path to the database files
+    os.makedirs(args.db_dir, exist_ok=True)
+    sales_file = os.path.join(args.db_dir, 'sales.json')
+    columnar_file = os.path.join(args.db_dir, 'sales.col')
+
+    if args.convert_only:
+        print(f"Converting {sales_file} to {columnar_file}...")
+        import_json_sales(sales_file, columnar_file)
+        return
+
+    seed = args.seed if args.seed is not None else random.SystemRandom().randrange(2 ** 32)
+    print(f"Seed: {seed}")
+    formats = args.format
+    params = {
+        'seed': seed,
+        'text': 'json' in formats or 'ndjson' in formats,
+        'rows': 'sqlite' in formats,
+        'columns': 'columnar' in formats or 'sqlite' in formats,
+        'year_range': args.year_range,
+        'year_distribution': args.year_distribution,
+        'sale_year_max': args.sale_year_max,
+        'units_range': args.units_range,
+        'units_distribution': args.units_distribution,
+        'units_sigma': args.units_sigma,
+        'countries': args.countries,
+    }
+    database = SqliteDatabase(args.sqlite or os.path.join(args.db_dir, 'app.db')) if 'sqlite' in formats else None
+
+    def text_writers(cars_or_sales, json_name, stale_suffixes=()):
+        writers = []
+        if 'json' in formats:
+            writers.append(JsonArrayWriter(os.path.join(args.db_dir, json_name), stale_suffixes))
+        if 'ndjson' in formats:
+            writers.append(NdjsonWriter(os.path.join(args.db_dir, f'{cars_or_sales}.ndjson')))
+        return writers
+
+    # Cars: written as they are generated, keeping only their make, model
+    # and year indexes for the sales
+    started = time.perf_counter()
+    print(f"Generating {args.cars} cars...")
+    car_columns = (array('i'), array('i'), array('i'))
+    # The journal (CARS_JOURNAL=1) and id sequence next to db.json belong to
+    # the cars being replaced; a stale journal would be replayed over the new ones
+    writers = text_writers('cars', 'db.json', ('.log', '.seq'))
+
+    def car_chunks():
+        for chunk, result in enumerate(ordered_map(generate_car_chunk, chunk_tasks(args.cars, args.chunk_size, params),
+                                                   args.processes)):
+            for writer in writers:
+                writer.write(result['text'])
+            for column, name in zip(car_columns, ('makes', 'models', 'years')):
+                column.extend(result[name])
+            if database is not None:
+                yield car_rows(result, chunk * args.chunk_size)
+
+    if database is not None:
+        database.cars.write_chunks(car_chunks())
+    else:
+        for _ in car_chunks():
+            pass
+    for writer in writers:
+        writer.close()
+
+    print(f"Generating {args.sales} sales...")
+    writers = text_writers('sales', 'sales.json')
+    columnar = ColumnarSalesWriter(columnar_file) if 'columnar' in formats else None
+    vocabularies = {'make': MAKES, 'model': MODELS, 'country': args.countries[0]}
+
+    def sale_chunks():
+        for result in ordered_map(generate_sale_chunk, chunk_tasks(args.sales, args.chunk_size, params),
+                                  args.processes, set_cars, car_columns):
+            for writer in writers:
+                writer.write(result['text'])
+            if columnar is not None:
+                columnar.write_columns(result['columns'], vocabularies)
+            if database is not None:
+                yield sale_rows(result['columns'], args.countries[0])
+
+    if database is not None:
+        database.sales.write_chunks(sale_chunks())
+    else:
+        for _ in sale_chunks():
+            pass
+    for writer in writers:
+        writer.close()
+    if columnar is not None:
+        columnar.close()
+
+    print(f"Generated {args.cars} cars and {args.sales} sales records as {', '.join(formats)} "
+          f"in {time.perf_counter() - started:.1f}s.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
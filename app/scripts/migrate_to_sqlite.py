@@ -0,0 +1,25 @@
+import argparse
+import os
+import sys
+
+# Make the app modules (storage, config) importable when run as a script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import DATABASE_DIR, SQLITE_DATABASE
+from storage.sqlite_store import JSON_FILES, SqliteDatabase, migrate_from_json
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the JSON stores into a SQLite database.")
+    parser.add_argument('--json-dir', default=DATABASE_DIR, help="directory holding the JSON files")
+    parser.add_argument('--database', default=SQLITE_DATABASE, help="SQLite database to create or overwrite")
+    args = parser.parse_args()
+
+    print(f"Migrating {', '.join(JSON_FILES.values())} from {args.json_dir} to {args.database}...")
+    database = SqliteDatabase(args.database)
+    migrate_from_json(database, args.json_dir)
+
+    for name in JSON_FILES:
+        print(f"  {name}: {len(getattr(database, name).read())} records")
+
+if __name__ == "__main__":
+    main()
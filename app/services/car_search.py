@@ -0,0 +1,216 @@
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+import re
+import threading
+from services.sales_index import intersect_postings
+
+# Weight of a q= match in each field; a car scores its best field per term
+FIELD_WEIGHTS = {'model': 3, 'make': 2, 'features': 1}
+# A term matching a whole word ranks above one that is only a prefix
+EXACT_WORD_BONUS = 1
+
+WORD = re.compile(r'[a-z0-9]+')
+
+
+def words(text):
+    return WORD.findall(text.lower())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# Remove position from postings[key], dropping the key once it has none left
+def remove_posting(postings, key, position):
+    posting = postings[key]
+    del posting[bisect_left(posting, position)]
+    if not posting:
+        del postings[key]
+
+
+def car_terms(car):
+    """(model, features, {word: weight of the best field containing it}) a car is indexed under."""
+    word_weights = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        values = car.features if field == 'features' else [getattr(car, field)]
+        for value in values:
+            for word in words(value):
+                if word_weights.get(word, 0) < weight:
+                    word_weights[word] = weight
+    return car.model.lower(), dict.fromkeys(feature.lower() for feature in car.features), word_weights
+
+
+class CarSearchIndex:
+    """Search structures over the car list.
+
+    Answers the model= substring filter through a trigram index over the
+    distinct model names, q= word prefixes across make, model and features
+    through a sorted word array, and features= through per-feature posting
+    lists. Positions refer to self.cars.
+
+    Built once, then updated in place by the store's row changes through
+    apply_changes(): an inserted car takes the next position and a deleted
+    one leaves None behind, so positions never shift. Readers and updates
+    take self.lock.
+    """
+
+    # Share of deleted positions above which the index is rebuilt instead
+    MAX_DELETED_SHARE = 0.5
+
+    def __init__(self, cars):
+        self.lock = threading.Lock()
+        self.cars = list(cars)
+        self.positions = {}
+        self.deleted = 0
+        models = defaultdict(list)
+        features = defaultdict(list)
+        # word -> {position: weight of the best field containing it}
+        word_weights = defaultdict(dict)
+        for position, car in enumerate(self.cars):
+            self.positions[car.id] = position
+            model, car_features, car_words = car_terms(car)
+            models[model].append(position)
+            for feature in car_features:
+                features[feature].append(position)
+            for word, weight in car_words.items():
+                word_weights[word][position] = weight
+
+        # Cars are visited in order, so every posting list is already sorted
+        self.models = {model: array('l', positions) for model, positions in models.items()}
+        self.features = {feature: array('l', positions) for feature, positions in features.items()}
+        self.words = sorted(word_weights)
+        self.word_weights = [word_weights[word] for word in self.words]
+
+        self.model_trigrams = defaultdict(set)
+        for model in self.models:
+            for trigram in trigrams(model):
+                self.model_trigrams[trigram].add(model)
+
+    def apply_changes(self, changes):
+        """Apply the store's ('insert', car), ('replace', car) and ('delete', id)
+        changes. Returns False once so many cars were deleted that the index
+        is better rebuilt."""
+        with self.lock:
+            for op, value in changes:
+                if op == 'insert':
+                    self.cars.append(value)
+                    self._add(len(self.cars) - 1, value)
+                elif op == 'replace':
+                    position = self.positions.get(value.id)
+                    if position is not None:
+                        self._remove(position)
+                        self.cars[position] = value
+                        self._add(position, value)
+                else:
+                    position = self.positions.get(value)
+                    if position is not None:
+                        self._remove(position)
+                        self.cars[position] = None
+                        del self.positions[value]
+                        self.deleted += 1
+            return self.deleted <= len(self.cars) * self.MAX_DELETED_SHARE
+
+    def _add(self, position, car):
+        self.positions[car.id] = position
+        model, features, word_weights = car_terms(car)
+        if model not in self.models:
+            self.models[model] = array('l')
+            for trigram in trigrams(model):
+                self.model_trigrams[trigram].add(model)
+        insort(self.models[model], position)
+        for feature in features:
+            insort(self.features.setdefault(feature, array('l')), position)
+        for word, weight in word_weights.items():
+            i = bisect_left(self.words, word)
+            if i == len(self.words) or self.words[i] != word:
+                self.words.insert(i, word)
+                self.word_weights.insert(i, {})
+            self.word_weights[i][position] = weight
+
+    def _remove(self, position):
+        model, features, word_weights = car_terms(self.cars[position])
+        remove_posting(self.models, model, position)
+        if model not in self.models:
+            for trigram in trigrams(model):
+                self.model_trigrams[trigram].discard(model)
+                if not self.model_trigrams[trigram]:
+                    del self.model_trigrams[trigram]
+        for feature in features:
+            remove_posting(self.features, feature, position)
+        for word in word_weights:
+            i = bisect_left(self.words, word)
+            del self.word_weights[i][position]
+            if not self.word_weights[i]:
+                del self.words[i]
+                del self.word_weights[i]
+
+    def match_model(self, text):
+        """Positions of the cars whose model contains text, ignoring case."""
+        text = text.lower()
+        candidates = self.models
+        if len(text) >= 3:
+            # Only model names sharing every trigram of the text can contain it
+            grams = sorted((self.model_trigrams.get(gram, set()) for gram in trigrams(text)), key=len)
+            candidates = set.intersection(*grams)
+        matching = [self.models[model] for model in candidates if text in model]
+        positions = array('l')
+        for posting in matching:
+            positions.extend(posting)
+        return array('l', sorted(positions))
+
+    def match_features(self, names):
+        """Positions of the cars having every one of the named features."""
+        return intersect_postings([self.features.get(name.lower(), array('l')) for name in names])
+
+    def _term_scores(self, term):
+        # Best score per position over every word starting with term
+        scores = {}
+        start = bisect_left(self.words, term)
+        for word, weights in zip(self.words[start:], self.word_weights[start:]):
+            if not word.startswith(term):
+                break
+            bonus = EXACT_WORD_BONUS if word == term else 0
+            for position, weight in weights.items():
+                if scores.get(position, 0) < weight + bonus:
+                    scores[position] = weight + bonus
+        return scores
+
+    def rank(self, query):
+        """{position: score} for cars matching every word of query as a prefix
+        of a word in their make, model or features, or None for an empty query."""
+        terms = words(query)
+        if not terms:
+            return None
+        term_scores = sorted((self._term_scores(term) for term in dict.fromkeys(terms)), key=len)
+        totals = dict(term_scores[0])
+        for scores in term_scores[1:]:
+            totals = {position: total + scores[position] for position, total in totals.items() if position in scores}
+        return totals
+
+
+def search_cars(cars_store, model='', query='', features=()):
+    """Cars matching the model substring, q= terms and required features.
+
+    Results ranked by q= score when a query is given, otherwise in store order.
+    """
+    index = cars_store.derived('car_search', CarSearchIndex)
+    with index.lock:
+        postings = []
+        if model:
+            postings.append(index.match_model(model))
+        if features:
+            postings.append(index.match_features(features))
+        scores = index.rank(query)
+        if postings:
+            positions = intersect_postings(postings)
+            if scores is not None:
+                positions = [position for position in positions if position in scores]
+        elif scores is None:
+            return [car for car in index.cars if car is not None]
+        else:
+            positions = scores
+
+        if scores is not None:
+            positions = sorted(positions, key=lambda position: (-scores[position], position))
+        return [index.cars[position] for position in positions]
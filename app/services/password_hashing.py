@@ -0,0 +1,97 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+import multiprocessing
+import os
+import threading
+import time
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when password hashing cannot be done now; retry_after is in seconds."""
+
+    def __init__(self, message, status, retry_after=1):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Runs password hashing and checking on a small, dedicated process pool.
+
+    scrypt takes tens of milliseconds of CPU and 32 MB per call, so running
+    it on request threads lets a burst of logins starve every other request.
+    At most `processes` hashes run at once; once `max_pending` calls are
+    running or waiting, further calls fail fast with HashingBusy (429), and
+    calls that wait longer than `timeout` seconds fail with HashingBusy (503).
+    With processes=0 hashing runs on the calling thread, still bounded by
+    max_pending.
+
+    host_processes bounds the hashes running at once across this process and
+    any forked from it after it was created, such as preloaded gunicorn
+    workers that each run a pool of `processes`.
+    """
+
+    def __init__(self, method, processes, max_pending, timeout, host_processes=None):
+        self.method = method
+        self.processes = processes
+        self.max_pending = max_pending
+        self.timeout = timeout
+        # A semaphore survives fork, so every worker shares this one
+        self._running = multiprocessing.BoundedSemaphore(host_processes) if host_processes else None
+        self._pending = 0
+        self._executor = None
+        self._pid = None
+        self._method_prefix = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # A pool inherited through fork (e.g. by a preloaded gunicorn worker) is unusable
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, function, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HashingBusy("Too many authentication requests, please retry shortly.", 429)
+            self._pending += 1
+        try:
+            if self.processes <= 0:
+                return function(*args)
+            deadline = time.monotonic() + self.timeout
+            if self._running is not None and not self._running.acquire(timeout=self.timeout):
+                raise HashingBusy("Authentication is temporarily unavailable, please retry shortly.", 503)
+            try:
+                future = self._pool().submit(function, *args)
+            except BaseException:
+                if self._running is not None:
+                    self._running.release()
+                raise
+            if self._running is not None:
+                # Released when the hash finishes, even if this call gave up on it
+                future.add_done_callback(lambda future: self._running.release())
+            try:
+                return future.result(timeout=max(0, deadline - time.monotonic()))
+            except TimeoutError:
+                future.cancel()
+                raise HashingBusy("Authentication is temporarily unavailable, please retry shortly.", 503)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether password_hash was made with other parameters than self.method."""
+        if self._method_prefix is None:
+            # werkzeug fills in default parameters, e.g. 'scrypt' -> 'scrypt:32768:8:1'
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._method_prefix
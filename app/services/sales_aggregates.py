@@ -0,0 +1,105 @@
+from collections import defaultdict
+import threading
+from utils.country_mapping import get_continent_from_country
+
+# Every sale is totalled once per distinct (sale_year, country, make, model,
+# release_year); any group_by/filter combination is answered from these cells
+# without touching the individual sales again
+CUBE_FIELDS = ('sale_year', 'country', 'make', 'model', 'release_year')
+
+# Fields /sales/aggregate can group by, as (cube position, transform)
+GROUP_BY_FIELDS = {
+    'sale_year': (0, None),
+    'country': (1, None),
+    'make': (2, None),
+    'model': (3, None),
+    'release_year': (4, None),
+    'continent': (1, get_continent_from_country),
+}
+
+# How many distinct aggregate queries to remember per version of sales.json
+MAX_CACHED_RESULTS = 256
+
+
+def build_sales_cube(sales):
+    """Sum units_sold per distinct (sale_year, country, make, model, release_year)."""
+    # Columnar storage groups its typed columns without building a record per row
+    if hasattr(sales, 'group_units'):
+        return sales.group_units(CUBE_FIELDS)
+
+    cube = defaultdict(int)
+    for sale in sales:
+        key = (sale.sale_year, sale.country, sale.make, sale.model, sale.release_year)
+        cube[key] += sale.units_sold
+    return dict(cube)
+
+
+def _cell_matches(key, filters):
+    sale_year, country, make, model, release_year = key
+    if 'country' in filters and country.lower() != filters['country']:
+        return False
+    if 'model' in filters and model.lower() != filters['model']:
+        return False
+    if 'make' in filters and make.lower() != filters['make']:
+        return False
+    if 'continent' in filters and get_continent_from_country(country).lower() != filters['continent']:
+        return False
+    if 'sale_year' in filters and sale_year != filters['sale_year']:
+        return False
+    if 'release_year' in filters and release_year != filters['release_year']:
+        return False
+    return True
+
+
+def aggregate_sales(cube, group_by, filters):
+    """Total units_sold per group_by tuple over the cube cells matching filters.
+
+    String filters are expected lowercased and year filters as integers.
+    """
+    projections = [GROUP_BY_FIELDS[field] for field in group_by]
+    totals = defaultdict(int)
+    for key, units in cube.items():
+        if filters and not _cell_matches(key, filters):
+            continue
+        group = tuple(transform(key[position]) if transform else key[position]
+                      for position, transform in projections)
+        totals[group] += units
+    return dict(totals)
+
+
+class AggregateCache:
+    """aggregate_sales over one version of the sales cube, memoized.
+
+    A new cache is derived with every version of the sales, so a result is
+    only ever stored next to the cube it was computed from. The results dict
+    is shared by the server's threads and only touched under a lock.
+    """
+
+    def __init__(self, cube):
+        self.cube = cube
+        self.results = {}
+        self._lock = threading.Lock()
+
+    def aggregate(self, group_by, filters):
+        cache_key = (group_by, tuple(sorted(filters.items())))
+        with self._lock:
+            if cache_key in self.results:
+                return self.results[cache_key]
+        # The cube never changes, so the totals are computed outside the lock
+        totals = aggregate_sales(self.cube, group_by, filters)
+        with self._lock:
+            if cache_key not in self.results:
+                if len(self.results) >= MAX_CACHED_RESULTS:
+                    self.results.pop(next(iter(self.results)))
+                self.results[cache_key] = totals
+            return self.results[cache_key]
+
+
+def aggregate_cache(sales_store):
+    """The AggregateCache of the store's current sales.
+
+    The cube is taken inside the same derived() call, under the store lock,
+    so cache and cube always belong to the same version.
+    """
+    return sales_store.derived('aggregate_results',
+                               lambda sales: AggregateCache(sales_store.derived('sales_cube', build_sales_cube)))
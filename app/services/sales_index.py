@@ -0,0 +1,93 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+# Indexed sale fields and how a value is normalized before lookup
+INDEXED_FIELDS = {
+    'country': lambda value: value.lower(),
+    'model': lambda value: value.lower(),
+    'sale_year': int,
+    'release_year': int,
+}
+
+
+class SalesIndex:
+    """Hash indexes from normalized field value to sorted arrays of row ids."""
+
+    def __init__(self, sales):
+        postings = {field: defaultdict(list) for field in INDEXED_FIELDS}
+        for row_id, sale in enumerate(sales):
+            for field, normalize in INDEXED_FIELDS.items():
+                postings[field][normalize(getattr(sale, field))].append(row_id)
+
+        # Rows are visited in order, so every posting list is already sorted
+        self.postings = {
+            field: {value: array('l', row_ids) for value, row_ids in values.items()}
+            for field, values in postings.items()
+        }
+        # Sorted keys of the numeric fields, for range lookups
+        self.sorted_keys = {
+            field: sorted(self.postings[field])
+            for field in ('sale_year', 'release_year')
+        }
+
+    def lookup(self, field, value):
+        return self.postings[field].get(INDEXED_FIELDS[field](value), array('l'))
+
+    def lookup_range(self, field, low=None, high=None):
+        keys = self.sorted_keys[field]
+        start = 0 if low is None else bisect_left(keys, low)
+        end = len(keys) if high is None else bisect_right(keys, high)
+        matching = [self.postings[field][key] for key in keys[start:end]]
+        if len(matching) == 1:
+            return matching[0]
+        row_ids = array('l')
+        for posting in matching:
+            row_ids.extend(posting)
+        return array('l', sorted(row_ids))
+
+
+def intersect_postings(postings):
+    """Row ids present in every posting, probing from the smallest one."""
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for posting in postings[1:]:
+        if not result:
+            break
+        matched = array('l')
+        position = 0
+        for row_id in result:
+            position = bisect_left(posting, row_id, position)
+            if position == len(posting):
+                break
+            if posting[position] == row_id:
+                matched.append(row_id)
+        result = matched
+    return result
+
+
+def indexed_sales(sales_store):
+    """(sales, index) from the same version of the store.
+
+    The index is built inside the same derived() call, under the store lock,
+    so row ids it returns always refer to these sales. Columnar sales filter
+    their mapped columns directly and have no index.
+    """
+    return sales_store.derived('indexed_sales', lambda sales: (
+        sales, None if hasattr(sales, 'match') else sales_store.derived('sales_index', SalesIndex)))
+
+
+def select_row_ids(sales, index, criteria):
+    """Row ids of the sales matching every (field, op, value) criterion.
+
+    op is 'eq' or 'range', the latter with an inclusive (low, high) value.
+    sales and index come from indexed_sales().
+    """
+    if index is None:
+        return sales.match(criteria)
+
+    postings = [
+        index.lookup(field, value) if op == 'eq' else index.lookup_range(field, *value)
+        for field, op, value in criteria
+    ]
+    return intersect_postings(postings)
@@ -0,0 +1,34 @@
+import os
+from config import (DATABASE_DIR, SQLITE_DATABASE, STORAGE_BACKEND, CARS_JOURNAL_COMPACT_AFTER,
+                    CARS_JOURNAL_FSYNC_BATCH, CARS_JOURNAL_FSYNC_INTERVAL)
+from storage.journal import JournaledJsonStore
+from storage.json_store import JsonStore
+from storage.sqlite_store import SqliteDatabase, migrate_from_json
+
+_sqlite_database = None
+
+
+def sqlite_database():
+    """The shared SQLite database, migrated from the JSON files when first created."""
+    global _sqlite_database
+    if _sqlite_database is None:
+        is_new = not os.path.exists(SQLITE_DATABASE)
+        _sqlite_database = SqliteDatabase(SQLITE_DATABASE)
+        if is_new:
+            migrate_from_json(_sqlite_database, DATABASE_DIR)
+    return _sqlite_database
+
+
+def open_store(name, json_path, journal=False, **json_options):
+    """Store called name ('cars', 'sales', 'favorites' or 'users') for the configured backend.
+
+    With the JSON backend, journal=True logs row changes next to the file
+    instead of rewriting it.
+    """
+    if STORAGE_BACKEND == 'sqlite':
+        return getattr(sqlite_database(), name)
+    if journal:
+        return JournaledJsonStore(json_path, compact_after=CARS_JOURNAL_COMPACT_AFTER,
+                                  fsync_batch=CARS_JOURNAL_FSYNC_BATCH,
+                                  fsync_interval=CARS_JOURNAL_FSYNC_INTERVAL, **json_options)
+    return JsonStore(json_path, **json_options)
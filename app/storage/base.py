@@ -0,0 +1,135 @@
+import threading
+from storage.locking import StoreLock
+from storage.record_index import RecordIndex, RecordList
+
+
+class Store:
+    """Bookkeeping shared by every storage backend.
+
+    read() returns the store's data: a list of records with an id attribute
+    (models.car.Car, models.sale.Sale) or a dict keyed by username (users,
+    favorites). Each backend also
+    provides write(data) to replace everything, insert/replace/delete,
+    apply_changes(), next_id() and index() for list stores, and put/remove
+    for dict stores.
+    generation() identifies the stored data across processes, for ETags.
+
+    Every write holds locked(), which also excludes other processes. Callers
+    doing read-check-write sequences hold it around the whole sequence.
+    """
+
+    def __init__(self, lock_path):
+        # Bumped whenever the in-memory data is replaced, so values derived
+        # from it (indexes, aggregates) know when to rebuild
+        self.version = 0
+        self._derived = {}
+        self._lock = threading.RLock()
+        self._write_lock = StoreLock(lock_path, self._lock)
+        self.unique_key = None
+        self._index = None
+        self._listeners = []
+        # Times the data was loaded from storage, and the time that took
+        self.reloads = 0
+        self.reload_seconds = 0.0
+
+    def locked(self):
+        return self._write_lock
+
+    def read(self):
+        raise NotImplementedError
+
+    # The records of a list store are kept in a RecordList, so deleting one
+    # leaves a hole instead of shifting every record after it
+    @staticmethod
+    def _records(data):
+        return RecordList(data) if isinstance(data, (list, RecordList)) else data
+
+    def generation(self):
+        """Token that changes whenever the stored data changes, in any process."""
+        raise NotImplementedError
+
+    def _changed(self):
+        # The data was replaced wholesale
+        self._index = None
+        self._rows_changed()
+
+    def _rows_changed(self, changes=None):
+        # Individual records changed and the index was already updated. When
+        # the ('insert', record), ('replace', record) and ('delete', id)
+        # changes are passed, derived values with an apply_changes(changes)
+        # method that returns True are kept instead of built again
+        self.version += 1
+        kept = {}
+        if changes is not None:
+            for name, value in self._derived.items():
+                apply_changes = getattr(value, 'apply_changes', None)
+                if apply_changes is not None and apply_changes(changes):
+                    kept[name] = value
+        self._derived = kept
+        for listener in self._listeners:
+            listener()
+
+    # Call listener() after every change to the data, whether made by this
+    # process or picked up from another one on read
+    def add_listener(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    # Return build(data), computed once per version of the data
+    def derived(self, name, build):
+        with self._lock:
+            data = self.read()
+            if name not in self._derived:
+                self._derived[name] = build(data)
+            return self._derived[name]
+
+    # Records of a list store can also be looked up by a unique key,
+    # e.g. (model, year) for cars
+    def add_unique_index(self, unique_key):
+        with self._lock:
+            self.unique_key = unique_key
+            self._index = None
+
+    def index(self):
+        """RecordIndex over a list store, built once and then kept up to date by row changes."""
+        with self._lock:
+            return self._record_index(self.read())
+
+    def _record_index(self, records):
+        if self._index is None or self._index.records is not records:
+            self._index = RecordIndex(records, self.unique_key)
+        return self._index
+
+    # Apply a row-level change to the in-memory records and their index
+
+    def _insert_record(self, records, record):
+        self._record_index(records).insert(record)
+        self._rows_changed([('insert', record)])
+
+    def _replace_record(self, records, record):
+        previous = self._record_index(records).replace(record)
+        if previous is not None:
+            self._rows_changed([('replace', record)])
+        return previous
+
+    def _delete_record(self, records, record_id):
+        removed = self._record_index(records).delete(record_id)
+        if removed is not None:
+            self._rows_changed([('delete', record_id)])
+        return removed
+
+    # Apply ('insert', record), ('replace', record) and ('delete', id) changes
+    # in order, returning what each one replaced or removed. The caller
+    # persists them and calls _rows_changed(changes) once for the whole batch.
+    def _apply_records(self, records, changes):
+        index = self._record_index(records)
+        results = []
+        for op, value in changes:
+            if op == 'insert':
+                index.insert(value)
+                results.append(None)
+            elif op == 'replace':
+                results.append(index.replace(value))
+            else:
+                results.append(index.delete(value))
+        return results
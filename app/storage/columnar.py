@@ -0,0 +1,270 @@
+from array import array
+import json
+from math import prod
+import mmap
+import os
+import shutil
+import sys
+from models.sale import FIELDS as ROW_FIELDS, Sale
+from storage.json_store import JsonStore
+
+# Reading a columnar file needs numpy: filters and sums run as array
+# operations over the mapped columns, and a row-by-row scan in Python would
+# be slower than the JSON backend's indexes. Writing one (the data generator,
+# the first import) works without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# File layout: MAGIC, 8-byte little-endian header length, JSON header, padding
+# to 8 bytes, then one int32 array of `rows` values per column, back to back
+MAGIC = b'SALECOL1'
+
+INT_COLUMNS = ('id', 'car_id', 'release_year', 'sale_year', 'units_sold')
+# Strings repeated on every row are stored as int32 codes into a dictionary
+DICTIONARY_COLUMNS = ('make', 'model', 'country')
+COLUMNS = INT_COLUMNS + DICTIONARY_COLUMNS
+
+
+class ColumnarSalesWriter:
+    """Writes a columnar sales file in chunks, without holding every sale in memory.
+
+    Each column is spooled to its own temporary file as chunks arrive and the
+    file is assembled by close(), since the header (row count, dictionaries)
+    precedes the columns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.dictionaries = {name: {} for name in DICTIONARY_COLUMNS}
+        self._spools = {name: open(f'{path}.{name}.tmp', 'w+b') for name in COLUMNS}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+
+    def write_rows(self, sales):
+        """Append an iterable of Sale records."""
+        columns = {name: array('i') for name in COLUMNS}
+        for sale in sales:
+            for name in INT_COLUMNS:
+                columns[name].append(getattr(sale, name))
+            for name in DICTIONARY_COLUMNS:
+                codes = self.dictionaries[name]
+                columns[name].append(codes.setdefault(getattr(sale, name), len(codes)))
+        self._append(columns)
+
+    def write_columns(self, columns, vocabularies):
+        """Append equally long columns of ints.
+
+        The string columns hold indexes into vocabularies[name], a list of
+        the strings, which is cheaper to produce than the strings themselves.
+        """
+        encoded = {}
+        for name in COLUMNS:
+            if name in DICTIONARY_COLUMNS:
+                codes = self.dictionaries[name]
+                mapping = array('i', (codes.setdefault(value, len(codes)) for value in vocabularies[name]))
+                if np is not None:
+                    encoded[name] = np.asarray(mapping)[np.asarray(columns[name], dtype=np.int64)]
+                else:
+                    encoded[name] = array('i', (mapping[index] for index in columns[name]))
+            else:
+                encoded[name] = columns[name]
+        self._append(encoded)
+
+    def _append(self, columns):
+        rows = len(columns['id'])
+        for name in COLUMNS:
+            column = columns[name]
+            if len(column) != rows:
+                raise ValueError(f"Column {name} has {len(column)} values, expected {rows}")
+            if np is not None:
+                np.asarray(column, dtype=np.int32).tofile(self._spools[name])
+            else:
+                (column if isinstance(column, array) and column.typecode == 'i' else array('i', column)).tofile(
+                    self._spools[name])
+        self.rows += rows
+
+    def close(self):
+        header = json.dumps({
+            'rows': self.rows,
+            'byteorder': sys.byteorder,
+            'columns': list(COLUMNS),
+            'dictionaries': {name: list(codes) for name, codes in self.dictionaries.items()},
+        }).encode('utf-8')
+        padding = -(len(MAGIC) + 8 + len(header)) % 8
+
+        # Write to a temporary file first so readers never map a half-written file
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            f.write(b'\0' * padding)
+            for name in COLUMNS:
+                spool = self._spools[name]
+                spool.seek(0)
+                shutil.copyfileobj(spool, f, 1024 * 1024)
+        os.replace(temp_path, self.path)
+        self._discard()
+
+    def _discard(self):
+        for name, spool in self._spools.items():
+            spool.close()
+            os.remove(f'{self.path}.{name}.tmp')
+        self._spools = {}
+
+
+def require_numpy():
+    if np is None:
+        raise RuntimeError("Columnar sales storage needs numpy; install it with "
+                           "pip install -r requirements.txt or set SALES_STORAGE=json")
+
+
+def write_columnar_sales(sales, path):
+    """Encode an iterable of Sale records into a columnar file at path."""
+    with ColumnarSalesWriter(path) as writer:
+        writer.write_rows(sales)
+
+
+def import_json_sales(json_path, path):
+    """Convert an existing sales.json into the columnar format."""
+    with open(json_path, 'r') as f:
+        write_columnar_sales(json.load(f, object_hook=Sale.from_dict), path)
+
+
+class ColumnarSales:
+    """Read-only, memory-mapped view of a columnar sales file.
+
+    Behaves like a list of Sale records for indexing and iteration, building
+    a record only for the rows that are actually accessed.
+    """
+
+    def __init__(self, path):
+        require_numpy()
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a columnar sales file")
+        header_start = len(MAGIC) + 8
+        header_length = int.from_bytes(self._mmap[len(MAGIC):header_start], 'little')
+        header = json.loads(self._mmap[header_start:header_start + header_length])
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {header['byteorder']}-endian machine")
+
+        self.rows = header['rows']
+        self.dictionaries = header['dictionaries']
+        self.columns = {}
+        offset = header_start + header_length
+        offset += -offset % 8
+        for name in header['columns']:
+            self.columns[name] = np.frombuffer(self._mmap, dtype=np.int32, count=self.rows, offset=offset)
+            offset += 4 * self.rows
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row_id):
+        if row_id < 0 or row_id >= self.rows:
+            raise IndexError(row_id)
+        return Sale(*(self.value(field, row_id) for field in ROW_FIELDS))
+
+    def __iter__(self):
+        for row_id in range(self.rows):
+            yield self[row_id]
+
+    def value(self, field, row_id):
+        code = int(self.columns[field][row_id])
+        if field in self.dictionaries:
+            return self.dictionaries[field][code]
+        return code
+
+    # Codes whose dictionary value equals value, ignoring case
+    def codes_for(self, field, value):
+        value = value.lower()
+        return [code for code, entry in enumerate(self.dictionaries[field]) if entry.lower() == value]
+
+    def match(self, criteria):
+        """Row ids matching every (field, op, value) criterion, in row order.
+
+        op is 'eq' (value compared case-insensitively for string fields) or
+        'range' with value an inclusive (low, high) pair where either end may
+        be None.
+        """
+        mask = np.ones(self.rows, dtype=bool)
+        for field, op, value in criteria:
+            column = self.columns[field]
+            if field in self.dictionaries:
+                mask &= np.isin(column, self.codes_for(field, value))
+            elif op == 'eq':
+                mask &= column == value
+            else:
+                low, high = value
+                if low is not None:
+                    mask &= column >= low
+                if high is not None:
+                    mask &= column <= high
+        return np.flatnonzero(mask).tolist()
+
+    def group_units(self, fields):
+        """Sum units_sold per distinct tuple of the given fields' values."""
+        if not self.rows:
+            return {}
+        columns = [self.columns[field] for field in fields]
+        lows = [int(column.min()) for column in columns]
+        spans = [int(column.max()) - low + 1 for column, low in zip(columns, lows)]
+        if prod(spans) < 2 ** 63:
+            # Pack each row's values into one int64, column by column in mixed
+            # radix, so grouping is a one-dimensional unique instead of a much
+            # slower unique over rows
+            keys = np.zeros(self.rows, dtype=np.int64)
+            for column, low, span in zip(columns, lows, spans):
+                keys *= span
+                keys += column
+                keys -= low
+            packed, inverse = np.unique(keys, return_inverse=True)
+            groups = []
+            for span, low in zip(reversed(spans), reversed(lows)):
+                groups.append(packed % span + low)
+                packed = packed // span
+            groups.reverse()
+        else:
+            unique_rows, inverse = np.unique(np.stack(columns, axis=1), axis=0, return_inverse=True)
+            groups = list(unique_rows.T)
+        sums = np.bincount(inverse.ravel(), weights=self.columns['units_sold'], minlength=len(groups[0]))
+
+        # Decode whole columns at once, then pair them up
+        values = []
+        for field, group in zip(fields, groups):
+            if field in self.dictionaries:
+                values.append(np.array(self.dictionaries[field], dtype=object)[group].tolist())
+            else:
+                values.append(group.tolist())
+        return dict(zip(zip(*values), sums.astype(np.int64).tolist()))
+
+
+class ColumnarSalesStore(JsonStore):
+    """Store backed by a columnar sales file, remapped when the file changes."""
+
+    def __init__(self, path):
+        # Fail when the app starts rather than on the first request
+        require_numpy()
+        super().__init__(path, default=list, create=False)
+
+    def _load(self):
+        return ColumnarSales(self.path)
+
+    def write(self, sales):
+        with self.locked():
+            write_columnar_sales(sales, self.path)
+            self._data = self._load()
+            self._stamp = self._file_stamp()
+            self._changed()
@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+from storage.json_store import JsonStore
+
+
+class JournaledJsonStore(JsonStore):
+    """JSON list store of records that appends row changes to a log instead of rewriting the file.
+
+    The JSON file is a snapshot; every insert, replace or delete appends one
+    line to `<path>.log`. Loading reads the snapshot and replays the log.
+    Once the log holds compact_after entries it is folded into a new
+    snapshot, written atomically, and truncated.
+    """
+
+    def __init__(self, path, compact_after=1000, fsync_batch=32, fsync_interval=1.0, **options):
+        super().__init__(path, **options)
+        self.log_path = path + '.log'
+        self.compact_after = compact_after
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self._log_file = None
+        self._log_entries = 0
+        self._unsynced = 0
+        self._sync_timer = None
+
+    # Changes to either the snapshot or the log trigger a reload
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.log_path)
+            log_stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            log_stamp = None
+        return (super()._file_stamp(), log_stamp)
+
+    def _load(self):
+        # The log may have been compacted by another process; reopen it on next append
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        records = super()._load() if os.path.exists(self.path) else self.default()
+        self._log_entries = self._replay(records)
+        return records
+
+    # Apply the logged changes to records in place, returning how many there were.
+    # Replaying is idempotent: a 'put' replaces the record with the same id or
+    # appends it, and a 'delete' of a missing id does nothing.
+    def _replay(self, records):
+        if not os.path.exists(self.log_path):
+            return 0
+        by_id = {record.id: record for record in records}
+        entries = 0
+        with open(self.log_path, 'r') as f:
+            for line in f:
+                # A last line without a newline is an append still being
+                # written by another process, or torn by a crash; the next
+                # append here cuts a torn one off (see _open_log)
+                if not line.endswith('\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line that was torn before the fix above, with the next
+                    # entry written straight after it; only that line is lost
+                    continue
+                if entry['op'] == 'put':
+                    record = self.record_type.from_dict(entry['record'])
+                    by_id[record.id] = record
+                elif entry['op'] == 'delete':
+                    by_id.pop(entry['id'], None)
+                entries += 1
+        records[:] = by_id.values()
+        return entries
+
+    # Appends only happen under the write lock, so when the log does not end
+    # with a newline the last append was torn by a crash. The partial line is
+    # truncated away first, so the next entry does not end up glued to it
+    def _open_log(self):
+        try:
+            with open(self.log_path, 'r+b') as f:
+                size = f.seek(0, os.SEEK_END)
+                if size:
+                    f.seek(size - 1)
+                    if f.read(1) != b'\n':
+                        f.seek(0)
+                        f.truncate(f.read().rfind(b'\n') + 1)
+                        os.fsync(f.fileno())
+        except FileNotFoundError:
+            pass
+        return open(self.log_path, 'a')
+
+    def _append(self, *entries):
+        if self._log_file is None:
+            self._log_file = self._open_log()
+        self._log_file.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+        self._log_file.flush()
+        self._log_entries += len(entries)
+        self._unsynced += len(entries)
+
+        # fsync in batches: immediately once fsync_batch entries are pending,
+        # otherwise at most fsync_interval seconds after the first one
+        if self._unsynced >= self.fsync_batch:
+            self.sync()
+        elif self._sync_timer is None:
+            self._sync_timer = threading.Timer(self.fsync_interval, self.sync)
+            self._sync_timer.daemon = True
+            self._sync_timer.start()
+
+        if self._log_entries >= self.compact_after:
+            self.compact()
+        else:
+            self._stamp = self._file_stamp()
+
+    def sync(self):
+        with self._lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+            if self._log_file is not None and self._unsynced:
+                os.fsync(self._log_file.fileno())
+            self._unsynced = 0
+
+    def _truncate_log(self):
+        if self._sync_timer is not None:
+            self._sync_timer.cancel()
+            self._sync_timer = None
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self._log_entries = 0
+        self._unsynced = 0
+
+    # Replacing everything writes a fresh snapshot and starts an empty log
+    def write(self, data):
+        with self.locked():
+            self._data = self._records(data)
+            self._changed()
+            self._dump(data)
+            self._truncate_log()
+            self._stamp = self._file_stamp()
+
+    # Fold the log into a new snapshot; the data itself is unchanged
+    def compact(self):
+        with self.locked():
+            self._dump(self.read())
+            self._truncate_log()
+            self._stamp = self._file_stamp()
+
+    def insert(self, record):
+        with self.locked():
+            self._insert_record(self.read(), record)
+            self._append({'op': 'put', 'record': record.to_dict()})
+
+    def replace(self, record):
+        with self.locked():
+            previous = self._replace_record(self.read(), record)
+            if previous is not None:
+                self._append({'op': 'put', 'record': record.to_dict()})
+            return previous
+
+    def delete(self, record_id):
+        with self.locked():
+            removed = self._delete_record(self.read(), record_id)
+            if removed is not None:
+                self._append({'op': 'delete', 'id': record_id})
+            return removed
+
+    # Many row changes, appended to the log in one write
+    def apply_changes(self, changes):
+        with self.locked():
+            results = self._apply_records(self.read(), changes)
+            self._rows_changed(changes)
+            entries = []
+            for (op, value), result in zip(changes, results):
+                if op == 'insert' or (op == 'replace' and result is not None):
+                    entries.append({'op': 'put', 'record': value.to_dict()})
+                elif op == 'delete' and result is not None:
+                    entries.append({'op': 'delete', 'id': value})
+            if entries:
+                self._append(*entries)
+            return results
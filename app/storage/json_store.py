@@ -0,0 +1,157 @@
+import json
+import os
+import tempfile
+import time
+from storage.base import Store
+from storage.record_index import RecordList
+from utils.instrumentation import phase
+
+
+class JsonStore(Store):
+    """A JSON file kept in memory and reloaded only when it changes on disk.
+
+    With a record_type (models.car.Car, models.sale.Sale) the file is a list
+    of objects, held in memory as records built with record_type.from_dict
+    and written back with to_dict().
+    """
+
+    def __init__(self, path, default=list, indent=4, create=True, record_type=None):
+        super().__init__(path + '.lock')
+        self.path = path
+        self.default = default
+        self.indent = indent
+        self.create = create
+        self.record_type = record_type
+        self._data = None
+        self._stamp = None
+
+    def ensure_exists(self):
+        if not os.path.exists(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump(self.default(), f, indent=self.indent)
+
+    # (mtime, size, inode) of the file, or None when it does not exist. Every
+    # save renames a new file into place, so the inode changes even when the
+    # mtime does not
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def read(self):
+        with self._lock:
+            if self.create:
+                self.ensure_exists()
+            stamp = self._file_stamp()
+            if self._data is None or stamp != self._stamp:
+                start = time.perf_counter()
+                with phase('store_load'):
+                    self._data = self._records(self.default() if stamp is None else self._load())
+                    self._stamp = stamp
+                    self._changed()
+                self.reloads += 1
+                self.reload_seconds += time.perf_counter() - start
+            return self._data
+
+    # The file stamp the in-memory data was loaded from or saved as
+    def generation(self):
+        with self._lock:
+            self.read()
+            return self._stamp
+
+    # Records are built as each object is parsed, so the whole file is never
+    # held as dicts
+    def _load(self):
+        with open(self.path, 'r') as f:
+            if self.record_type is not None:
+                return json.load(f, object_hook=self.record_type.from_dict)
+            return json.load(f)
+
+    # Update the in-memory copy first, then persist it
+    def write(self, data):
+        with self.locked():
+            self._data = self._records(data)
+            self._changed()
+            self._save()
+
+    # Persist the in-memory data after it was changed in place
+    def _save(self):
+        self._dump(self._data)
+        self._stamp = self._file_stamp()
+
+    # Write to a temporary file and rename it over the original, so readers
+    # never see a half-written file even when two writes overlap
+    def _dump(self, data):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+            json.dump(list(data) if isinstance(data, RecordList) else data, f, indent=self.indent,
+                      default=self.record_type.to_dict if self.record_type is not None else None)
+            f.flush()
+            os.fsync(f.fileno())
+        # Keep the permissions of the file being replaced
+        if os.path.exists(self.path):
+            os.chmod(f.name, os.stat(self.path).st_mode & 0o777)
+        os.replace(f.name, self.path)
+
+    # Ids are never reused: the last one handed out is kept in <path>.seq.
+    # count ids are reserved at once and the first of them returned
+    def next_id(self, count=1):
+        with self.locked():
+            sequence_path = self.path + '.seq'
+            try:
+                with open(sequence_path, 'r') as f:
+                    last_id = int(f.read())
+            except (FileNotFoundError, ValueError):
+                last_id = -1
+            max_id = self.index().max_id
+            next_id = max(last_id, -1 if max_id is None else max_id) + 1
+            with open(sequence_path, 'w') as f:
+                f.write(str(next_id + count - 1))
+            return next_id
+
+    # Row-level changes; a JSON file can only be rewritten as a whole
+
+    def insert(self, record):
+        with self.locked():
+            self._insert_record(self.read(), record)
+            self._save()
+
+    def replace(self, record):
+        with self.locked():
+            previous = self._replace_record(self.read(), record)
+            if previous is not None:
+                self._save()
+            return previous
+
+    def delete(self, record_id):
+        with self.locked():
+            removed = self._delete_record(self.read(), record_id)
+            if removed is not None:
+                self._save()
+            return removed
+
+    # Many row changes, written out once
+    def apply_changes(self, changes):
+        with self.locked():
+            results = self._apply_records(self.read(), changes)
+            self._rows_changed(changes)
+            self._save()
+            return results
+
+    def put(self, key, value):
+        with self.locked():
+            self.read()[key] = value
+            self._rows_changed()
+            self._save()
+
+    def remove(self, key):
+        with self.locked():
+            data = self.read()
+            if key in data:
+                del data[key]
+                self._rows_changed()
+                self._save()
@@ -0,0 +1,54 @@
+import threading
+
+# fcntl is POSIX-only; elsewhere the lock only serializes threads of one process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class StoreLock:
+    """Re-entrant lock held across threads and, via flock on a lock file, across processes.
+
+    Writers in this process first queue on their own mutex, then wait for
+    the file lock, and only then take `lock`, the store's data lock. Readers
+    only take the data lock, so they are never stuck behind another process
+    holding the file.
+
+    The lock file is opened on the outermost acquire and closed on release,
+    so a forked worker never shares its parent's lock.
+    """
+
+    def __init__(self, path, lock=None):
+        self.path = path
+        self._lock = lock or threading.RLock()
+        # Serializes this process's writers: threads share the lock file's
+        # descriptor, and flock would let a second thread straight through
+        self._writers = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._writers.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                self._file = open(self.path, 'a')
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._writers.release()
+                raise
+        self._lock.acquire()
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        self._lock.release()
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._writers.release()
@@ -0,0 +1,207 @@
+from array import array
+from bisect import bisect_right, insort
+
+
+class RecordList:
+    """The records of a list store, in order, with O(1) removal.
+
+    Deleting a record leaves a hole (None) in self.slots instead of shifting
+    every later record down, and compact() squeezes the holes out later in
+    one pass. Reads see a list of the remaining records and go straight to
+    the underlying list while there are no holes.
+    """
+
+    def __init__(self, records=()):
+        self.slots = records if type(records) is list else list(records)
+        # Sorted slots of the deleted records
+        self.holes = array('q')
+
+    def __len__(self):
+        return len(self.slots) - len(self.holes)
+
+    def __iter__(self):
+        if not self.holes:
+            return iter(self.slots)
+        return (record for record in self.slots if record is not None)
+
+    def __getitem__(self, item):
+        if not self.holes:
+            return self.slots[item]
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                return list(self)[item]
+            if start >= stop:
+                return []
+            return [record for record in self.slots[self._slot(start):self._slot(stop - 1) + 1]
+                    if record is not None]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('record index out of range')
+        return self.slots[self._slot(item)]
+
+    def _slot(self, position):
+        # The first slot with position + 1 remaining records up to it
+        low, high = position, position + len(self.holes)
+        while low < high:
+            middle = (low + high) // 2
+            if middle + 1 - bisect_right(self.holes, middle) > position:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def append(self, record):
+        """Add record at the end, returning its slot."""
+        self.slots.append(record)
+        return len(self.slots) - 1
+
+    def remove_slot(self, slot):
+        record = self.slots[slot]
+        self.slots[slot] = None
+        insort(self.holes, slot)
+        return record
+
+    def compact(self):
+        # A new list, so readers iterating the old one are not disturbed
+        self.slots = [record for record in self.slots if record is not None]
+        self.holes = array('q')
+
+
+class RecordIndex:
+    """Id and unique-key lookups over a store's RecordList, updated in place by row changes.
+
+    Each record's slot is kept by id, so a record is found, replaced or
+    deleted with a dict lookup whatever order the records are in. A delete
+    leaves a hole in the list; once holes make up COMPACT_SHARE of the slots
+    the list is compacted and the slots renumbered, an O(n) pass paid for by
+    the deletes before it.
+    """
+
+    COMPACT_SHARE = 0.125
+
+    def __init__(self, records, unique_key=None):
+        self.records = records
+        self.unique_key = unique_key
+        # id -> slot in records
+        self.slots = {}
+        # unique key -> ids of the records sharing it (normally one)
+        self.unique = {}
+        # Whether the slots are in ascending id order, as ids from the
+        # monotonic sequence are
+        self.ordered = True
+        self.max_id = None
+        self._last_id = None
+        for slot, record in enumerate(records.slots):
+            if record is not None:
+                self._add(record, slot)
+
+    def _add(self, record, slot):
+        record_id = record.id
+        if self._last_id is not None and record_id <= self._last_id:
+            self.ordered = False
+        self._last_id = record_id
+        self.slots[record_id] = slot
+        if self.unique_key is not None:
+            self.unique.setdefault(self.unique_key(record), []).append(record_id)
+        if self.max_id is None or record_id > self.max_id:
+            self.max_id = record_id
+
+    def _forget_unique(self, record):
+        if self.unique_key is None:
+            return
+        key = self.unique_key(record)
+        ids = self.unique.get(key, [])
+        if record.id in ids:
+            ids.remove(record.id)
+        if not ids:
+            self.unique.pop(key, None)
+
+    def get(self, record_id):
+        slot = self.slots.get(record_id)
+        return None if slot is None else self.records.slots[slot]
+
+    def find_unique(self, key, exclude_id=None):
+        """Id of a record whose unique key is key, other than exclude_id."""
+        for record_id in self.unique.get(key, ()):
+            if record_id != exclude_id:
+                return record_id
+        return None
+
+    def insert(self, record):
+        self._add(record, self.records.append(record))
+
+    def replace(self, record):
+        slot = self.slots.get(record.id)
+        if slot is None:
+            return None
+        previous = self.records.slots[slot]
+        self.records.slots[slot] = record
+        self._forget_unique(previous)
+        if self.unique_key is not None:
+            self.unique.setdefault(self.unique_key(record), []).append(record.id)
+        return previous
+
+    def delete(self, record_id):
+        slot = self.slots.pop(record_id, None)
+        if slot is None:
+            return None
+        removed = self.records.remove_slot(slot)
+        self._forget_unique(removed)
+        if len(self.records.holes) > len(self.records.slots) * self.COMPACT_SHARE:
+            self.records.compact()
+            self.slots = {record.id: slot for slot, record in enumerate(self.records.slots)}
+        return removed
+
+
+class StagedChanges:
+    """A RecordIndex as it would be after a batch of not yet applied changes.
+
+    Offers the same get and find_unique lookups, so a batch can be validated
+    one record at a time against the earlier records of the same batch, and
+    collects the changes in the form apply_changes() takes.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.changes = []
+        # id -> record after the batch, or None once deleted
+        self._staged = {}
+        self._unique = {}
+
+    def get(self, record_id):
+        if record_id in self._staged:
+            return self._staged[record_id]
+        return self.index.get(record_id)
+
+    def find_unique(self, key, exclude_id=None):
+        for record_id in self._unique.get(key, ()):
+            if record_id != exclude_id:
+                return record_id
+        for record_id in self.index.unique.get(key, ()):
+            if record_id != exclude_id and record_id not in self._staged:
+                return record_id
+        return None
+
+    def _stage(self, record_id, record):
+        previous = self.get(record_id)
+        if previous is not None and self.index.unique_key is not None:
+            ids = self._unique.get(self.index.unique_key(previous))
+            if ids is not None:
+                ids.discard(record_id)
+        self._staged[record_id] = record
+        if record is not None and self.index.unique_key is not None:
+            self._unique.setdefault(self.index.unique_key(record), set()).add(record_id)
+
+    def insert(self, record):
+        self._stage(record.id, record)
+        self.changes.append(('insert', record))
+
+    def replace(self, record):
+        self._stage(record.id, record)
+        self.changes.append(('replace', record))
+
+    def delete(self, record_id):
+        self._stage(record_id, None)
+        self.changes.append(('delete', record_id))
@@ -0,0 +1,359 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from models.car import Car
+from models.sale import FIELDS as SALE_FIELDS, Sale
+from storage.base import Store
+from utils.instrumentation import phase
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS store_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS id_sequences (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS cars (
+    id INTEGER PRIMARY KEY,
+    make TEXT NOT NULL,
+    model TEXT NOT NULL,
+    year INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cars_model_year ON cars (model, year);
+
+CREATE TABLE IF NOT EXISTS car_features (
+    car_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    feature TEXT NOT NULL,
+    PRIMARY KEY (car_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY,
+    car_id INTEGER NOT NULL,
+    make TEXT NOT NULL,
+    model TEXT NOT NULL,
+    release_year INTEGER NOT NULL,
+    sale_year INTEGER NOT NULL,
+    units_sold INTEGER NOT NULL,
+    country TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sales_country ON sales (country COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS sales_model ON sales (model COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS sales_sale_year ON sales (sale_year);
+CREATE INDEX IF NOT EXISTS sales_release_year ON sales (release_year);
+
+CREATE TABLE IF NOT EXISTS favorite_ids (
+    username TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    car_id INTEGER NOT NULL,
+    PRIMARY KEY (username, position)
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL
+);
+"""
+
+# JSON file each store is migrated from
+JSON_FILES = {
+    'cars': 'db.json',
+    'sales': 'sales.json',
+    'favorites': 'favorites.json',
+    'users': 'users.json',
+}
+# Stores whose rows are records, built from the JSON objects
+RECORD_TYPES = {'cars': Car, 'sales': Sale}
+
+
+class SqliteDatabase:
+    """One SQLite file in WAL mode holding every store, with a connection per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self.connection()
+        with conn:
+            conn.executescript(SCHEMA)
+            conn.executemany("INSERT OR IGNORE INTO store_versions (name) VALUES (?)",
+                             [(name,) for name in JSON_FILES])
+            # Favorites used to be stored as copies of the cars
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'favorites'").fetchone():
+                conn.execute("INSERT INTO favorite_ids (username, position, car_id) "
+                             "SELECT username, position, car_id FROM favorites")
+                conn.execute("DROP TABLE favorites")
+
+        self.cars = SqliteCarStore(self)
+        self.sales = SqliteSalesStore(self)
+        self.favorites = SqliteFavoritesStore(self)
+        self.users = SqliteUsersStore(self)
+
+    def connection(self):
+        # Connections must not be shared across threads or inherited across a fork
+        conn = getattr(self._local, 'connection', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def store_version(self, conn, name):
+        return conn.execute("SELECT version FROM store_versions WHERE name = ?", (name,)).fetchone()[0]
+
+    def bump_version(self, conn, name):
+        conn.execute("UPDATE store_versions SET version = version + 1 WHERE name = ?", (name,))
+        return self.store_version(conn, name)
+
+
+class SqliteStore(Store):
+    """A table (or tables) cached in memory until another writer changes them."""
+
+    name = None
+
+    def __init__(self, database):
+        super().__init__(f"{database.path}.{self.name}.lock")
+        self.database = database
+        self._data = None
+        self._stored_version = None
+
+    def read(self):
+        with self._lock:
+            conn = self.database.connection()
+            stored_version = self.database.store_version(conn, self.name)
+            if self._data is None or stored_version != self._stored_version:
+                start = time.perf_counter()
+                with phase('store_load'):
+                    self._data = self._records(self._load(conn))
+                    self._stored_version = stored_version
+                    self._changed()
+                self.reloads += 1
+                self.reload_seconds += time.perf_counter() - start
+            return self._data
+
+    # The version counter shared by every process using the database
+    def generation(self):
+        with self._lock:
+            self.read()
+            return self._stored_version
+
+    def _load(self, conn):
+        raise NotImplementedError
+
+    # Run write_rows(conn) in one transaction that also bumps the store's
+    # version, then apply the same change to the cached data with
+    # apply(data). If another process wrote in between, the cache is
+    # dropped and reloaded on the next read instead. changes are the row
+    # changes made, passed on to _rows_changed().
+    def _write(self, write_rows, apply, replaces_all=False, changes=None):
+        with self.locked():
+            data = self.read()
+            conn = self.database.connection()
+            with conn:
+                write_rows(conn)
+                stored_version = self.database.bump_version(conn, self.name)
+            result = apply(data)
+            if stored_version != self._stored_version + 1:
+                self._data = None
+                self._changed()
+            elif replaces_all:
+                self._changed()
+            else:
+                self._rows_changed(changes)
+            self._stored_version = stored_version
+            return result
+
+    def write(self, data):
+        def write_rows(conn):
+            self._delete_all(conn)
+            self._insert_all(conn, data)
+
+        def apply(_):
+            self._data = self._records(data)
+
+        self._write(write_rows, apply, replaces_all=True)
+
+    # Replace everything with rows that arrive in chunks (lists of records),
+    # e.g. from a generator of more rows than fit in memory. The rows are
+    # loaded again on the next read
+    def write_chunks(self, chunks):
+        with self.locked():
+            conn = self.database.connection()
+            with conn:
+                self._delete_all(conn)
+                for chunk in chunks:
+                    self._insert_all(conn, chunk)
+                self.database.bump_version(conn, self.name)
+            self._data = None
+            self._changed()
+
+    def _delete_all(self, conn):
+        raise NotImplementedError
+
+    def _insert_all(self, conn, data):
+        raise NotImplementedError
+
+
+class SqliteCarStore(SqliteStore):
+    name = 'cars'
+
+    # Ids are never reused: the last one handed out is kept in id_sequences.
+    # count ids are reserved at once and the first of them returned
+    def next_id(self, count=1):
+        with self.locked():
+            conn = self.database.connection()
+            with conn:
+                row = conn.execute("SELECT last_id FROM id_sequences WHERE name = ?", (self.name,)).fetchone()
+                max_id = conn.execute("SELECT MAX(id) FROM cars").fetchone()[0]
+                next_id = max(-1 if row is None else row[0], -1 if max_id is None else max_id) + 1
+                conn.execute("INSERT OR REPLACE INTO id_sequences (name, last_id) VALUES (?, ?)",
+                             (self.name, next_id + count - 1))
+            return next_id
+
+    def _load(self, conn):
+        features = {}
+        for car_id, feature in conn.execute("SELECT car_id, feature FROM car_features ORDER BY car_id, position"):
+            features.setdefault(car_id, []).append(feature)
+        return [
+            Car(car_id, make, model, year, features.get(car_id, ()))
+            for car_id, make, model, year in conn.execute("SELECT id, make, model, year FROM cars ORDER BY id")
+        ]
+
+    def _delete_all(self, conn):
+        conn.execute("DELETE FROM car_features")
+        conn.execute("DELETE FROM cars")
+
+    def _insert_all(self, conn, cars):
+        conn.executemany("INSERT INTO cars (id, make, model, year) VALUES (?, ?, ?, ?)",
+                         [(car.id, car.make, car.model, car.year) for car in cars])
+        conn.executemany("INSERT INTO car_features (car_id, position, feature) VALUES (?, ?, ?)",
+                         [(car.id, position, feature)
+                          for car in cars for position, feature in enumerate(car.features)])
+
+    def insert(self, car):
+        self._write(lambda conn: self._insert_all(conn, [car]), lambda cars: self._record_index(cars).insert(car),
+                    changes=[('insert', car)])
+
+    def _delete_rows(self, conn, car_id):
+        conn.execute("DELETE FROM car_features WHERE car_id = ?", (car_id,))
+        conn.execute("DELETE FROM cars WHERE id = ?", (car_id,))
+
+    def replace(self, car):
+        def write_rows(conn):
+            self._delete_rows(conn, car.id)
+            self._insert_all(conn, [car])
+
+        return self._write(write_rows, lambda cars: self._record_index(cars).replace(car),
+                           changes=[('replace', car)])
+
+    def delete(self, car_id):
+        return self._write(lambda conn: self._delete_rows(conn, car_id),
+                           lambda cars: self._record_index(cars).delete(car_id),
+                           changes=[('delete', car_id)])
+
+    # Many row changes in a single transaction
+    def apply_changes(self, changes):
+        def write_rows(conn):
+            for op, value in changes:
+                if op != 'insert':
+                    self._delete_rows(conn, value if op == 'delete' else value.id)
+                if op != 'delete':
+                    self._insert_all(conn, [value])
+
+        return self._write(write_rows, lambda cars: self._apply_records(cars, changes), changes=changes)
+
+
+class SqliteSalesStore(SqliteStore):
+    name = 'sales'
+
+    COLUMNS = SALE_FIELDS
+
+    def _load(self, conn):
+        rows = conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM sales ORDER BY id")
+        return [Sale(*row) for row in rows]
+
+    def _delete_all(self, conn):
+        conn.execute("DELETE FROM sales")
+
+    def _insert_all(self, conn, sales):
+        placeholders = ', '.join('?' for _ in self.COLUMNS)
+        conn.executemany(f"INSERT INTO sales ({', '.join(self.COLUMNS)}) VALUES ({placeholders})",
+                         [tuple(getattr(sale, column) for column in self.COLUMNS) for sale in sales])
+
+
+class SqliteUsersStore(SqliteStore):
+    name = 'users'
+
+    def _load(self, conn):
+        return dict(conn.execute("SELECT username, password_hash FROM users"))
+
+    def _delete_all(self, conn):
+        conn.execute("DELETE FROM users")
+
+    def _insert_all(self, conn, users):
+        conn.executemany("INSERT INTO users (username, password_hash) VALUES (?, ?)", users.items())
+
+    def put(self, username, password_hash):
+        self._write(
+            lambda conn: conn.execute("INSERT OR REPLACE INTO users (username, password_hash) VALUES (?, ?)",
+                                      (username, password_hash)),
+            lambda users: users.__setitem__(username, password_hash))
+
+    def remove(self, username):
+        self._write(lambda conn: conn.execute("DELETE FROM users WHERE username = ?", (username,)),
+                    lambda users: users.pop(username, None))
+
+
+class SqliteFavoritesStore(SqliteStore):
+    name = 'favorites'
+
+    def _load(self, conn):
+        favorites = {}
+        for username, car_id in conn.execute("SELECT username, car_id FROM favorite_ids ORDER BY username, position"):
+            favorites.setdefault(username, []).append(car_id)
+        return favorites
+
+    def _delete_all(self, conn):
+        conn.execute("DELETE FROM favorite_ids")
+
+    def _insert_all(self, conn, favorites):
+        conn.executemany("INSERT INTO favorite_ids (username, position, car_id) VALUES (?, ?, ?)",
+                         [(username, position, car_id)
+                          for username, car_ids in favorites.items() for position, car_id in enumerate(car_ids)])
+
+    # Only the given user's rows are rewritten
+    def put(self, username, car_ids):
+        def write_rows(conn):
+            conn.execute("DELETE FROM favorite_ids WHERE username = ?", (username,))
+            self._insert_all(conn, {username: car_ids})
+
+        self._write(write_rows, lambda favorites: favorites.__setitem__(username, car_ids))
+
+    def remove(self, username):
+        self._write(lambda conn: conn.execute("DELETE FROM favorite_ids WHERE username = ?", (username,)),
+                    lambda favorites: favorites.pop(username, None))
+
+
+def migrate_from_json(database, json_dir):
+    """Copy every JSON store found in json_dir into the SQLite database."""
+    for name, filename in JSON_FILES.items():
+        path = os.path.join(json_dir, filename)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                if name in RECORD_TYPES:
+                    data = json.load(f, object_hook=RECORD_TYPES[name].from_dict)
+                else:
+                    data = json.load(f)
+            # Favorites were once stored as copies of the cars rather than ids
+            if name == 'favorites':
+                data = {username: [car['id'] if isinstance(car, dict) else car for car in cars]
+                        for username, cars in data.items()}
+            getattr(database, name).write(data)
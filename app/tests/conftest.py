@@ -0,0 +1,49 @@
+import atexit
+import base64
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app imports its modules by their flat names from app/
+sys.path.insert(0, APP_DIR)
+
+# Settings are read when config is first imported, so route tests get a copy
+# of the bundled database and password hashing on the request thread
+_database_dir = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, _database_dir, ignore_errors=True)
+shutil.copytree(os.path.join(APP_DIR, 'database'), _database_dir, dirs_exist_ok=True)
+os.environ['DATABASE_DIR'] = _database_dir
+os.environ['PASSWORD_HASH_PROCESSES'] = '0'
+
+
+@pytest.fixture(scope='session')
+def client():
+    from main import create_app
+    return create_app().test_client()
+
+
+@pytest.fixture(scope='session')
+def auth_headers(client):
+    """Basic auth headers of a user written straight to the users store."""
+    import auth
+    from werkzeug.security import generate_password_hash
+    with auth.users_store.locked():
+        auth.write_user('tester', generate_password_hash('tester-pw', 'pbkdf2:sha256:1000'))
+    return {'Authorization': 'Basic ' + base64.b64encode(b'tester:tester-pw').decode()}
+
+
+@pytest.fixture
+def sales_rows(client):
+    """Replace the sales with the Sale records passed, restoring them after the test."""
+    from routes.sales import sales_store
+    original = list(sales_store.read())
+
+    def replace(rows):
+        sales_store.write(list(rows))
+
+    yield replace
+    sales_store.write(original)
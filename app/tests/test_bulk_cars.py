@@ -0,0 +1,116 @@
+import json
+
+
+def bulk(client, auth_headers, operations, **options):
+    return client.post('/cars/_bulk', json=operations, headers=auth_headers, **options)
+
+
+def get_car(client, auth_headers, car_id):
+    response = client.get(f'/cars/{car_id}', headers=auth_headers)
+    return response.get_json() if response.status_code == 200 else None
+
+
+def test_operations_are_applied_in_order(client, auth_headers):
+    response = bulk(client, auth_headers, [
+        {'op': 'create', 'car': {'make': 'Bulk', 'model': 'Alpha', 'year': 2001, 'features': ['Sunroof']}},
+        {'op': 'create', 'car': {'make': 'Bulk', 'model': 'Beta', 'year': '2002'}},
+    ])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['applied'], body['failed']) == (2, 0)
+    alpha, beta = [result['id'] for result in body['results']]
+    assert [result['status'] for result in body['results']] == [201, 201]
+    assert get_car(client, auth_headers, beta) == {
+        'id': beta, 'make': 'Bulk', 'model': 'Beta', 'year': 2002, 'features': []}
+
+    response = bulk(client, auth_headers, [
+        {'op': 'update', 'id': alpha, 'car': {'make': 'Bulk', 'model': 'Alpha', 'year': 2003}},
+        {'op': 'delete', 'id': beta},
+        # The update above freed (Alpha, 2001), so it can be taken again
+        {'op': 'create', 'car': {'make': 'Bulk', 'model': 'Alpha', 'year': 2001}},
+    ])
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == [200, 200, 201]
+    assert get_car(client, auth_headers, alpha)['year'] == 2003
+    assert get_car(client, auth_headers, beta) is None
+    assert get_car(client, auth_headers, results[2]['id'])['year'] == 2001
+
+
+def test_nothing_is_applied_when_an_operation_fails(client, auth_headers):
+    response = bulk(client, auth_headers, [
+        {'op': 'create', 'car': {'make': 'Bulk', 'model': 'Gamma', 'year': 2001}},
+        {'op': 'create', 'car': {'make': 'Bulk', 'model': 'Gamma', 'year': 2001}},
+        {'op': 'update', 'id': 10 ** 9, 'car': {'make': 'Bulk', 'model': 'Delta', 'year': 2001}},
+        {'op': 'create', 'car': {'make': 'bulk', 'model': 'Delta', 'year': 2001}},
+        {'op': 'rename'},
+    ])
+    assert response.status_code == 400
+    body = response.get_json()
+    assert (body['applied'], body['failed']) == (0, 4)
+    assert [result['status'] for result in body['results']] == [201, 400, 404, 400, 400]
+    assert body['results'][1]['error'] == "Car with the same model and year already exists."
+
+    listed = client.get('/cars?model=Gamma', headers=auth_headers).get_json()['cars']
+    assert listed == []
+
+
+def test_partial_mode_applies_the_valid_operations(client, auth_headers):
+    response = bulk(client, auth_headers, [
+        {'op': 'create', 'car': {'make': 'Bulk', 'model': 'Epsilon', 'year': 2001}},
+        {'op': 'delete', 'id': 10 ** 9},
+    ], query_string={'mode': 'partial'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['applied'], body['failed']) == (1, 1)
+    assert body['results'][1] == {'index': 1, 'status': 404, 'error': 'Car not found'}
+    assert get_car(client, auth_headers, body['results'][0]['id'])['model'] == 'Epsilon'
+
+
+def test_ids_must_be_integers(client, auth_headers):
+    response = bulk(client, auth_headers, [
+        {'op': 'delete', 'id': [4]},
+        {'op': 'update', 'id': {'id': 4}, 'car': {'make': 'Bulk', 'model': 'Iota', 'year': 2001}},
+        {'op': 'delete', 'id': True},
+        {'op': 'delete', 'id': '4'},
+        {'op': 'delete'},
+    ], query_string={'mode': 'partial'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['applied'], body['failed']) == (0, 5)
+    assert [result['status'] for result in body['results']] == [400] * 5
+    assert body['results'][0]['error'] == "A delete operation needs a numeric 'id'."
+    assert get_car(client, auth_headers, 4) is not None
+
+
+def test_ndjson_body(client, auth_headers):
+    lines = [{'op': 'create', 'car': {'make': 'Bulk', 'model': 'Zeta', 'year': 2001}},
+             {'op': 'create', 'car': {'make': 'Bulk', 'model': 'Eta', 'year': 2001}}]
+    response = client.post('/cars/_bulk', data='\n'.join(json.dumps(line) for line in lines) + '\n',
+                           content_type='application/x-ndjson', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_json()['applied'] == 2
+
+
+def test_malformed_bodies_are_rejected(client, auth_headers):
+    response = client.post('/cars/_bulk', data='{"op": "create"}\nnot json\n',
+                           content_type='application/x-ndjson', headers=auth_headers)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "Invalid JSON on line 2."}
+
+    response = client.post('/cars/_bulk', data='[{"op": "create"}', content_type='application/json',
+                           headers=auth_headers)
+    assert response.get_json() == {'error': "Invalid JSON array."}
+
+
+def test_deleted_cars_leave_favorites(client, auth_headers):
+    response = bulk(client, auth_headers, [{'op': 'create', 'car': {'make': 'Bulk', 'model': 'Theta', 'year': 2001}}])
+    car_id = response.get_json()['results'][0]['id']
+    assert client.post('/favorites', json={'id': car_id}, headers=auth_headers).status_code == 201
+
+    assert bulk(client, auth_headers, [{'op': 'delete', 'id': car_id}]).status_code == 200
+    assert car_id not in client.get('/favorites?ids_only=1', headers=auth_headers).get_json()
+
+
+def test_requires_login(client):
+    assert client.post('/cars/_bulk', json=[]).status_code == 401
@@ -0,0 +1,84 @@
+import json
+import pytest
+from models.car import Car
+from services.car_search import CarSearchIndex, search_cars
+from storage.json_store import JsonStore
+
+SEARCHES = [
+    {},
+    {'model': 'a'},
+    {'model': 'ccor'},
+    {'model': 'Civic'},
+    {'query': 'to'},
+    {'query': 'honda sun'},
+    {'query': 'bluetooth'},
+    {'features': ['Sunroof']},
+    {'model': 'ac', 'query': 'h', 'features': ['bluetooth']},
+]
+
+
+def car(car_id, make, model, features=()):
+    return Car(car_id, make, model, 2001 + car_id, features)
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / 'cars.json'
+    path.write_text(json.dumps([
+        car(0, 'Honda', 'Accord', ['Bluetooth']).to_dict(),
+        car(1, 'Honda', 'Civic', ['Sunroof', 'Bluetooth']).to_dict(),
+        car(2, 'Toyota', 'Corolla').to_dict(),
+    ]))
+    return JsonStore(str(path), indent=None, record_type=Car)
+
+
+def results(store, **search):
+    return [found.to_dict() for found in search_cars(store, **search)]
+
+
+def assert_matches_rebuilt(store):
+    """Every search gives what a freshly built index would."""
+    index = store.derived('car_search', CarSearchIndex)
+    rebuilt = CarSearchIndex([car for car in index.cars if car is not None])
+    for search in SEARCHES:
+        expected = results(store, **search)
+        store._derived['car_search'] = rebuilt
+        assert results(store, **search) == expected, search
+        store._derived['car_search'] = index
+
+
+def test_writes_update_the_index_in_place(store):
+    index = store.derived('car_search', CarSearchIndex)
+
+    store.insert(car(3, 'Mazda', 'Miata', ['Sunroof']))
+    store.replace(car(1, 'Honda', 'Civic Type R', ['Turbo']))
+    store.delete(2)
+    store.apply_changes([('insert', car(4, 'Toyota', 'Camry', ['Bluetooth'])),
+                         ('replace', car(0, 'Acura', 'Integra'))])
+
+    assert store.derived('car_search', CarSearchIndex) is index
+    assert [found.id for found in search_cars(store)] == [0, 1, 3, 4]
+    assert [found.id for found in search_cars(store, model='civic')] == [1]
+    assert [found.id for found in search_cars(store, model='Corolla')] == []
+    assert [found.id for found in search_cars(store, query='to')] == [4]
+    assert [found.id for found in search_cars(store, features=['Sunroof'])] == [3]
+    assert 'accord' not in index.models and 'cor' not in index.model_trigrams
+    assert_matches_rebuilt(store)
+
+
+def test_many_deletes_rebuild_the_index(store):
+    index = store.derived('car_search', CarSearchIndex)
+    store.delete(0)
+    assert store.derived('car_search', CarSearchIndex) is index
+
+    store.delete(1)
+    rebuilt = store.derived('car_search', CarSearchIndex)
+    assert rebuilt is not index
+    assert rebuilt.cars == list(store.read())
+
+
+def test_replacing_the_data_rebuilds_the_index(store):
+    index = store.derived('car_search', CarSearchIndex)
+    store.write([car(5, 'Kia', 'Rio')])
+    assert store.derived('car_search', CarSearchIndex) is not index
+    assert [found.id for found in search_cars(store, model='rio')] == [5]
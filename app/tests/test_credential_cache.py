@@ -0,0 +1,78 @@
+import time
+import pytest
+import auth
+from auth import CredentialCache
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake time.monotonic, advanced by setting clock.now."""
+    class Clock:
+        now = 1000.0
+    monkeypatch.setattr(time, 'monotonic', lambda: Clock.now)
+    return Clock
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = CredentialCache(ttl=60, max_size=10)
+    cache.add('ana', 'pw', 'hash')
+    assert cache.check('ana', 'pw', 'hash')
+    assert not cache.check('ana', 'other', 'hash')
+
+    clock.now += 61
+    assert not cache.check('ana', 'pw', 'hash')
+
+
+def test_entries_are_bound_to_the_password_hash(clock):
+    cache = CredentialCache(ttl=60, max_size=10)
+    cache.add('ana', 'pw', 'hash')
+    assert not cache.check('ana', 'pw', 'new hash')
+    # The stale entry was dropped, not just skipped
+    assert not cache.check('ana', 'pw', 'hash')
+
+
+def test_least_recently_used_entries_are_dropped(clock):
+    cache = CredentialCache(ttl=60, max_size=2)
+    cache.add('ana', 'pw', 'hash')
+    cache.add('ben', 'pw', 'hash')
+    assert cache.check('ana', 'pw', 'hash')
+    cache.add('cai', 'pw', 'hash')
+    assert cache.check('ana', 'pw', 'hash')
+    assert cache.check('cai', 'pw', 'hash')
+    assert not cache.check('ben', 'pw', 'hash')
+
+
+def test_invalidate_drops_removed_and_changed_users(clock):
+    cache = CredentialCache(ttl=60, max_size=10)
+    cache.add('ana', 'pw', 'hash-a')
+    cache.add('ben', 'pw', 'hash-b')
+    cache.add('cai', 'pw', 'hash-c')
+    cache.invalidate({'ana': 'hash-a', 'ben': 'changed'})
+    assert cache.check('ana', 'pw', 'hash-a')
+    assert len(cache._entries) == 1
+
+
+def test_disabled_with_a_zero_ttl():
+    cache = CredentialCache(ttl=0, max_size=10)
+    cache.add('ana', 'pw', 'hash')
+    assert not cache.check('ana', 'pw', 'hash')
+
+
+def test_repeat_logins_skip_the_password_check(client, monkeypatch):
+    checks = []
+    check = auth.password_hasher.check
+    monkeypatch.setattr(auth.password_hasher, 'check', lambda *args: checks.append(args) or check(*args))
+    with auth.users_store.locked():
+        auth.write_user('cached', generate_password_hash('first-pw', 'pbkdf2:sha256:1000'))
+
+    assert auth.check_credentials('cached', 'first-pw') == 'cached'
+    assert auth.check_credentials('cached', 'first-pw') == 'cached'
+    assert len(checks) == 1
+    assert auth.check_credentials('cached', 'wrong-pw') is None
+
+    # A new password invalidates the old one straight away
+    with auth.users_store.locked():
+        auth.write_user('cached', generate_password_hash('second-pw', 'pbkdf2:sha256:1000'))
+    assert auth.check_credentials('cached', 'first-pw') is None
+    assert auth.check_credentials('cached', 'second-pw') == 'cached'
@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.mark.parametrize('body', [{'id': [4]}, {'id': {'id': 4}}, {'id': '4'}, {'id': True}, {}, [4]])
+def test_add_favorite_needs_a_numeric_id(client, auth_headers, body):
+    response = client.post('/favorites', json=body, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_add_and_remove_favorite(client, auth_headers):
+    assert client.post('/favorites', json={'id': 10 ** 9}, headers=auth_headers).status_code == 404
+
+    assert client.post('/favorites', json={'id': 4}, headers=auth_headers).status_code == 201
+    assert client.post('/favorites', json={'id': 4}, headers=auth_headers).status_code == 400
+    assert client.get('/favorites?ids_only=1', headers=auth_headers).get_json() == [4]
+
+    assert client.delete('/favorites/4', headers=auth_headers).status_code == 200
+    assert client.get('/favorites?ids_only=1', headers=auth_headers).get_json() == []
@@ -0,0 +1,22 @@
+import json
+import sys
+from models.car import Car
+from scripts import generate_dummy_data
+from storage.journal import JournaledJsonStore
+
+
+def test_new_cars_replace_a_stale_journal(tmp_path, monkeypatch):
+    path = tmp_path / 'db.json'
+    # Left behind by an app running with CARS_JOURNAL=1 on the old cars
+    (tmp_path / 'db.json.log').write_text(json.dumps(
+        {'op': 'put', 'record': Car(0, 'Stale', 'Journal', 1999).to_dict()}) + '\n')
+    (tmp_path / 'db.json.seq').write_text('5000')
+
+    monkeypatch.setattr(sys, 'argv', ['generate_dummy_data.py', '--db-dir', str(tmp_path), '--cars', '20',
+                                      '--sales', '50', '--processes', '1', '--seed', '1'])
+    generate_dummy_data.main()
+
+    assert not (tmp_path / 'db.json.log').exists() and not (tmp_path / 'db.json.seq').exists()
+    store = JournaledJsonStore(str(path), indent=None, record_type=Car)
+    assert [car.to_dict() for car in store.read()] == json.loads(path.read_text())
+    assert store.next_id() == 20
@@ -0,0 +1,149 @@
+import gzip
+import os
+from flask import Flask, Response
+import pytest
+from utils.http_cache import ResponseCache, cacheable, conditional_get, response_cache
+
+app = Flask(__name__)
+
+
+def test_streamed_body_is_compressed_as_it_streams():
+    produced = []
+
+    def chunks():
+        for i in range(50):
+            chunk = os.urandom(16384)
+            produced.append(chunk)
+            yield chunk
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = cacheable(Response(chunks()), 'tag', 'gzip')
+        assert produced == []
+
+        parts = response.iter_encoded()
+        first = next(parts)
+        assert len(produced) < 50
+        body = first + b''.join(parts)
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.get_etag() == ('tag-gzip', False)
+    assert gzip.decompress(body) == b''.join(produced)
+
+
+def test_small_body_is_left_uncompressed():
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = cacheable(Response(b'{}'), 'tag', 'gzip')
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data() == b'{}'
+
+
+@pytest.fixture
+def enabled_cache():
+    """The shared response cache, enabled even when RESPONSE_CACHE_BYTES=0."""
+    max_bytes = response_cache.max_bytes
+    response_cache.resize(max(max_bytes, 2 ** 20))
+    yield
+    response_cache.resize(max_bytes)
+
+
+class Store:
+    version = 0
+
+    def add_listener(self, listener):
+        pass
+
+
+def test_resize_drops_entries_that_no_longer_fit():
+    cache = ResponseCache(400)
+    store = Store()
+    for i in range(3):
+        cache.add((f'tag{i}', None), b'x' * 100, {}, [store], [0])
+    cache.resize(0)
+    assert cache.stats()['entries'] == 0 and cache.size == 0
+
+    cache.add(('tag', None), b'x' * 100, {}, [store], [0])
+    assert cache.get('tag', [None]) is None
+
+    cache.resize(400)
+    cache.add(('tag', None), b'x' * 100, {}, [store], [0])
+    assert cache.get('tag', [None])[1] == b'x' * 100
+
+
+def test_cached_streamed_response_leaves_out_later_headers(enabled_cache):
+    cached_app = Flask(__name__)
+    store = Store()
+    store.generation = lambda: 'generation'
+    first = []
+
+    @cached_app.route('/rows')
+    @conditional_get(store)
+    def rows():
+        return Response(chunk for chunk in (b'[1,', b'2]'))
+
+    @cached_app.after_request
+    def tag_first_request(response):
+        if not first:
+            first.append(True)
+            response.headers['X-Profile'] = 'first.pstats'
+        return response
+
+    client = cached_app.test_client()
+    response = client.get('/rows')
+    assert response.get_data() == b'[1,2]'
+    assert response.headers['X-Profile'] == 'first.pstats'
+    hits = response_cache.hits
+
+    response = client.get('/rows')
+    assert response_cache.hits == hits + 1
+    assert response.get_data() == b'[1,2]'
+    assert 'X-Profile' not in response.headers
+
+
+def test_a_change_drops_only_that_stores_entries():
+    cache = ResponseCache(4000)
+    cars, sales = Store(), Store()
+    cache.add(('cars', None), b'c' * 100, {}, [cars], [0])
+    cache.add(('both', None), b'b' * 100, {}, [cars, sales], [0, 0])
+    cache.add(('sales', None), b's' * 100, {}, [sales], [0])
+
+    cache.invalidate(cars)
+    assert cache.get('cars', [None]) is None and cache.get('both', [None]) is None
+    assert cache.get('sales', [None])[1] == b's' * 100
+    assert cache.stats()['invalidations'] == 2 and cache.size == 100
+
+    # A body built before a write that landed meanwhile is not kept
+    sales.version = 1
+    cache.add(('stale', None), b'x' * 100, {}, [sales], [0])
+    assert cache.get('stale', [None]) is None
+
+
+def cached_listing(client, auth_headers, query, **headers):
+    hits = response_cache.hits
+    response = client.get(f'/cars?{query}', headers={**auth_headers, **headers})
+    return response, response_cache.hits - hits
+
+
+def test_writes_invalidate_cached_responses(client, auth_headers, enabled_cache):
+    created = client.post('/cars', headers=auth_headers,
+                          json={'make': 'Cache', 'model': 'Invalidated', 'year': 2001}).get_json()
+    query = 'model=invalidated'
+    response, hits = cached_listing(client, auth_headers, query)
+    etag = response.headers['ETag']
+    assert [car['year'] for car in response.get_json()['cars']] == [2001]
+    response, hits = cached_listing(client, auth_headers, query)
+    assert hits == 1 and response.headers['ETag'] == etag
+    assert cached_listing(client, auth_headers, query, **{'If-None-Match': etag})[0].status_code == 304
+
+    invalidations = response_cache.invalidations
+    client.put(f"/cars/{created['id']}", headers=auth_headers,
+               json={'make': 'Cache', 'model': 'Invalidated', 'year': 2002})
+    assert response_cache.invalidations > invalidations
+
+    response, hits = cached_listing(client, auth_headers, query, **{'If-None-Match': etag})
+    assert response.status_code == 200 and hits == 0
+    assert [car['year'] for car in response.get_json()['cars']] == [2002]
+
+    client.delete(f"/cars/{created['id']}", headers=auth_headers)
+    response, hits = cached_listing(client, auth_headers, query)
+    assert hits == 0 and response.get_json()['cars'] == []
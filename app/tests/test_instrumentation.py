@@ -0,0 +1,48 @@
+from flask import Flask, Response
+import pytest
+from utils.instrumentation import instrument_app, metrics
+from utils.profiling import RequestProfiler
+
+
+@pytest.fixture
+def instrumented(tmp_path):
+    app = Flask(__name__)
+    # Every request is profiled, and no profile is slow enough to be kept
+    profiler = RequestProfiler(set(), 100, 10 ** 9, str(tmp_path))
+    instrument_app(app, {}, profiler)
+
+    @app.route('/stream', methods=['GET'])
+    def stream():
+        return Response(chunk for chunk in (b'a' * 10, b'b' * 10))
+
+    return app.test_client(), profiler
+
+
+def requests(method):
+    return metrics.requests[('stream', method, '200')]
+
+
+def test_streamed_body_is_recorded_once_sent(instrumented):
+    client, profiler = instrumented
+    before = requests('GET')
+    response = client.get('/stream')
+    assert response.get_data() == b'a' * 10 + b'b' * 10
+    response.close()
+    assert requests('GET') == before + 1
+    assert not profiler._busy.locked()
+
+
+def test_body_never_iterated_is_still_recorded(instrumented):
+    client, profiler = instrumented
+    before = requests('HEAD')
+    client.head('/stream').close()
+    assert requests('HEAD') == before + 1
+
+    before = requests('GET')
+    client.get('/stream', buffered=False).close()
+    assert requests('GET') == before + 1
+
+    # Profiling carries on with the next request
+    assert not profiler._busy.locked()
+    client.get('/stream').close()
+    assert not profiler._busy.locked()
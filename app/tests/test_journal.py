@@ -0,0 +1,129 @@
+import json
+import os
+import time
+import pytest
+from models.car import Car
+from storage.journal import JournaledJsonStore
+
+
+def car(car_id, model='Alpha', year=2001):
+    return Car(car_id, 'Make', model, year, ['Bluetooth'])
+
+
+def open_journal(path, **options):
+    options.setdefault('fsync_interval', 60)
+    return JournaledJsonStore(str(path), indent=None, record_type=Car, **options)
+
+
+def stored(path):
+    """The cars as a freshly started worker would load them."""
+    return [record.to_dict() for record in open_journal(path).read()]
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'db.json'
+    path.write_text(json.dumps([car(0).to_dict(), car(1, 'Beta').to_dict()]))
+    return path
+
+
+def test_changes_are_replayed_from_the_log(path):
+    store = open_journal(path)
+    store.insert(car(2, 'Gamma'))
+    store.replace(car(0, 'Alpha', 2005))
+    store.delete(1)
+    store.sync()
+
+    assert json.loads(path.read_text())[1]['model'] == 'Beta'
+    assert len(open(f'{path}.log').readlines()) == 3
+    assert stored(path) == [car(0, 'Alpha', 2005).to_dict(), car(2, 'Gamma').to_dict()]
+
+
+def test_apply_changes_appends_one_entry_per_change(path):
+    store = open_journal(path)
+    store.apply_changes([('insert', car(2, 'Gamma')), ('replace', car(1, 'Beta', 2010)), ('delete', 0),
+                         ('delete', 99)])
+
+    assert len(open(f'{path}.log').readlines()) == 3
+    assert stored(path) == [car(1, 'Beta', 2010).to_dict(), car(2, 'Gamma').to_dict()]
+
+
+def test_another_store_picks_up_appended_changes(path):
+    reader, writer = open_journal(path), open_journal(path)
+    assert len(reader.read()) == 2
+    writer.insert(car(2, 'Gamma'))
+
+    assert [record.id for record in reader.read()] == [0, 1, 2]
+
+
+def test_log_is_compacted_into_the_snapshot(path):
+    store = open_journal(path, compact_after=3)
+    for car_id in range(2, 5):
+        store.insert(car(car_id, f'Model {car_id}'))
+
+    assert not os.path.exists(f'{path}.log')
+    assert [record['id'] for record in json.loads(path.read_text())] == [0, 1, 2, 3, 4]
+    store.insert(car(5, 'Model 5'))
+    assert len(open(f'{path}.log').readlines()) == 1
+    assert [record['id'] for record in stored(path)] == [0, 1, 2, 3, 4, 5]
+
+
+def test_fsync_is_batched(path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: synced.append(fd) or real_fsync(fd))
+    store = open_journal(path, fsync_batch=3)
+
+    store.insert(car(2, 'Gamma'))
+    store.insert(car(3, 'Delta'))
+    assert synced == []
+    store.insert(car(4, 'Epsilon'))
+    assert len(synced) == 1
+
+
+def test_fsync_happens_within_the_interval(path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: synced.append(fd) or real_fsync(fd))
+    store = open_journal(path, fsync_batch=100, fsync_interval=0.05)
+
+    store.insert(car(2, 'Gamma'))
+    deadline = time.monotonic() + 5
+    while not synced and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(synced) == 1
+
+
+def test_torn_last_line_is_ignored_on_load(path):
+    open_journal(path).insert(car(2, 'Gamma'))
+    with open(f'{path}.log', 'a') as f:
+        f.write('{"op": "put", "record": {"id": 3, "ma')
+
+    assert [record['id'] for record in stored(path)] == [0, 1, 2]
+
+
+def test_append_after_a_torn_line_survives_reload(path):
+    store = open_journal(path)
+    store.insert(car(2, 'Gamma'))
+    # A crash mid-append leaves a partial line behind
+    with open(f'{path}.log', 'a') as f:
+        f.write('{"op": "put", "record": {"id": 3, "ma')
+
+    # A restarted worker loads the store and keeps writing
+    restarted = open_journal(path)
+    restarted.insert(car(4, 'Epsilon'))
+    restarted.sync()
+
+    assert [record['id'] for record in stored(path)] == [0, 1, 2, 4]
+    assert all(line.endswith('\n') for line in open(f'{path}.log'))
+
+
+def test_entries_after_an_old_torn_line_are_kept(path):
+    # Logs written before torn lines were truncated have the next entry
+    # glued to the partial one; only that line is lost
+    with open(f'{path}.log', 'w') as f:
+        f.write('{"op": "put", "record": {"id": 3, "ma')
+        f.write(json.dumps({'op': 'put', 'record': car(4, 'Epsilon').to_dict()}) + '\n')
+        f.write(json.dumps({'op': 'put', 'record': car(5, 'Zeta').to_dict()}) + '\n')
+
+    assert [record['id'] for record in stored(path)] == [0, 1, 5]
@@ -0,0 +1,54 @@
+import fcntl
+import json
+import threading
+import time
+from models.car import Car
+from storage.json_store import JsonStore
+
+
+def test_reads_are_not_blocked_by_another_process_holding_the_lock(tmp_path):
+    path = tmp_path / 'db.json'
+    path.write_text(json.dumps([Car(0, 'Make', 'Alpha', 2001).to_dict()]))
+    store = JsonStore(str(path), record_type=Car)
+    store.read()
+
+    # Another process holds the file lock, so a writer here waits for it
+    with open(f'{path}.lock', 'a') as other_process:
+        fcntl.flock(other_process.fileno(), fcntl.LOCK_EX)
+        writer = threading.Thread(target=store.insert, args=(Car(1, 'Make', 'Beta', 2002),))
+        writer.start()
+        time.sleep(0.1)
+        assert writer.is_alive()
+
+        reader = threading.Thread(target=store.read)
+        reader.start()
+        reader.join(timeout=2)
+        assert not reader.is_alive()
+        fcntl.flock(other_process.fileno(), fcntl.LOCK_UN)
+
+    writer.join(timeout=2)
+    assert [car.id for car in store.read()] == [0, 1]
+
+
+def test_writers_in_one_process_take_turns(tmp_path):
+    path = tmp_path / 'db.json'
+    path.write_text('[]')
+    store = JsonStore(str(path), record_type=Car)
+    inside, overlaps = [], []
+
+    def write(car_id):
+        with store.locked():
+            inside.append(car_id)
+            if len(inside) > 1:
+                overlaps.append(list(inside))
+            time.sleep(0.01)
+            store.insert(Car(car_id, 'Make', f'Model {car_id}', 2001))
+            inside.remove(car_id)
+
+    threads = [threading.Thread(target=write, args=(car_id,)) for car_id in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+    assert sorted(car.id for car in store.read()) == list(range(5))
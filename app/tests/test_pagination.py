@@ -0,0 +1,101 @@
+import json
+from models.sale import Sale
+from utils.pagination import encode_cursor
+
+
+def ndjson(response):
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def car_pages(client, auth_headers, limit, cursor=None):
+    """Every page of /cars, following next_cursor."""
+    pages = []
+    while True:
+        query = f'limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(f'/cars?{query}', headers=auth_headers)
+        assert response.status_code == 200
+        body = response.get_json()
+        pages.append([car['id'] for car in body['cars']])
+        cursor = body.get('next_cursor')
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_cover_every_car(client, auth_headers):
+    everything = [car['id'] for car in ndjson(client.get('/cars?format=ndjson', headers=auth_headers))]
+    assert everything == sorted(everything)
+
+    pages = car_pages(client, auth_headers, 7)
+    assert [car_id for page in pages for car_id in page] == everything
+    assert all(len(page) == 7 for page in pages[:-1])
+
+    # The same cars as ndjson, a page at a time
+    cursor = encode_cursor(pages[0][-1])
+    streamed = ndjson(client.get(f'/cars?format=ndjson&limit=7&cursor={cursor}', headers=auth_headers))
+    assert [car['id'] for car in streamed] == pages[1]
+
+
+def test_cursor_survives_deleting_its_car(client, auth_headers):
+    response = client.post('/cars/_bulk', headers=auth_headers, json=[
+        {'op': 'create', 'car': {'make': 'Page', 'model': f'Cursor {number}', 'year': 2001}}
+        for number in range(3)])
+    first, second, third = [result['id'] for result in response.get_json()['results']]
+
+    cursor = encode_cursor(first)
+    assert client.delete(f'/cars/{first}', headers=auth_headers).status_code == 200
+    body = client.get(f'/cars?limit=1&cursor={cursor}', headers=auth_headers).get_json()
+    assert [car['id'] for car in body['cars']] == [second]
+    body = client.get(f"/cars?limit=5&cursor={body['next_cursor']}", headers=auth_headers).get_json()
+    assert [car['id'] for car in body['cars']][0] == third
+
+    for car_id in (second, third):
+        client.delete(f'/cars/{car_id}', headers=auth_headers)
+
+
+def test_invalid_cursors_are_rejected(client, auth_headers):
+    for cursor in ('%%%', encode_cursor('seven'), 'e30'):
+        for path in ('/cars', '/sales'):
+            response = client.get(f'{path}?cursor={cursor}', headers=auth_headers)
+            assert response.status_code == 400, (path, cursor)
+
+
+def sales(count):
+    return [Sale(sale_id, sale_id, 'Make', 'Alpha', 2015, 2016 + sale_id % 3, 1, 'Japan') for sale_id in range(count)]
+
+
+def test_sales_cursor_follows_the_header(client, auth_headers, sales_rows):
+    sales_rows(sales(25))
+
+    seen = []
+    query = 'sale_year=2017&limit=3'
+    while True:
+        response = client.get(f'/sales?{query}', headers=auth_headers)
+        assert response.status_code == 200
+        seen.extend(sale['id'] for sale in response.get_json())
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            break
+        query = f'sale_year=2017&limit=3&cursor={cursor}'
+    assert seen == list(range(1, 25, 3))
+
+    # after=<id> continues after a plain id, with or without filters
+    response = client.get('/sales?after=20&limit=10', headers=auth_headers)
+    assert [sale['id'] for sale in response.get_json()] == [21, 22, 23, 24]
+    assert 'X-Next-Cursor' not in response.headers
+
+
+def test_sales_export_formats(client, auth_headers, sales_rows):
+    rows = sales(1201)
+    sales_rows(rows)
+    expected = [sale.to_dict() for sale in rows]
+
+    assert client.get('/sales', headers=auth_headers).get_json() == expected
+    assert ndjson(client.get('/sales?format=ndjson', headers=auth_headers)) == expected
+    filtered = ndjson(client.get('/sales?format=ndjson&sale_year=2018&limit=2', headers=auth_headers))
+    assert filtered == [expected[2], expected[5]]
+
+    sales_rows([])
+    assert client.get('/sales', headers=auth_headers).get_json() == []
+    assert client.get('/sales?format=ndjson', headers=auth_headers).get_data() == b''
@@ -0,0 +1,83 @@
+import multiprocessing
+import threading
+import pytest
+from services.password_hashing import HashingBusy, PasswordHasher
+
+
+def hasher(**options):
+    return PasswordHasher('pbkdf2:sha256:1000', max_pending=8, timeout=30, **options)
+
+
+@pytest.fixture(scope='module')
+def manager():
+    # Events that can be passed to the pool's processes
+    with multiprocessing.Manager() as manager:
+        yield manager
+
+
+def test_host_processes_bound_running_hashes():
+    password_hasher = hasher(processes=2, host_processes=1)
+    assert password_hasher._run(abs, -1) == 1
+
+    # The semaphore is shared with workers forked later; holding it stands in
+    # for one of them running a hash
+    password_hasher._running.acquire()
+    try:
+        password_hasher.timeout = 0
+        with pytest.raises(HashingBusy) as busy:
+            password_hasher._run(abs, -1)
+        assert busy.value.status == 503
+    finally:
+        password_hasher._running.release()
+        password_hasher.timeout = 30
+    assert password_hasher._run(abs, -1) == 1
+
+
+def test_slot_is_held_until_an_abandoned_hash_finishes(manager):
+    password_hasher = hasher(processes=1, host_processes=1)
+    release = manager.Event()
+
+    # The caller gives up waiting at once, but the hash keeps running
+    password_hasher.timeout = 0
+    with pytest.raises(HashingBusy):
+        password_hasher._run(release.wait)
+    with pytest.raises(HashingBusy):
+        password_hasher._run(abs, -1)
+
+    release.set()
+    password_hasher.timeout = 30
+    assert password_hasher._running.acquire(timeout=30)
+    password_hasher._running.release()
+    assert password_hasher._run(abs, -1) == 1
+
+
+def test_calls_beyond_max_pending_fail_fast():
+    password_hasher = PasswordHasher('pbkdf2:sha256:1000', processes=0, max_pending=2, timeout=30)
+    entered = threading.Semaphore(0)
+    release = threading.Event()
+
+    def hold():
+        entered.release()
+        release.wait()
+
+    threads = [threading.Thread(target=password_hasher._run, args=(hold,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for _ in threads:
+        entered.acquire()
+    try:
+        with pytest.raises(HashingBusy) as busy:
+            password_hasher._run(abs, -1)
+        assert busy.value.status == 429
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+    assert password_hasher._run(abs, -1) == 1
+
+
+def test_hashes_without_a_pool():
+    password_hasher = hasher(processes=0)
+    password_hash = password_hasher.hash('secret')
+    assert password_hasher.check(password_hash, 'secret')
+    assert not password_hasher.needs_rehash(password_hash)
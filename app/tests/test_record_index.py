@@ -0,0 +1,69 @@
+import random
+from models.car import Car
+from storage.record_index import RecordIndex, RecordList
+
+
+def car(car_id):
+    return Car(car_id, 'Make', f'Model {car_id}', 2001)
+
+
+def assert_same(records, expected):
+    assert len(records) == len(expected)
+    assert list(records) == expected
+    for position in range(-len(expected), len(expected)):
+        assert records[position] is expected[position]
+    for start in range(0, len(expected) + 2, 3):
+        for stop in (start, start + 1, start + 5, len(expected) + 3):
+            assert records[start:stop] == expected[start:stop]
+    assert records[::2] == expected[::2]
+
+
+def test_reads_skip_the_holes_left_by_deletes():
+    rng = random.Random(7)
+    ids = list(range(0, 600, 3))
+    rng.shuffle(ids)
+    records = RecordList([car(car_id) for car_id in ids])
+    index = RecordIndex(records, lambda record: record.model)
+    expected = list(records)
+    assert not index.ordered
+
+    next_id = 1000
+    for step in range(300):
+        choice = rng.random()
+        if choice < 0.5 and expected:
+            removed = expected.pop(rng.randrange(len(expected)))
+            assert index.delete(removed.id) is removed
+            assert index.get(removed.id) is None
+            assert index.delete(removed.id) is None
+        elif choice < 0.8:
+            record = car(next_id)
+            next_id += 1
+            index.insert(record)
+            expected.append(record)
+        elif expected:
+            position = rng.randrange(len(expected))
+            record = Car(expected[position].id, 'Other', expected[position].model, 2002)
+            assert index.replace(record) is expected[position]
+            expected[position] = record
+        if step % 25 == 0:
+            assert_same(records, expected)
+
+    assert_same(records, expected)
+    for record in expected:
+        assert index.get(record.id) is record
+        assert index.find_unique(record.model) == record.id
+    assert len(records.holes) <= len(records.slots) * RecordIndex.COMPACT_SHARE
+
+
+def test_compaction_renumbers_the_slots():
+    records = RecordList([car(car_id) for car_id in range(16)])
+    index = RecordIndex(records)
+    index.delete(3)
+    index.delete(5)
+    assert len(records.holes) == 2 and len(records.slots) == 16
+
+    index.delete(7)
+    assert len(records.holes) == 0 and len(records.slots) == 13
+    assert [record.id for record in records] == [0, 1, 2, 4, 6] + list(range(8, 16))
+    assert all(index.get(record_id).id == record_id for record_id in (0, 4, 6, 15))
+    assert index.ordered
@@ -0,0 +1,79 @@
+from models.sale import Sale
+
+
+def sale(sale_id, make, units, country='Germany', sale_year=2020):
+    return Sale(sale_id, sale_id, make, f'{make} One', 2015, sale_year, units, country)
+
+
+def aggregate(client, auth_headers, query):
+    response = client.get(f'/sales/aggregate?{query}', headers=auth_headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_top_breaks_ties_by_group(client, auth_headers, sales_rows):
+    # Chevrolet is seen first but ranks after Audi, with which it ties
+    sales_rows([sale(0, 'Chevrolet', 434), sale(1, 'Volvo', 500), sale(2, 'Audi', 434), sale(3, 'Kia', 10)])
+
+    body = aggregate(client, auth_headers, 'group_by=make&top=3')
+    assert body['groups'] == [{'make': 'Volvo', 'units_sold': 500}, {'make': 'Audi', 'units_sold': 434},
+                              {'make': 'Chevrolet', 'units_sold': 434}]
+    assert body['total_units'] == 1378
+
+
+SALES = [
+    sale(0, 'Audi', 10, 'Germany', 2019),
+    sale(1, 'Audi', 20, 'France', 2020),
+    sale(2, 'Toyota', 30, 'Japan', 2020),
+    sale(3, 'Toyota', 5, 'Germany', 2020),
+    sale(4, 'Kia', 7, 'Japan', 2019),
+]
+
+
+def test_totals_per_group(client, auth_headers, sales_rows):
+    sales_rows(SALES)
+
+    body = aggregate(client, auth_headers, 'group_by=sale_year')
+    assert body['group_by'] == ['sale_year']
+    assert body['groups'] == [{'sale_year': 2019, 'units_sold': 17}, {'sale_year': 2020, 'units_sold': 55}]
+    assert body['total_units'] == 72
+
+    body = aggregate(client, auth_headers, 'group_by=continent,make')
+    assert body['groups'] == [
+        {'continent': 'Asia', 'make': 'Kia', 'units_sold': 7},
+        {'continent': 'Asia', 'make': 'Toyota', 'units_sold': 30},
+        {'continent': 'Europe', 'make': 'Audi', 'units_sold': 30},
+        {'continent': 'Europe', 'make': 'Toyota', 'units_sold': 5},
+    ]
+
+
+def test_filters_narrow_the_totals(client, auth_headers, sales_rows):
+    sales_rows(SALES)
+
+    body = aggregate(client, auth_headers, 'group_by=country&make=toyota')
+    assert body['groups'] == [{'country': 'Germany', 'units_sold': 5}, {'country': 'Japan', 'units_sold': 30}]
+    assert body['total_units'] == 35
+
+    body = aggregate(client, auth_headers, 'group_by=make&continent=Europe&sale_year=2020')
+    assert body['groups'] == [{'make': 'Audi', 'units_sold': 20}, {'make': 'Toyota', 'units_sold': 5}]
+
+    body = aggregate(client, auth_headers, 'group_by=model&country=Japan&release_year=2015')
+    assert body['groups'] == [{'model': 'Kia One', 'units_sold': 7}, {'model': 'Toyota One', 'units_sold': 30}]
+
+    body = aggregate(client, auth_headers, 'group_by=make&country=Spain')
+    assert body == {'group_by': ['make'], 'total_units': 0, 'groups': []}
+
+
+def test_totals_follow_writes(client, auth_headers, sales_rows):
+    sales_rows(SALES)
+    assert aggregate(client, auth_headers, 'group_by=make&make=kia')['total_units'] == 7
+
+    sales_rows(SALES + [sale(5, 'Kia', 100, 'Japan', 2021)])
+    body = aggregate(client, auth_headers, 'group_by=make&make=kia')
+    assert body['groups'] == [{'make': 'Kia', 'units_sold': 107}]
+
+
+def test_bad_parameters_are_rejected(client, auth_headers):
+    for query in ('group_by=colour', 'group_by=,', 'top=0', 'top=many', 'sale_year=recent'):
+        response = client.get(f'/sales/aggregate?{query}', headers=auth_headers)
+        assert response.status_code == 400, query
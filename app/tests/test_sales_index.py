@@ -0,0 +1,97 @@
+import random
+from models.sale import Sale
+from services.sales_index import SalesIndex, intersect_postings, select_row_ids
+
+COUNTRIES = ['Germany', 'Japan', 'France']
+MODELS = ['Civic', 'Golf', 'Corolla', 'Model 3']
+
+
+def random_sales(count, seed=3):
+    rng = random.Random(seed)
+    return [Sale(sale_id, sale_id, 'Make', rng.choice(MODELS), rng.randint(2010, 2015),
+                 rng.randint(2015, 2022), rng.randint(1, 50), rng.choice(COUNTRIES))
+            for sale_id in range(count)]
+
+
+def matches(sale, criteria):
+    for field, op, value in criteria:
+        actual = getattr(sale, field)
+        if op == 'eq':
+            if (actual.lower() if isinstance(actual, str) else actual) != (
+                    value.lower() if isinstance(value, str) else value):
+                return False
+        else:
+            low, high = value
+            if (low is not None and actual < low) or (high is not None and actual > high):
+                return False
+    return True
+
+
+def test_postings_are_sorted_row_ids_per_value():
+    sales = random_sales(300)
+    index = SalesIndex(sales)
+    for field in ('country', 'model', 'sale_year', 'release_year'):
+        seen = []
+        for value, row_ids in index.postings[field].items():
+            assert list(row_ids) == sorted(row_ids)
+            assert all(index.lookup(field, getattr(sales[row_id], field)) is row_ids for row_id in row_ids)
+            seen.extend(row_ids)
+        assert sorted(seen) == list(range(len(sales)))
+    assert list(index.lookup('country', 'gErMaNy')) == [
+        row_id for row_id, sale in enumerate(sales) if sale.country == 'Germany']
+    assert list(index.lookup('country', 'Spain')) == []
+
+
+def test_ranges_are_inclusive_and_open_ended():
+    sales = random_sales(300)
+    index = SalesIndex(sales)
+    for low, high in ((2017, 2019), (2018, 2018), (None, 2016), (2021, None), (2030, None), (2019, 2017)):
+        expected = [row_id for row_id, sale in enumerate(sales)
+                    if (low is None or sale.sale_year >= low) and (high is None or sale.sale_year <= high)]
+        assert list(index.lookup_range('sale_year', low, high)) == expected, (low, high)
+
+
+def test_intersect_postings():
+    assert list(intersect_postings([[1, 4, 6, 9], [0, 4, 9, 12], [4, 5, 9]])) == [4, 9]
+    assert list(intersect_postings([[1, 2], [3, 4]])) == []
+    assert list(intersect_postings([[2, 3]])) == [2, 3]
+
+
+def test_selected_rows_match_a_scan():
+    sales = random_sales(500)
+    index = SalesIndex(sales)
+    rng = random.Random(5)
+    for _ in range(50):
+        criteria = []
+        if rng.random() < 0.5:
+            criteria.append(('country', 'eq', rng.choice(COUNTRIES).upper()))
+        if rng.random() < 0.5:
+            criteria.append(('model', 'eq', rng.choice(MODELS)))
+        if rng.random() < 0.5:
+            criteria.append(('release_year', 'eq', rng.randint(2009, 2015)))
+        low = rng.choice([None, 2015, 2017, 2020])
+        criteria.append(('sale_year', 'range', (low, rng.choice([None, 2018, 2022]))))
+        expected = [row_id for row_id, sale in enumerate(sales) if matches(sale, criteria)]
+        assert list(select_row_ids(sales, index, criteria)) == expected, criteria
+
+
+def test_sales_route_filters(client, auth_headers, sales_rows):
+    sales = random_sales(200)
+    sales_rows(sales)
+
+    def ids(query):
+        response = client.get(f'/sales?{query}', headers=auth_headers)
+        assert response.status_code == 200
+        return [sale['id'] for sale in response.get_json()]
+
+    assert ids('') == list(range(200))
+    assert ids('country=japan&sale_year_from=2017&sale_year_to=2019') == [
+        sale.id for sale in sales if sale.country == 'Japan' and 2017 <= sale.sale_year <= 2019]
+    assert ids('model=Golf&release_year=2012') == [
+        sale.id for sale in sales if sale.model == 'Golf' and sale.release_year == 2012]
+    assert ids('release_year_to=2011&sale_year=2020') == [
+        sale.id for sale in sales if sale.release_year <= 2011 and sale.sale_year == 2020]
+    assert ids('country=Spain') == []
+
+    for query in ('sale_year=soon', 'sale_year_from=x', 'release_year_to=1.5'):
+        assert client.get(f'/sales?{query}', headers=auth_headers).status_code == 400, query
@@ -0,0 +1,93 @@
+import json
+import pytest
+from models.car import Car
+from models.sale import Sale
+from storage.sqlite_store import SqliteDatabase, migrate_from_json
+
+
+def car(car_id, model='Alpha', year=2001, features=('Bluetooth',)):
+    return Car(car_id, 'Make', model, year, list(features))
+
+
+def cars(store):
+    return [record.to_dict() for record in store.read()]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cars.sqlite3')
+
+
+def test_car_writes_are_stored(path):
+    store = SqliteDatabase(path).cars
+    store.write([car(0), car(1, 'Beta', features=())])
+    store.insert(car(2, 'Gamma', features=('Sunroof', 'Bluetooth')))
+    assert store.replace(car(0, 'Alpha', 2005)).year == 2001
+    assert store.delete(1).model == 'Beta'
+    assert store.delete(1) is None
+    store.apply_changes([('insert', car(3, 'Delta')), ('replace', car(2, 'Gamma', 2010, ['Sunroof'])),
+                         ('delete', 0)])
+
+    expected = [car(2, 'Gamma', 2010, ['Sunroof']).to_dict(), car(3, 'Delta').to_dict()]
+    assert cars(store) == expected
+    # A new process loads the same rows from the file
+    assert cars(SqliteDatabase(path).cars) == expected
+
+
+def test_writes_from_another_process_are_picked_up(path):
+    store = SqliteDatabase(path).cars
+    other = SqliteDatabase(path).cars
+    store.write([car(0)])
+    assert cars(other) == [car(0).to_dict()]
+    generation = store.generation()
+    version = store.version
+
+    other.insert(car(1, 'Beta'))
+    assert store.generation() != generation
+    assert cars(store) == [car(0).to_dict(), car(1, 'Beta').to_dict()]
+    assert store.version > version
+
+    # A write starts from the other process's changes
+    other.delete(0)
+    store.insert(car(2, 'Gamma'))
+    assert cars(store) == [car(1, 'Beta').to_dict(), car(2, 'Gamma').to_dict()]
+
+
+def test_ids_are_never_reused(path):
+    store = SqliteDatabase(path).cars
+    store.write([car(0), car(1)])
+    assert store.next_id() == 2
+    assert store.next_id(count=3) == 3
+    store.delete(1)
+    assert SqliteDatabase(path).cars.next_id() == 6
+
+
+def test_users_and_favorites(path):
+    database = SqliteDatabase(path)
+    database.users.put('ana', 'hash-a')
+    database.users.put('ben', 'hash-b')
+    database.users.put('ana', 'hash-c')
+    database.users.remove('ben')
+    database.favorites.put('ana', [3, 1, 2])
+    database.favorites.put('ben', [4])
+    database.favorites.remove('ben')
+
+    reopened = SqliteDatabase(path)
+    assert reopened.users.read() == {'ana': 'hash-c'}
+    assert reopened.favorites.read() == {'ana': [3, 1, 2]}
+
+
+def test_migrate_from_json(path, tmp_path):
+    sale = Sale(0, 1, 'Make', 'Beta', 2015, 2020, 7, 'Japan')
+    (tmp_path / 'db.json').write_text(json.dumps([car(0).to_dict(), car(1, 'Beta').to_dict()]))
+    (tmp_path / 'sales.json').write_text(json.dumps([sale.to_dict()]))
+    # Favorites once held copies of the cars
+    (tmp_path / 'favorites.json').write_text(json.dumps({'ana': [car(1, 'Beta').to_dict(), 0]}))
+
+    database = SqliteDatabase(path)
+    migrate_from_json(database, str(tmp_path))
+
+    assert cars(database.cars) == [car(0).to_dict(), car(1, 'Beta').to_dict()]
+    assert [record.to_dict() for record in database.sales.read()] == [sale.to_dict()]
+    assert database.favorites.read() == {'ana': [1, 0]}
+    assert database.users.read() == {}
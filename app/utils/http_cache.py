@@ -0,0 +1,249 @@
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import threading
+import zlib
+from flask import Response, make_response, request
+from config import HTTP_COMPRESS_MIN_BYTES, RESPONSE_CACHE_BYTES
+
+# brotli is optional; without it responses are only gzip-compressed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Clients may keep responses but must revalidate them with If-None-Match
+CACHE_CONTROL = 'private, no-cache'
+
+
+def make_etag(*parts):
+    """Strong ETag over everything a response depends on.
+
+    Store generations must be taken before the data is read, so a body is
+    never labelled with a generation newer than the data it was built from.
+    """
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def request_args():
+    """The query arguments in a canonical order, for ETags and cache keys."""
+    return tuple(sorted((name, tuple(values)) for name, values in request.args.lists()))
+
+
+def etag_variants(etag):
+    # A compressed body is a different representation and gets its own tag
+    encodings = ('gzip', 'br') if brotli is not None else ('gzip',)
+    return [etag] + [f'{etag}-{encoding}' for encoding in encodings]
+
+
+def _set_validators(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.vary.add('Authorization')
+    response.vary.add('Accept-Encoding')
+
+
+def not_modified(etag):
+    """A 304 response if If-None-Match names any representation of etag, else None."""
+    for variant in etag_variants(etag):
+        if request.if_none_match.contains_weak(variant):
+            response = Response(status=304)
+            _set_validators(response, variant)
+            return response
+    return None
+
+
+class ResponseCache:
+    """Serialized GET response bodies by (ETag, content encoding).
+
+    Bounded by max_bytes of body, least recently used dropped first. Each
+    entry remembers the stores it was built from and is dropped as soon as
+    one of them changes, so memory is not held for data that is gone.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 4
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._watched = set()
+        self._lock = threading.Lock()
+
+    def watch(self, store):
+        with self._lock:
+            if id(store) in self._watched:
+                return
+            self._watched.add(id(store))
+        store.add_listener(lambda: self.invalidate(store))
+
+    def get(self, etag, encodings):
+        """(encoding, body, headers) of the first cached encoding, counting one hit or miss."""
+        with self._lock:
+            for encoding in encodings:
+                entry = self._entries.get((etag, encoding))
+                if entry is not None:
+                    self._entries.move_to_end((etag, encoding))
+                    self.hits += 1
+                    return (encoding,) + entry[:2]
+            self.misses += 1
+            return None
+
+    def add(self, key, body, headers, stores, versions):
+        # versions are the stores' versions when the request started; if any
+        # changed since, the body may already be stale
+        if len(body) > self.max_entry_bytes or [store.version for store in stores] != versions:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (body, headers, stores)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (evicted, _, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def resize(self, max_bytes):
+        """Change the bound, dropping the least recently used entries that no longer fit."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self.max_entry_bytes = max_bytes // 4
+            while self._entries and self.size > self.max_bytes:
+                _, (evicted, _, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, store):
+        with self._lock:
+            stale = [key for key, (_, _, stores) in self._entries.items() if store in stores]
+            for key in stale:
+                body, _, _ = self._entries.pop(key)
+                self.size -= len(body)
+            self.invalidations += len(stale)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_BYTES)
+
+
+def accepted_encoding():
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(chunks, encoding):
+    # Compress chunk by chunk, yielding output as the compressor produces it,
+    # so a streamed body is compressed as it streams rather than held
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        part = compress(chunk)
+        if part:
+            yield part
+    yield finish()
+
+
+def cacheable(response, etag, encoding):
+    """Tag a 200 response with etag and Cache-Control, compressing it for
+    encoding (if not None) when it is large or streamed."""
+    if encoding is None or (not response.is_streamed and response.content_length < HTTP_COMPRESS_MIN_BYTES):
+        _set_validators(response, etag)
+        return response
+
+    if response.is_streamed:
+        response.response = _compress(response.iter_encoded(), encoding)
+    else:
+        response.set_data(b''.join(_compress(response.iter_encoded(), encoding)))
+    response.headers['Content-Encoding'] = encoding
+    _set_validators(response, f'{etag}-{encoding}')
+    return response
+
+
+# Pass a streamed body through, calling done(body) at the end unless it
+# grew past max_bytes on the way
+def _tee(chunks, max_bytes, done):
+    parts = []
+    size = 0
+    for chunk in chunks:
+        if parts is not None:
+            size += len(chunk)
+            if size > max_bytes:
+                parts = None
+            else:
+                parts.append(chunk)
+        yield chunk
+    if parts is not None:
+        done(b''.join(parts))
+
+
+def conditional_get(*stores, vary=request_args):
+    """Decorator for GET views whose response depends only on stores and vary().
+
+    The ETag covers the view, its arguments, each store's generation and
+    vary(), by default the query arguments. Clients holding the current ETag
+    get a 304 without the view running. Otherwise the body is served from
+    response_cache when it holds it, and cached for later requests if not.
+    """
+    def decorator(view):
+        for store in stores:
+            response_cache.watch(store)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = make_etag(view.__name__, args, kwargs, [store.generation() for store in stores], vary())
+            versions = [store.version for store in stores]
+            response = not_modified(etag)
+            if response is not None:
+                return response
+
+            encoding = accepted_encoding()
+            cached = response_cache.get(etag, [encoding, None] if encoding else [None])
+            if cached is not None:
+                cached_encoding, body, headers = cached
+                response = Response(body, headers=headers)
+                if cached_encoding == encoding:
+                    return response
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response = cacheable(response, etag, encoding)
+
+            # The headers as the view made them, before after_request
+            # handlers add request-specific ones (X-Profile, CORS); a
+            # streamed body only ends after those have run
+            headers = response.headers.copy()
+
+            def add(body):
+                response_cache.add((etag, headers.get('Content-Encoding')), body, headers, stores, versions)
+
+            if response.is_streamed:
+                response.response = _tee(response.iter_encoded(), response_cache.max_entry_bytes, add)
+            else:
+                add(response.get_data())
+            return response
+        return wrapper
+    return decorator
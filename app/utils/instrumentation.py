@@ -0,0 +1,278 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+import threading
+import time
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+# Upper bounds of the histogram buckets, in seconds and in bytes
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+_local = threading.local()
+
+
+class Histogram:
+    """Counts of observed values per bucket, with their sum, as Prometheus histograms have."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Per-endpoint request metrics, rendered in the Prometheus text format.
+
+    Histograms are keyed by their label values; everything is updated under
+    one lock, once per request.
+    """
+
+    def __init__(self):
+        self.requests = defaultdict(int)
+        self.durations = defaultdict(lambda: Histogram(SECONDS_BUCKETS))
+        self.phases = defaultdict(lambda: Histogram(SECONDS_BUCKETS))
+        self.request_sizes = defaultdict(lambda: Histogram(BYTES_BUCKETS))
+        self.response_sizes = defaultdict(lambda: Histogram(BYTES_BUCKETS))
+        self.stores = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def watch_stores(self, stores):
+        """Report reload counts of stores, a {name: store} dict."""
+        self.stores.update(stores)
+
+    def add_collector(self, collect):
+        """Also render collect(), a list of (name, help, type, value) rows."""
+        self.collectors.append(collect)
+
+    def record(self, record, status, response_bytes):
+        endpoint = record.endpoint
+        total = time.perf_counter() - record.start
+        with self._lock:
+            self.requests[(endpoint, record.method, str(status))] += 1
+            self.durations[(endpoint, record.method)].observe(total)
+            for name, seconds in record.phases.items():
+                self.phases[(endpoint, name)].observe(seconds)
+            # Whatever no phase accounts for: routing, validation, WSGI
+            self.phases[(endpoint, 'other')].observe(max(0.0, total - sum(record.phases.values())))
+            self.request_sizes[(endpoint,)].observe(record.request_bytes)
+            self.response_sizes[(endpoint,)].observe(response_bytes)
+
+    def render(self):
+        lines = []
+
+        def header(name, help_text, kind):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def labels(names, values, extra=''):
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+            if extra:
+                pairs.append(extra)
+            return '{' + ','.join(pairs) + '}' if pairs else ''
+
+        def histograms(name, help_text, label_names, histograms):
+            header(name, help_text, 'histogram')
+            for values, histogram in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f'{name}_bucket{labels(label_names, values, le)} {cumulative}')
+                lines.append(f'{name}_sum{labels(label_names, values)} {histogram.sum}')
+                lines.append(f'{name}_count{labels(label_names, values)} {histogram.count}')
+
+        with self._lock:
+            header('http_requests_total', 'Requests handled, by endpoint, method and status.', 'counter')
+            for values, count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{labels(('endpoint', 'method', 'status'), values)} {count}")
+            histograms('http_request_duration_seconds', 'Time from routing to the last byte of the body.',
+                       ('endpoint', 'method'), self.durations)
+            histograms('http_request_phase_seconds', 'Time per request spent in each phase, excluding nested phases.',
+                       ('endpoint', 'phase'), self.phases)
+            histograms('http_request_size_bytes', 'Request body sizes.', ('endpoint',), self.request_sizes)
+            histograms('http_response_size_bytes', 'Response body sizes, after compression.',
+                       ('endpoint',), self.response_sizes)
+
+        header('store_reloads_total', 'Times a store loaded its data from storage.', 'counter')
+        for name, store in sorted(self.stores.items()):
+            lines.append(f'store_reloads_total{labels(("store",), (name,))} {store.reloads}')
+        header('store_reload_seconds_total', 'Time spent loading stores from storage.', 'counter')
+        for name, store in sorted(self.stores.items()):
+            lines.append(f'store_reload_seconds_total{labels(("store",), (name,))} {store.reload_seconds}')
+
+        for collect in self.collectors:
+            for name, help_text, kind, value in collect():
+                header(name, help_text, kind)
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+class RequestRecord:
+    """Timings of one request. Phases are exclusive: entering a nested phase
+    pauses the enclosing one, so the phases of a request add up to at most
+    its duration."""
+
+    def __init__(self, endpoint, method, request_bytes):
+        self.endpoint = endpoint
+        self.method = method
+        self.request_bytes = request_bytes
+        self.start = time.perf_counter()
+        self.phases = defaultdict(float)
+        # Set by the profiler when this request is profiled
+        self.profile = None
+        self._stack = []
+        self._mark = self.start
+
+    def _credit(self):
+        now = time.perf_counter()
+        if self._stack:
+            self.phases[self._stack[-1]] += now - self._mark
+        self._mark = now
+
+    def enter(self, name):
+        self._credit()
+        self._stack.append(name)
+
+    def exit(self):
+        self._credit()
+        self._stack.pop()
+
+
+@contextmanager
+def phase(name):
+    """Count the time spent in the block towards the current request's named phase."""
+    record = getattr(_local, 'record', None)
+    if record is None:
+        yield
+        return
+    record.enter(name)
+    try:
+        yield
+    finally:
+        record.exit()
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, counting request parsing and response serialization as phases."""
+
+    def dumps(self, obj, **kwargs):
+        with phase('serialize'):
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        with phase('parse'):
+            return super().loads(s, **kwargs)
+
+
+class _TimedBody:
+    """A streamed response body that finishes the request's record when the
+    server closes it.
+
+    Streamed bodies are produced after the view returns, possibly on other
+    threads (see utils/asgi.py), so each chunk is made with the request's
+    record current and counted as serialization. Servers close a body even
+    when it is never iterated (HEAD requests, clients gone before the first
+    chunk), so finish(sent) always runs, exactly once.
+    """
+
+    def __init__(self, chunks, record, finish):
+        self.chunks = chunks
+        self.record = record
+        self.sent = 0
+        self._finish = finish
+
+    def __iter__(self):
+        for chunk in _chunks_with_record(self.chunks, self.record):
+            self.sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        finish, self._finish = self._finish, None
+        try:
+            if hasattr(self.chunks, 'close'):
+                self.chunks.close()
+        finally:
+            if finish is not None:
+                finish(self.sent)
+
+
+def _chunks_with_record(chunks, record):
+    chunks = iter(chunks)
+    while True:
+        previous = getattr(_local, 'record', None)
+        _local.record = record
+        record.enter('serialize')
+        if record.profile is not None:
+            record.profile.enable()
+        try:
+            chunk = next(chunks, None)
+        finally:
+            if record.profile is not None:
+                record.profile.disable()
+            record.exit()
+            _local.record = previous
+        if chunk is None:
+            return
+        yield chunk
+
+
+def instrument_app(app, stores, profiler=None):
+    """Record per-endpoint timings, phases and payload sizes for every request to app.
+
+    stores is a {name: store} dict whose reloads are reported. profiler is
+    an optional RequestProfiler (utils/profiling.py).
+    """
+    app.json = TimedJSONProvider(app)
+    metrics.watch_stores(stores)
+
+    @app.before_request
+    def start_record():
+        _local.record = RequestRecord(request.endpoint or 'unmatched', request.method,
+                                      request.content_length or 0)
+        if profiler is not None:
+            profiler.start(_local.record)
+
+    @app.after_request
+    def finish_record(response):
+        record = getattr(_local, 'record', None)
+        if record is None:
+            return response
+        _local.record = None
+
+        if record.profile is not None:
+            profiler.pause(record, response)
+
+        def finish(response_bytes):
+            metrics.record(record, response.status_code, response_bytes)
+            if record.profile is not None:
+                profiler.finish(record)
+
+        if response.is_streamed:
+            response.response = _TimedBody(response.response, record, finish)
+        else:
+            finish(response.content_length or 0)
+        return response
+
+    @app.teardown_request
+    def drop_record(exc):
+        # after_request is skipped when a view raises
+        record = getattr(_local, 'record', None)
+        _local.record = None
+        if record is not None and record.profile is not None:
+            profiler.discard(record)
@@ -0,0 +1,83 @@
+import base64
+import json
+from bisect import bisect_right
+from flask import Response, current_app
+
+# Rows serialized per chunk of a streamed response
+STREAM_CHUNK_ROWS = 500
+
+
+def encode_cursor(last_id):
+    """Opaque cursor continuing after the record with id last_id."""
+    return base64.urlsafe_b64encode(json.dumps({'after': last_id}).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def read_cursor(args):
+    """Id to continue after, from cursor=<opaque> or after=<id>, or None.
+
+    Raises ValueError for a malformed value.
+    """
+    cursor = args.get('cursor')
+    if cursor:
+        try:
+            after = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))['after']
+        except (KeyError, TypeError):
+            raise ValueError(cursor)
+        if not isinstance(after, int):
+            raise ValueError(cursor)
+        return after
+    after = args.get('after')
+    return int(after) if after else None
+
+
+def position_after(items, after_id, id_of, ordered=True):
+    """Index of the first item following the one with id after_id.
+
+    With items in ascending id order this is a binary search and also works
+    when that record has since been deleted. Otherwise the record is looked
+    up by id, and a cursor whose record is gone ends the listing.
+    """
+    if ordered:
+        return bisect_right(items, after_id, key=id_of)
+    for position, item in enumerate(items):
+        if id_of(item) == after_id:
+            return position + 1
+    return len(items)
+
+
+# Serialize rows STREAM_CHUNK_ROWS at a time
+def _serialized_chunks(rows, dumps):
+    chunk = []
+    for row in rows:
+        chunk.append(dumps(row))
+        if len(chunk) == STREAM_CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ndjson_response(rows):
+    """Stream rows as newline-delimited JSON, serializing them as they are sent."""
+    # Bound now: the generator runs after the request context is gone
+    dumps = current_app.json.dumps
+
+    def generate():
+        for chunk in _serialized_chunks(rows, dumps):
+            yield '\n'.join(chunk) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+def json_array_response(rows):
+    """Stream rows as one JSON array without building it in memory."""
+    dumps = current_app.json.dumps
+
+    def generate():
+        separator = '['
+        for chunk in _serialized_chunks(rows, dumps):
+            yield separator + ','.join(chunk)
+            separator = ','
+        yield ']' if separator == ',' else '[]'
+
+    return Response(generate(), mimetype='application/json')
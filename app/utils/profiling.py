@@ -0,0 +1,145 @@
+from collections import Counter
+import cProfile
+from itertools import count
+import os
+import random
+import sys
+import threading
+import time
+from flask import request
+
+
+class StackSampler:
+    """Samples the stack of the thread that last enabled it, every interval seconds.
+
+    The samples are written as collapsed stacks ("outer;inner;leaf count"
+    per line), which flamegraph.pl and speedscope read directly.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = None
+        self._stopped = threading.Event()
+        self._sampler = None
+
+    def enable(self):
+        self._thread_id = threading.get_ident()
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+
+    def disable(self):
+        self._thread_id = None
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            thread_id = self._thread_id
+            frame = sys._current_frames().get(thread_id) if thread_id is not None else None
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._thread_id = None
+        self._stopped.set()
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, samples in self.stacks.most_common():
+                f.write(f'{stack} {samples}\n')
+
+
+class ProfileSession(cProfile.Profile):
+    """cProfile, with the same stop() and dump() as StackSampler."""
+
+    def stop(self):
+        self.disable()
+
+    def dump(self, path):
+        self.dump_stats(path)
+
+
+class RequestProfiler:
+    """Profiles selected requests and writes the profiles to directory.
+
+    A request is profiled when one of `admins` asks for it with ?__profile=1,
+    in which case the response names the profile in an X-Profile header, or
+    at random for sample_percent of requests, in which case the profile is
+    only kept if the request took at least slow_ms. Profiling is per thread
+    and (since Python 3.12) per process exclusive, so one request is
+    profiled at a time; requests selected meanwhile run unprofiled.
+
+    output is 'pstats' (cProfile, read with pstats or snakeviz) or 'stacks'
+    (collapsed stacks sampled every interval_ms, for flame graphs).
+    current_user() names the authenticated user once the view has run.
+    """
+
+    def __init__(self, admins, sample_percent, slow_ms, directory, output='pstats', interval_ms=5,
+                 current_user=None):
+        self.admins = admins
+        self.sample_percent = sample_percent
+        self.slow_ms = slow_ms
+        self.directory = directory
+        self.output = output
+        self.interval = interval_ms / 1000
+        self.current_user = current_user
+        self.written = 0
+        self._busy = threading.Lock()
+        self._numbers = count(1)
+
+    def enabled(self):
+        return bool(self.admins) or self.sample_percent > 0
+
+    def start(self, record):
+        authorization = request.authorization
+        requested = (request.args.get('__profile') == '1' and authorization is not None
+                     and authorization.username in self.admins)
+        if not requested and not (self.sample_percent > 0 and random.random() * 100 < self.sample_percent):
+            return
+        if not self._busy.acquire(blocking=False):
+            return
+        record.profile = ProfileSession() if self.output == 'pstats' else StackSampler(self.interval)
+        record.profile_requested_by = authorization.username if requested else None
+        record.profile_path = None
+        record.profile.enable()
+
+    def pause(self, record, response):
+        """Stop profiling the view; a streamed body is profiled as it is produced."""
+        record.profile.disable()
+        requested_by = record.profile_requested_by
+        # Only keep explicitly requested profiles once the admin's password checked out
+        if requested_by is not None and self.current_user is not None and self.current_user() == requested_by:
+            record.profile_path = self._path(record)
+            response.headers['X-Profile'] = os.path.basename(record.profile_path)
+
+    def finish(self, record):
+        profile, record.profile = record.profile, None
+        try:
+            profile.stop()
+            path = record.profile_path
+            if path is None and record.profile_requested_by is None:
+                if (time.perf_counter() - record.start) * 1000 >= self.slow_ms:
+                    path = self._path(record)
+            if path is not None:
+                os.makedirs(self.directory, exist_ok=True)
+                profile.dump(path)
+                self.written += 1
+        finally:
+            self._busy.release()
+
+    def discard(self, record):
+        """Drop the profile of a request that failed before finishing."""
+        profile, record.profile = record.profile, None
+        profile.stop()
+        self._busy.release()
+
+    def _path(self, record):
+        extension = 'pstats' if self.output == 'pstats' else 'stacks.txt'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._numbers)}-{record.endpoint}.{extension}"
+        return os.path.join(self.directory, name)
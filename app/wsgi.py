@@ -0,0 +1,12 @@
+import gc
+from main import create_app, load_stores
+
+# Production WSGI entry point: `gunicorn -c gunicorn.conf.py wsgi:app`.
+# gunicorn.conf.py preloads this module in the master process, so the stores
+# and indexes are loaded once and shared copy-on-write by every worker
+app = create_app()
+load_stores()
+
+# Move everything loaded so far out of the garbage collector's reach, so
+# collections in the workers do not touch, and thereby copy, those pages
+gc.freeze()
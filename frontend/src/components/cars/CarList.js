@@ -38,10 +38,10 @@ const CarList = () => {
   useEffect(() => {
     const loadFavorites = async () => {
       try {
-        const userFavorites = await FavoriteService.getFavorites();
+        const favoriteIds = await FavoriteService.getFavoriteIds();
         const favoritesMap = {};
-        userFavorites.forEach(car => {
-          favoritesMap[car.id] = true;
+        favoriteIds.forEach(id => {
+          favoritesMap[id] = true;
         });
         setFavorites(favoritesMap);
       } catch (error) {
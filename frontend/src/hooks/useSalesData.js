@@ -1,10 +1,9 @@
-import { useState, useEffect, useCallback } from "react";
+import { useState, useEffect } from "react";
 import CarService from "../services/CarService";
-import { getContinentFromCountry } from "../utils/countryMapping";
 import { processSalesData } from "../utils/processSalesData";
 
 export const useSalesData = (topModelsCount) => {
-  const [allSalesData, setAllSalesData] = useState([]);
+  const [aggregates, setAggregates] = useState(null);
   const [annualSalesData, setAnnualSalesData] = useState([]);
   const [countrySalesData, setCountrySalesData] = useState([]);
   const [modelSalesData, setModelSalesData] = useState([]);
@@ -19,45 +18,53 @@ export const useSalesData = (topModelsCount) => {
   const [availableMakes, setAvailableMakes] = useState([]);
   const [continents, setContinents] = useState([]);
 
-  const processData = useCallback(
-    (sales) => {
-      const { annualSalesData, countrySalesData, modelSalesData } =
-        processSalesData(sales, topModelsCount);
-      setAnnualSalesData(annualSalesData);
-      setCountrySalesData(countrySalesData);
-      setModelSalesData(modelSalesData);
-    },
-    [topModelsCount]
-  );
-
+  // Load the filter options once from the unfiltered totals
   useEffect(() => {
-    const fetchSalesData = async () => {
+    const fetchFilterOptions = async () => {
       try {
-        setLoading(true);
-        const sales = await CarService.getAllSales();
+        const [years, makes, continentTotals] = await Promise.all([
+          CarService.getSalesAggregate({ group_by: "sale_year" }),
+          CarService.getSalesAggregate({ group_by: "make" }),
+          CarService.getSalesAggregate({ group_by: "continent" }),
+        ]);
 
-        if (!sales || sales.length === 0) {
+        if (years.groups.length === 0) {
           setError("No sales data available. Please check your database.");
           return;
         }
 
-        setAllSalesData(sales);
-
-        // Convert years to strings when creating the array
-        const years = [...new Set(sales.map((sale) => String(sale.sale_year)))].sort();
-        const makes = [...new Set(sales.map((sale) => sale.make))].sort();
-        const continentSet = new Set();
+        // Convert years to strings so they match the select values
+        setAvailableYears(years.groups.map((group) => String(group.sale_year)).sort());
+        setAvailableMakes(makes.groups.map((group) => group.make).sort());
+        setContinents(continentTotals.groups.map((group) => group.continent).sort());
+      } catch (error) {
+        console.error("Error fetching sales filters:", error);
+        setError("Failed to load sales data. Please try again later.");
+      }
+    };
 
-        sales.forEach((sale) => {
-          const continent = getContinentFromCountry(sale.country);
-          continentSet.add(continent);
-        });
+    fetchFilterOptions();
+  }, []);
 
-        setAvailableYears(years);
-        setAvailableMakes(makes);
-        setContinents([...continentSet].sort());
+  // Fetch the aggregated series whenever filters change
+  useEffect(() => {
+    const fetchSalesData = async () => {
+      const filters = {};
+      if (selectedYear !== "all") filters.sale_year = selectedYear;
+      if (selectedContinent !== "all") filters.continent = selectedContinent;
+      if (selectedMake !== "all") filters.make = selectedMake;
 
-        processData(sales);
+      try {
+        setLoading(true);
+        const [annual, country, model] = await Promise.all([
+          CarService.getSalesAggregate({ ...filters, group_by: "sale_year" }),
+          CarService.getSalesAggregate({ ...filters, group_by: "country" }),
+          CarService.getSalesAggregate({
+            ...filters,
+            group_by: "make,model,release_year",
+          }),
+        ]);
+        setAggregates({ annual, country, model });
         setError(null);
       } catch (error) {
         console.error("Error fetching sales data:", error);
@@ -68,43 +75,17 @@ export const useSalesData = (topModelsCount) => {
     };
 
     fetchSalesData();
-  }, [processData]);
+  }, [selectedYear, selectedContinent, selectedMake]);
 
-  // Process data whenever filters change
   useEffect(() => {
-    if (allSalesData.length > 0) {
-      let filteredData = [...allSalesData];
-
-      // Apply year filter if not "all"
-      if (selectedYear !== "all") {
-        filteredData = filteredData.filter(
-          (sale) => String(sale.sale_year) === selectedYear
-        );
-      }
-
-      // Apply continent filter if not "all"
-      if (selectedContinent !== "all") {
-        filteredData = filteredData.filter((sale) => {
-          return getContinentFromCountry(sale.country) === selectedContinent;
-        });
-      }
-
-      // Apply make filter if not "all"
-      if (selectedMake !== "all") {
-        filteredData = filteredData.filter(
-          (sale) => sale.make === selectedMake
-        );
-      }
-
-      processData(filteredData);
+    if (aggregates) {
+      const { annualSalesData, countrySalesData, modelSalesData } =
+        processSalesData(aggregates, topModelsCount);
+      setAnnualSalesData(annualSalesData);
+      setCountrySalesData(countrySalesData);
+      setModelSalesData(modelSalesData);
     }
-  }, [
-    allSalesData,
-    selectedYear,
-    selectedContinent,
-    selectedMake,
-    processData,
-  ]);
+  }, [aggregates, topModelsCount]);
 
   return {
     annualSalesData,
@@ -122,4 +103,4 @@ export const useSalesData = (topModelsCount) => {
     availableMakes,
     continents
   };
-};
\ No newline at end of file
+};
@@ -128,6 +128,12 @@ class CarService {
     return this.apiRequest("get", "/sales");
   }
 
+  // Server-side totals of units_sold, e.g. { group_by: "country", sale_year: 2020 }
+  static getSalesAggregate(params = {}) {
+    const query = new URLSearchParams(params).toString();
+    return this.apiRequest("get", `/sales/aggregate?${query}`);
+  }
+
   static getSalesByModel(model) {
     return this.apiRequest("get", `/sales?model=${model}`);
   }
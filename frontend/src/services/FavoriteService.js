@@ -26,6 +26,25 @@ const FavoriteService = {
     }
   },
   
+  // Get only the ids of the current user's favorite cars
+  getFavoriteIds: async () => {
+    try {
+      const currentUser = AuthService.getCurrentUser();
+      if (!currentUser) return [];
+      
+      const response = await axios.get(`${API_URL}/favorites?ids_only=1`, {
+        headers: {
+          'Authorization': currentUser.authHeader
+        }
+      });
+      
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching favorite ids:', error);
+      return [];
+    }
+  },
+  
   // Add a car to favorites
   addFavorite: async (car) => {
     try {
@@ -36,7 +55,7 @@ const FavoriteService = {
       const operationKey = `add-${car.id}`;
       pendingOperations.set(operationKey, true);
       
-      await axios.post(`${API_URL}/favorites`, car, {
+      await axios.post(`${API_URL}/favorites`, { id: car.id }, {
         headers: {
           'Authorization': currentUser.authHeader,
           'Content-Type': 'application/json'
@@ -87,8 +106,8 @@ const FavoriteService = {
     if (!currentUser) return;
     
     try {
-      const favorites = await FavoriteService.getFavorites();
-      const isFavorite = favorites.some(fav => fav.id === car.id);
+      const favoriteIds = await FavoriteService.getFavoriteIds();
+      const isFavorite = favoriteIds.includes(car.id);
       
       // Immediately call the callback for UI update
       if (optimisticUpdateCallback) {
@@ -108,8 +127,8 @@ const FavoriteService = {
       
       // If there was an error, revert the optimistic update
       if (optimisticUpdateCallback) {
-        const favorites = await FavoriteService.getFavorites();
-        const isFavorite = favorites.some(fav => fav.id === car.id);
+        const favoriteIds = await FavoriteService.getFavoriteIds();
+        const isFavorite = favoriteIds.includes(car.id);
         optimisticUpdateCallback(isFavorite);
       }
       
@@ -120,8 +139,8 @@ const FavoriteService = {
   // Check if a car is a favorite
   isFavorite: async (carId) => {
     try {
-      const favorites = await FavoriteService.getFavorites();
-      return favorites.some(car => car.id === carId);
+      const favoriteIds = await FavoriteService.getFavoriteIds();
+      return favoriteIds.includes(carId);
     } catch (error) {
       console.error('Error checking favorite status:', error);
       return false;
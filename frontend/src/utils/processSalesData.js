@@ -1,27 +1,26 @@
-export const processSalesData = (sales, topModelsCount) => {
-  const { annualSales, countrySales, modelSales } = sales.reduce(
-    (acc, sale) => {
-      acc.annualSales[sale.sale_year] =
-        (acc.annualSales[sale.sale_year] || 0) + sale.units_sold;
+// Shapes the /sales/aggregate responses into the chart series used by SalesOverview
+export const processSalesData = (aggregates, topModelsCount) => {
+  const { annual, country, model } = aggregates;
 
-      acc.countrySales[sale.country] =
-        (acc.countrySales[sale.country] || 0) + sale.units_sold;
+  const annualSalesData = annual.groups
+    .map((group) => [String(group.sale_year), group.units_sold])
+    .sort((a, b) => a[0] - b[0]);
 
-      const modelKey = `${sale.make} ${sale.model}`;
-      if (!acc.modelSales[modelKey]) {
-        acc.modelSales[modelKey] = {};
-      }
-      const yearKey = sale.release_year.toString();
-      acc.modelSales[modelKey][yearKey] =
-        (acc.modelSales[modelKey][yearKey] || 0) + sale.units_sold;
+  const countrySalesData = country.groups
+    .map((group) => [group.country, group.units_sold])
+    .sort((a, b) => a[1] - b[1]);
 
-      return acc;
-    },
-    { annualSales: {}, countrySales: {}, modelSales: {} }
-  );
+  const modelSales = model.groups.reduce((acc, group) => {
+    const modelKey = `${group.make} ${group.model}`;
+    if (!acc[modelKey]) {
+      acc[modelKey] = {};
+    }
+    acc[modelKey][group.release_year] = group.units_sold;
+    return acc;
+  }, {});
 
   const processedModelSales = [];
-  Object.entries(modelSales).forEach(([model, yearData]) => {
+  Object.entries(modelSales).forEach(([modelName, yearData]) => {
     const totalUnits = Object.values(yearData).reduce(
       (sum, units) => sum + units,
       0
@@ -31,9 +30,9 @@ export const processSalesData = (sales, topModelsCount) => {
       .sort((a, b) => a[0] - b[0])
       .forEach(([year, units]) => {
         processedModelSales.push([
-          `${model} (${year})`,
+          `${modelName} (${year})`,
           units,
-          model,
+          modelName,
           parseInt(year),
           totalUnits,
         ]);
@@ -41,10 +40,10 @@ export const processSalesData = (sales, topModelsCount) => {
   });
 
   return {
-    annualSalesData: Object.entries(annualSales).sort((a, b) => a[0] - b[0]),
-    countrySalesData: Object.entries(countrySales).sort((a, b) => a[1] - b[1]),
+    annualSalesData,
+    countrySalesData,
     modelSalesData: processedModelSales
       .sort((a, b) => b[4] - a[4])
       .slice(0, topModelsCount),
   };
-};
\ No newline at end of file
+};